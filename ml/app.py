@@ -1,13 +1,38 @@
-from typing import Optional
+import asyncio
+import importlib
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from ml.config import BACKEND_BASE
-from ml.services.logic import handle_chat
+from ml.config import ANALYTICS_MAX_USERS, BACKEND_BASE
+from ml.services import analytics, data_client, intent, llm_client
+from ml.services.aggregates import curriculum_stats
+from ml.services.data_client import (
+    breaker_stats,
+    context_cache_stats,
+    invalidate_context,
+    pool_stats,
+)
+from ml.services.logic import handle_chat, handle_chat_stream
 
 
-app = FastAPI(title="Student Assistant ML Service", version="0.4.0")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Nạp + chạy thử model intent trước khi nhận request (trong thread để không chặn event loop).
+    # Các thư viện nặng không import lúc import module (numpy, httpx) được nạp ở đây thay vì ở request đầu tiên.
+    await asyncio.to_thread(intent.warm_up)
+    await asyncio.to_thread(importlib.import_module, "httpx")
+    yield
+    # Đóng các pool kết nối (backend Node, OpenAI/Gemini) khi tắt service
+    await data_client.aclose()
+    await llm_client.aclose()
+
+
+app = FastAPI(title="Student Assistant ML Service", version="0.4.0", lifespan=lifespan)
 
 
 class ChatRequest(BaseModel):
@@ -19,13 +44,91 @@ class ChatResponse(BaseModel):
     reply: str
 
 
+class InvalidateRequest(BaseModel):
+    # Bỏ trống → xoá cache của tất cả user
+    user_id: Optional[str] = None
+
+
+class AnalyticsRequest(BaseModel):
+    user_ids: List[str]
+
+
 @app.get("/health")
 def health():
-    return {"status": "ok", "backend": str(BACKEND_BASE)}
+    model = intent.intent_model_status()
+    return {
+        "status": "ok",
+        # Sẵn sàng phục vụ: model intent đã được nạp / chạy thử lúc khởi động
+        "ready": model["ready"],
+        "backend": str(BACKEND_BASE),
+        "intent_model": model,
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "context_cache": context_cache_stats(),
+        "backend_pool": pool_stats(),
+        "backend_breaker": breaker_stats(),
+        "curricula": curriculum_stats(),
+        "analytics": analytics.analytics_stats(),
+        "intent": intent.intent_stats(),
+        "llm": llm_client.llm_stats(),
+    }
+
+
+@app.post("/context/invalidate")
+def context_invalidate(req: InvalidateRequest):
+    """Backend gọi sau khi cập nhật điểm/deadline để chatbot không dùng context cũ."""
+    removed = invalidate_context(req.user_id)
+    return {"removed": removed}
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-  
-    reply = handle_chat(req.message, req.user_id)
+async def chat(req: ChatRequest):
+    # Toàn bộ pipeline là async: chờ backend / LLM không chiếm thread của threadpool
+    reply = await handle_chat(req.message, req.user_id)
     return ChatResponse(reply=reply)
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-sent events: mỗi đoạn câu trả lời là một sự kiện `data: {"delta": "..."}` (câu trả lời từ dữ liệu
+    là một đoạn, câu hỏi kiến thức chung thì từng đoạn token của LLM), kết thúc bằng `event: done`.
+    """
+
+    async def _events():
+        async for chunk in handle_chat_stream(req.message, req.user_id):
+            yield f"data: {json.dumps({'delta': chunk}, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    # X-Accel-Buffering: tắt buffer của nginx (nếu có) để token tới client ngay
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _analytics_stream(kind: str, req: AnalyticsRequest) -> StreamingResponse:
+    if len(req.user_ids) > ANALYTICS_MAX_USERS:
+        raise HTTPException(status_code=413, detail=f"Tối đa {ANALYTICS_MAX_USERS} user_ids mỗi request")
+
+    async def _lines():
+        async for row in analytics.scan(kind, req.user_ids):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    # NDJSON: mỗi dòng là kết quả của một user (theo thứ tự xong trước), dòng cuối là tổng kết
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/analytics/academic-warning")
+async def analytics_academic_warning(req: AnalyticsRequest):
+    return _analytics_stream("academic-warning", req)
+
+
+@app.post("/analytics/graduation-risk")
+async def analytics_graduation_risk(req: AnalyticsRequest):
+    return _analytics_stream("graduation-risk", req)
@@ -5,4 +5,87 @@ BASE_DIR = Path(__file__).resolve().parent
 MODELS_DIR = BASE_DIR / "models"
 BACKEND_BASE = os.environ.get("BACKEND_BASE", "http://127.0.0.1:5000").rstrip("/")
 
+# Cache context (/api/chatbot/context) theo user_id, tính bằng giây / số user tối đa
+CONTEXT_CACHE_TTL = float(os.environ.get("CONTEXT_CACHE_TTL", "30"))
+CONTEXT_CACHE_MAXSIZE = int(os.environ.get("CONTEXT_CACHE_MAXSIZE", "512"))
 
+# HTTP client (async) tới backend Node: số kết nối tối đa trong pool (các request vượt quá
+# sẽ chờ tới BACKEND_READ_TIMEOUT), keep-alive và timeout (connect / read, giây)
+BACKEND_POOL_SIZE = int(os.environ.get("BACKEND_POOL_SIZE", "40"))
+BACKEND_KEEPALIVE = os.environ.get("BACKEND_KEEPALIVE", "1").strip().lower() not in ("0", "false", "no")
+BACKEND_KEEPALIVE_EXPIRY = float(os.environ.get("BACKEND_KEEPALIVE_EXPIRY", "30"))
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "1"))
+BACKEND_READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", "3"))
+
+# Circuit breaker cho backend: mở sau N lỗi liên tiếp, thử lại sau RESET giây.
+# Khi mở, chatbot dùng context cũ (tối đa CONTEXT_STALE_MAX_AGE giây) thay vì chờ timeout.
+BACKEND_BREAKER_FAILURES = int(os.environ.get("BACKEND_BREAKER_FAILURES", "5"))
+BACKEND_BREAKER_RESET = float(os.environ.get("BACKEND_BREAKER_RESET", "10"))
+CONTEXT_STALE_MAX_AGE = float(os.environ.get("CONTEXT_STALE_MAX_AGE", "3600"))
+
+# Lấy context: nếu /api/chatbot/context chưa xong sau HEDGE_DELAY giây thì gọi song song
+# /api/deadlines + /api/results; tổng thời gian chờ tối đa là FETCH_BUDGET giây
+CONTEXT_HEDGE_DELAY = float(os.environ.get("CONTEXT_HEDGE_DELAY", "0.5"))
+CONTEXT_FETCH_BUDGET = float(os.environ.get("CONTEXT_FETCH_BUDGET", "3"))
+
+# Analytics theo lớp (/analytics/*): số context lấy song song từ backend, số sinh viên chấm chung một lô
+# (NumPy, xem cohort.py) và số user tối đa mỗi request
+ANALYTICS_FETCH_CONCURRENCY = int(os.environ.get("ANALYTICS_FETCH_CONCURRENCY", "8"))
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", "64"))
+ANALYTICS_MAX_USERS = int(os.environ.get("ANALYTICS_MAX_USERS", "5000"))
+
+# Gom batch dự đoán intent: các request /chat đồng thời trong cửa sổ INTENT_BATCH_WINDOW_MS (ms)
+# được chấm chung một lượt, tối đa INTENT_BATCH_MAX_SIZE câu mỗi batch. 0 = tắt (chấm từng câu)
+INTENT_BATCH_WINDOW_MS = float(os.environ.get("INTENT_BATCH_WINDOW_MS", "0"))
+INTENT_BATCH_MAX_SIZE = int(os.environ.get("INTENT_BATCH_MAX_SIZE", "32"))
+
+# Cache kết quả dự đoán intent theo text đã normalize (số câu tối đa, LRU); 0 = tắt.
+# Tự xoá khi file model (models/intent_clf.npz / .pkl) thay đổi
+INTENT_CACHE_MAXSIZE = int(os.environ.get("INTENT_CACHE_MAXSIZE", "4096"))
+
+# Tra môn học gõ sai / thiếu chữ (trigram + hệ số Dice) khi không khớp chính xác tên môn:
+# ngưỡng điểm tối thiểu trong (0, 1]; <= 0 = tắt
+COURSE_FUZZY_THRESHOLD = float(os.environ.get("COURSE_FUZZY_THRESHOLD", "0.8"))
+
+# Cache câu trả lời của LLM tổng quát (OpenAI / Gemini) cho câu hỏi chung, lưu ở LLM_CACHE_PATH
+# ("" = chỉ giữ trong RAM). Câu gần giống được nhận nếu cosine TF-IDF >= LLM_CACHE_SIMILARITY
+# (1 = chỉ câu trùng khớp). TTL tính bằng giây (0 = không hết hạn); MAXSIZE = số câu tối đa, 0 = tắt
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", str(BASE_DIR / "cache" / "llm_answers.json"))
+LLM_CACHE_MAXSIZE = int(os.environ.get("LLM_CACHE_MAXSIZE", "2000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_SIMILARITY = float(os.environ.get("LLM_CACHE_SIMILARITY", "0.9"))
+
+# LLM tổng quát: LLM_PROVIDER là một provider hoặc danh sách theo thứ tự ưu tiên ("openai,gemini");
+# provider thiếu API key bị bỏ qua. BASE_URL đổi được để trỏ tới proxy / server giả lập khi test.
+# Đọc một lần lúc khởi động (đổi cấu hình cần khởi động lại service)
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "")
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+# Mặc định dùng model theo quickstart mới
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-preview-09-2025")
+GEMINI_BASE_URL = os.environ.get(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"
+).rstrip("/")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "15"))
+
+# Failover giữa các provider: quá LLM_FAILOVER_BUDGET giây mà provider đang gọi chưa trả lời thì gọi thêm
+# provider kế tiếp (<= 0 = chỉ chuyển khi lỗi). LLM_HEDGE=1: gọi thêm sớm hơn, ngay khi vượt p95 latency
+# của provider đó. Provider lỗi LLM_BREAKER_FAILURES lần liên tiếp bị bỏ qua LLM_BREAKER_RESET giây
+LLM_FAILOVER_BUDGET = float(os.environ.get("LLM_FAILOVER_BUDGET", "6"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0").strip().lower() not in ("0", "false", "no")
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+
+# Giới hạn lời gọi LLM ra ngoài: tối đa LLM_MAX_CONCURRENCY lời gọi cùng lúc (0 = không giới hạn); các lời gọi
+# khác chờ trong hàng đợi tối đa LLM_QUEUE_SIZE request, mỗi request chờ tối đa LLM_QUEUE_TIMEOUT giây
+# (0 = chờ tới khi có chỗ). Hàng đợi đầy / chờ quá lâu → trả thông báo lỗi thân thiện ngay.
+# OPENAI_RPM / GEMINI_RPM: quota request mỗi phút của từng provider (token bucket, dồn tối đa LLM_RATE_BURST
+# request; 0 = không giới hạn); provider hết quota được bỏ qua, chuyển sang provider kế tiếp
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_QUEUE_SIZE = int(os.environ.get("LLM_QUEUE_SIZE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "10"))
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", "0"))
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "0"))
+LLM_RATE_BURST = float(os.environ.get("LLM_RATE_BURST", "5"))
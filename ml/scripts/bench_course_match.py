@@ -0,0 +1,123 @@
+"""
+Đo tra môn học gõ sai (index trigram trong CourseMatcher) trên curriculum giả vài trăm môn:
+tỉ lệ tìm đúng với tên bị gõ sai / thiếu chữ, số câu không nhắc môn nào bị khớp nhầm, thời gian
+khớp chính xác so với khi phải tra mờ.
+
+Chạy:  python -m ml.scripts.bench_course_match [--courses 400] [--queries 5000] [--threshold 0.8]
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from ml.scripts.check_router import GOLDEN
+from ml.services.nlp_utils import CourseMatcher, normalize
+
+
+# Tên môn lấy từ chương trình đào tạo thật (backend/src/controllers/curriculumController.ts)
+COURSE_NAMES = [
+    "Triết học Mác - Lênin", "Toán cao cấp", "Tin học cơ sở", "Cơ sở tạo hình", "Nhập môn đa phương tiện",
+    "Giáo dục thể chất", "Kinh tế chính trị Mác - Lênin", "Kỹ thuật nhiếp ảnh", "Mỹ thuật cơ bản",
+    "Thiết kế đồ họa", "Chủ nghĩa xã hội khoa học", "Xác suất thống kê", "Ngôn ngữ lập trình C++",
+    "Toán rời rạc", "Kỹ thuật quay phim", "Thiết kế hình động", "Kỹ năng làm việc nhóm",
+    "Tư tưởng Hồ Chí Minh", "Cấu trúc dữ liệu và giải thuật", "Kiến trúc máy tính và hệ điều hành",
+    "Xử lý và truyền thông đa phương tiện", "Thiết kế tương tác đa phương tiện", "Thiết kế đồ họa 3D",
+    "Kỹ năng tạo lập Văn bản", "Lịch sử Đảng cộng sản Việt Nam", "Ngôn ngữ lập trình Java",
+    "Dựng audio và video phi tuyến", "Thiết kế web cơ bản", "Kỹ xảo đa phương tiện",
+    "Tổ chức sản xuất sản phẩm đa phương tiện", "Kịch bản đa phương tiện", "Lập trình mạng với C++",
+    "Kỹ thuật đồ họa", "Cơ sở dữ liệu", "Nhập môn công nghệ phần mềm", "Bản quyền số", "Lập trình âm thanh",
+    "Kỹ năng thuyết trình", "Phương pháp luận nghiên cứu khoa học", "Thị giác máy tính", "Lập trình Web",
+    "Xử lý ảnh và video", "Lập trình game cơ bản", "Lập trình ứng dụng trên đầu cuối di động",
+    "Chuyên đề phát triển ứng dụng đa phương tiện", "An toàn thông tin", "Phát triển ứng dụng thực tại ảo",
+    "Khai phá dữ liệu đa phương tiện", "Phát triển ứng dụng IoT", "Thực tập chuyên sâu", "Thực tập tốt nghiệp",
+]
+
+_LETTERS = "abcdeghiklmnopqrstuvxy"
+
+
+def _curriculum(n: int, seed: int) -> List[Dict[str, Any]]:
+    """Các tên thật, đủ n môn thì đánh số học phần (Toán cao cấp 1, 2, ...), chia 8 môn mỗi kỳ."""
+    rng = random.Random(seed)
+    if n <= len(COURSE_NAMES):
+        names = COURSE_NAMES[:n]
+    else:
+        parts = -(-n // len(COURSE_NAMES))
+        names = [f"{base} {part}" for part in range(1, parts + 1) for base in COURSE_NAMES][:n]
+    rng.shuffle(names)
+    courses = [{"code": f"INT{1000 + i}", "name": name} for i, name in enumerate(names)]
+    return [{"semester": f"HK{i // 8 + 1}", "courses": courses[i:i + 8]} for i in range(0, len(courses), 8)]
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    """Một lỗi gõ: thêm / bớt / thay một chữ cái, hoặc bỏ một từ ngắn ("và", "với", ...)."""
+    words = name.split()
+    short = [i for i, w in enumerate(words) if len(w) <= 3 and not w.isdigit()]
+    op = rng.randrange(4)
+    if op == 3 and short and len(words) > 3:
+        del words[rng.choice(short)]
+        return " ".join(words)
+    # Chỉ sửa chữ cái (không đụng số thứ tự của môn)
+    positions = [i for i, ch in enumerate(name) if ch.isalpha()]
+    i = rng.choice(positions)
+    if op == 0:
+        return name[:i] + rng.choice(_LETTERS) + name[i:]
+    if op == 1:
+        return name[:i] + name[i + 1:]
+    return name[:i] + rng.choice(_LETTERS.replace(name[i], "")) + name[i + 1:]
+
+
+def _time_us(matcher: CourseMatcher, texts: List[str]) -> float:
+    t0 = time.perf_counter()
+    for t in texts:
+        matcher.find(t, fuzzy=True)
+    return (time.perf_counter() - t0) / len(texts) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    semesters = _curriculum(args.courses, args.seed)
+    courses = [c for sem in semesters for c in sem["courses"]]
+
+    t0 = time.perf_counter()
+    matcher = CourseMatcher(semesters, fuzzy_threshold=args.threshold)
+    build_ms = (time.perf_counter() - t0) * 1000
+    exact_only = CourseMatcher(semesters, fuzzy_threshold=0)
+    print(f"{len(courses)} courses, build {build_ms:.1f} ms, {len(matcher._fuzzy_index)} trigrams")
+
+    templates = ["{} thi khi nao", "diem mon {}", "lich thi {} the nao", "{}", "mon {} co deadline gi khong"]
+    exact, typos, expected = [], [], []
+    for _ in range(args.queries):
+        course = rng.choice(courses)
+        template = rng.choice(templates)
+        exact.append(normalize(template.format(course["name"])))
+        typos.append(normalize(template.format(_typo(course["name"], rng))))
+        expected.append(course["name"])
+
+    found = [matcher.find(t, fuzzy=True) for t in typos]
+    correct = sum(1 for f, name in zip(found, expected) if f and f["name"] == name)
+    wrong = sum(1 for f, name in zip(found, expected) if f and f["name"] != name)
+    print(f"typo queries: {correct / len(typos):6.1%} correct, {wrong / len(typos):6.1%} wrong course, "
+          f"{(len(typos) - correct - wrong) / len(typos):6.1%} not found")
+
+    unrelated = [normalize(t) for t in GOLDEN]
+    false_hits = [(t, f) for t in unrelated if exact_only.find(t) is None for f in [matcher.find(t, fuzzy=True)] if f]
+    print(f"unrelated queries: {len(false_hits)}/{len(unrelated)} matched a course by fuzzy lookup")
+    for t, f in false_hits[:5]:
+        print("  ", repr(t), "->", f["name"])
+
+    print(f"exact hit:           {_time_us(matcher, exact):7.1f} µs/query")
+    print(f"fuzzy (typo):        {_time_us(matcher, typos):7.1f} µs/query")
+    print(f"fuzzy (no course):   {_time_us(matcher, unrelated):7.1f} µs/query")
+    print(f"exact only (typo):   {_time_us(exact_only, typos):7.1f} µs/query")
+
+
+if __name__ == "__main__":
+    main()
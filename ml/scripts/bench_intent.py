@@ -0,0 +1,81 @@
+"""
+Đo throughput dự đoán intent: từng câu (predict_intent) so với batch (predict_intents),
+micro-batch qua predict_intent_async với nhiều request đồng thời và cache kết quả;
+kiểm tra kết quả giống nhau.
+
+Chạy:  python -m ml.scripts.bench_intent [--n 2000] [--concurrency 64] [--window-ms 5]
+"""
+
+import argparse
+import asyncio
+import time
+
+from ml.scripts.check_router import GOLDEN
+from ml.services import intent
+from ml.services.nlp_utils import normalize
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    intent.warm_up()
+    base = [normalize(t) for t in GOLDEN]
+    # Thêm số thứ tự để mọi câu khác nhau (đo phần chấm model, không trúng cache); số không có
+    # trong vocab nên không đổi kết quả
+    texts = [f"{base[i % len(base)]} {i}" for i in range(args.n)]
+
+    intent._prediction_cache.invalidate()
+    t0 = time.perf_counter()
+    single = [intent.predict_intent(t) for t in texts]
+    t_single = time.perf_counter() - t0
+    print(f"predict_intent x{len(texts)}:    {len(texts) / t_single:8.0f} texts/s")
+
+    for size in (8, 32, 128):
+        intent._prediction_cache.invalidate()
+        t0 = time.perf_counter()
+        batched = []
+        for i in range(0, len(texts), size):
+            batched.extend(intent.predict_intents(texts[i:i + size]))
+        dt = time.perf_counter() - t0
+        same = "same" if batched == single else "DIFFERENT"
+        print(f"predict_intents batch={size:<4d}: {len(texts) / dt:8.0f} texts/s  ({same})")
+
+    # Micro-batch: `concurrency` request đồng thời, mỗi request một câu
+    intent.INTENT_BATCH_WINDOW_MS = args.window_ms
+
+    async def _run():
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def _one(t):
+            async with sem:
+                return await intent.predict_intent_async(t)
+
+        return await asyncio.gather(*(_one(t) for t in texts))
+
+    intent._prediction_cache.invalidate()
+    t0 = time.perf_counter()
+    micro = asyncio.run(_run())
+    dt = time.perf_counter() - t0
+    same = "same" if list(micro) == single else "DIFFERENT"
+    stats = intent.intent_stats()
+    avg = stats["batched_texts"] / max(stats["batches"], 1)
+    print(
+        f"micro-batch c={args.concurrency} w={args.window_ms}ms: {len(texts) / dt:8.0f} texts/s  ({same}, "
+        f"{stats['batches']} batches, avg {avg:.1f})"
+    )
+
+    # Câu lặp lại: trúng cache, không chạy model
+    intent.INTENT_BATCH_WINDOW_MS = 0
+    t0 = time.perf_counter()
+    cached = [intent.predict_intent(t) for t in texts]
+    dt = time.perf_counter() - t0
+    same = "same" if cached == single else "DIFFERENT"
+    print(f"cached predict_intent:       {len(texts) / dt:8.0f} texts/s  ({same})")
+
+
+if __name__ == "__main__":
+    main()
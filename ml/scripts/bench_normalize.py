@@ -0,0 +1,85 @@
+"""
+Micro-benchmark normalize (bản compiled + memo) so với cài đặt gốc, kèm kiểm tra kết quả giống hệt.
+
+Chạy:  python -m ml.scripts.bench_normalize [--fuzz 200000] [--repeat 20000]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from ml.services.nlp_utils import ALIAS_MAP, _normalize_reference, normalize
+
+
+SAMPLES = [
+    "Điểm GPA học kỳ 2 của mình là bao nhiêu?",
+    "Mình còn deadline nào môn Cơ sở dữ liệu không",
+    "csdl thi hình thức gì vậy",
+    "Khả năng tốt nghiệp đúng hạn của mình thế nào?",
+    "Lịch thi môn Toán cao cấp 1",
+    "TTCN và TTTN khác nhau thế nào, đồ án thì sao",
+    "Các môn không tính vào GPA",
+    "hello",
+    "Cấu trúc dữ liệu và giải thuật",
+    "Kỹ thuật đồ họa máy tính",
+    "Giáo dục quốc phòng - an ninh 3",
+]
+
+# Bảng chữ cho fuzz: ký tự thường gặp + các ca khó của lower()/NFD (İ, Σ cuối từ, Hangul, dấu kết hợp rời, ...)
+_FUZZ_ALPHABET = (
+    list("abcdeghiklmnopqrstuvwxyz &0123456789  ")
+    + list("ăâđêôơưáàảãạấầẩẫậắằẳẵặéèẻẽẹếềểễệíìỉĩịóòỏõọốồổỗộớờởỡợúùủũụứừửữựýỳỷỹỵ")
+    + list("ĂÂĐÊÔƠƯÁÀẢÃẠÉÈÓÒÚÙÝ")
+    + ["́", "̀", "̣", "̃", "̉", "̂", "̛", "༹", "้"]
+    + ["İ", "Σ", "ß", "ﬁ", "한", "\t", "\n", " ", "Ω", "Å", "ǅ"]
+)
+
+
+def _fuzz_strings(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    pieces = list(ALIAS_MAP.keys()) + [k.upper() for k in ALIAS_MAP] + list(ALIAS_MAP.values())
+    out = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            if rng.random() < 0.3:
+                parts.append(rng.choice(pieces))
+            else:
+                parts.append("".join(rng.choice(_FUZZ_ALPHABET) for _ in range(rng.randint(1, 6))))
+        out.append("".join(parts))
+    return out
+
+
+def _bench(fn: Callable[[str], str], texts: List[str], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        fn(texts[i % len(texts)])
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fuzz", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    uncached = normalize.__wrapped__
+    fuzz = _fuzz_strings(args.fuzz, args.seed)
+    mismatches = [t for t in SAMPLES + fuzz if uncached(t) != _normalize_reference(t)]
+    print(f"checked {len(SAMPLES) + len(fuzz)} strings, mismatches: {len(mismatches)}")
+    for t in mismatches[:5]:
+        print("  ", repr(t), repr(uncached(t)), repr(_normalize_reference(t)))
+
+    normalize.cache_clear()
+    ref_us = _bench(_normalize_reference, SAMPLES, args.repeat)
+    new_us = _bench(uncached, SAMPLES, args.repeat)
+    cached_us = _bench(normalize, SAMPLES, args.repeat)
+    print(f"reference:           {ref_us:7.2f} µs/call")
+    print(f"compiled (no cache): {new_us:7.2f} µs/call  ({ref_us / new_us:.1f}x)")
+    print(f"compiled + memo:     {cached_us:7.2f} µs/call  ({ref_us / cached_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Đo thời gian import service (`python -X importtime -c "import ml.app"`) và kiểm tra ngân sách khởi động:
+
+- tổng thời gian import ml.app (trung vị qua --runs lần, mỗi lần một process mới, đã có .pyc);
+- phần của riêng các module ml.* (ít phụ thuộc máy / bản fastapi hơn);
+- các module nặng không được import lúc khởi động (numpy, httpx, joblib, sklearn, ...): chúng được
+  import khi dùng lần đầu hoặc trong warm_up của lifespan.
+
+Trả mã lỗi 1 nếu vượt ngân sách, dùng được trong CI.
+
+Chạy:  python -m ml.scripts.bench_startup [--runs 5] [--max-ms 1500] [--max-own-ms 100] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+# Import lười: không được xuất hiện khi chỉ import ml.app
+FORBIDDEN = ("numpy", "scipy", "sklearn", "joblib", "httpx", "httpcore", "multiprocessing.pool")
+
+
+def _import_times(target: str) -> Dict[str, Tuple[int, int]]:
+    """{module: (self µs, cumulative µs)} của một lần `import target` trong process mới."""
+    env = dict(os.environ)
+    # Cần ghi .pyc để đo giống lúc worker khởi động lại (không phải biên dịch lại source)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        times.setdefault(name.strip(), (int(self_us), int(cum_us)))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="ml.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=1500.0, help="ngân sách tổng thời gian import")
+    parser.add_argument("--max-own-ms", type=float, default=100.0, help="ngân sách cho các module ml.*")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    _import_times(args.target)  # lần đầu: ghi .pyc
+    runs = [_import_times(args.target) for _ in range(max(args.runs, 1))]
+    total_ms = statistics.median(r[args.target][1] for r in runs) / 1000
+    own_ms = statistics.median(sum(s for name, (s, _) in r.items() if name.split(".")[0] == "ml") for r in runs) / 1000
+
+    last = runs[-1]
+    print(f"import {args.target}: {total_ms:.1f} ms (median of {len(runs)}), ml.* modules: {own_ms:.1f} ms")
+    print("slowest modules (self time, last run):")
+    slowest: List[Tuple[str, Tuple[int, int]]] = sorted(last.items(), key=lambda kv: -kv[1][0])[:args.top]
+    for name, (self_us, cum_us) in slowest:
+        print(f"  {self_us / 1000:7.1f} ms  (cumulative {cum_us / 1000:7.1f} ms)  {name}")
+
+    failed = False
+    loaded = [m for m in FORBIDDEN if m in last]
+    if loaded:
+        print(f"FAIL: imported at startup (should be lazy): {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.max_ms:
+        print(f"FAIL: import {args.target} took {total_ms:.1f} ms > {args.max_ms:.0f} ms")
+        failed = True
+    if own_ms > args.max_own_ms:
+        print(f"FAIL: ml.* modules took {own_ms:.1f} ms > {args.max_own_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK: within startup budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Kiểm tra circuit breaker (ml/services/circuit_breaker.py) với request thăm dò half_open bị huỷ: circuit phải
+cho request khác thăm dò tiếp thay vì kẹt ở half_open. Gồm cả lời gọi backend thật qua data_client._safe_get
+(với transport giả của httpx, không cần backend chạy), provider LLM thăm dò bị thua khi hedge
+(llm_pool.ProviderPool.call) và stream LLM bị bỏ dở trước token đầu tiên (llm_client._stream_candidates).
+
+Chạy:  python -m ml.scripts.check_breaker
+"""
+
+import asyncio
+import time
+from typing import List, Tuple
+
+from ml.services import data_client, llm_client
+from ml.services.circuit_breaker import CircuitBreaker
+from ml.services.http_client import AsyncClientHolder
+from ml.services.llm_pool import ProviderConfig, ProviderPool
+
+# Thời gian chờ trước khi cho thăm dò (giây) — ngắn để script chạy nhanh
+RESET = 0.2
+
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET)
+    breaker.record_failure()
+    time.sleep(RESET)
+    return breaker
+
+
+def check_release() -> List[Tuple[str, bool]]:
+    checks = []
+    breaker = _open_breaker()
+    checks.append(("probe allowed after reset_timeout", breaker.allow_request()))
+    checks.append(("second request rejected while probing", not breaker.allow_request()))
+    breaker.release()
+    checks.append(("released probe → next request probes", breaker.allow_request()))
+    breaker.record_success()
+    checks.append(("probe success closes circuit", breaker.state == CircuitBreaker.CLOSED))
+
+    # Thăm dò bị bỏ mà không ai release: sau reset_timeout vẫn cho thăm dò lại
+    breaker = _open_breaker()
+    breaker.allow_request()
+    time.sleep(RESET)
+    checks.append(("stuck probe times out", breaker.allow_request()))
+    return checks
+
+
+async def check_safe_get() -> List[Tuple[str, bool]]:
+    import httpx
+
+    slow = True
+
+    async def handler(request: "httpx.Request") -> "httpx.Response":
+        if slow:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"ok": True})
+
+    data_client._client = AsyncClientHolder(
+        lambda: httpx.AsyncClient(base_url="http://backend", transport=httpx.MockTransport(handler))
+    )
+    data_client._breaker = breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET)
+    breaker.record_failure()
+    await asyncio.sleep(RESET)
+
+    checks = []
+    # Request thăm dò bị huỷ giữa chừng (như fetch_context huỷ /api/deadlines, /api/results)
+    task = asyncio.create_task(data_client._safe_get("/api/deadlines", params={"userId": "u1"}))
+    await asyncio.sleep(0.05)
+    checks.append(("backend probe in flight", breaker.state == CircuitBreaker.HALF_OPEN))
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    checks.append(("cancelled probe not counted as failure", breaker.state == CircuitBreaker.HALF_OPEN))
+
+    slow = False
+    reply = await data_client._safe_get("/api/deadlines", params={"userId": "u1"})
+    checks.append(("next request probes and closes circuit", reply == {"ok": True} and breaker.state == CircuitBreaker.CLOSED))
+    await data_client.aclose()
+    return checks
+
+
+def _half_open_pool(hedge: bool) -> ProviderPool:
+    """Pool hai provider, breaker của openai vừa hết reset_timeout (lần gọi tới sẽ là thăm dò)."""
+    pool = ProviderPool(
+        [ProviderConfig("openai", "k", "m1", "u"), ProviderConfig("gemini", "k", "m2", "u")],
+        failover_budget=0.05,
+        hedge=hedge,
+        breaker_failures=1,
+        breaker_reset=RESET,
+    )
+    pool.providers[0].breaker.record_failure()
+    return pool
+
+
+async def check_llm_pool() -> List[Tuple[str, bool]]:
+    async def fn(config: ProviderConfig) -> Tuple[str, bool]:
+        # openai (đang thăm dò) chậm → gemini được gọi thêm sau failover_budget và thắng
+        await asyncio.sleep(5 if config.name == "openai" else 0.01)
+        return f"{config.name}-reply", True
+
+    pool = _half_open_pool(hedge=True)
+    await asyncio.sleep(RESET)
+    reply = await pool.call(fn, fallback=None)
+    await asyncio.sleep(0)
+    breaker = pool.providers[0].breaker
+    return [
+        ("llm: probe loses the race", reply == ("gemini-reply", True) and breaker.state == CircuitBreaker.HALF_OPEN),
+        ("llm: cancelled probe released", breaker.allow_request()),
+    ]
+
+
+async def check_llm_stream() -> List[Tuple[str, bool]]:
+    async def slow_stream(config: ProviderConfig, message: str, system_prompt: str):  # type: ignore[no-untyped-def]
+        await asyncio.sleep(5)
+        yield "token", True
+
+    pool = _half_open_pool(hedge=False)
+    llm_client._pool, llm_client._stream_openai = pool, slow_stream
+    await asyncio.sleep(RESET)
+
+    async def consume() -> None:
+        async for _ in llm_client._stream_candidates("xin chào", "system"):
+            pass
+
+    # Client ngắt kết nối trước token đầu tiên
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    breaker = pool.providers[0].breaker
+    return [("llm stream: abandoned probe released", breaker.state == CircuitBreaker.HALF_OPEN and breaker.allow_request())]
+
+
+def main() -> None:
+    checks = check_release() + asyncio.run(check_safe_get())
+    checks += asyncio.run(check_llm_pool()) + asyncio.run(check_llm_stream())
+    for name, ok in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    failed = sum(not ok for _, ok in checks)
+    print(f"{len(checks)} checks, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+So sánh engine cohort (NumPy) với bản tính từng sinh viên trên dữ liệu giả lập và đo thời gian: GPA / tín chỉ /
+môn nợ, cảnh báo học tập (assess_academic_warning) và khả năng tốt nghiệp khi dùng GPA tính theo lô
+(assess_graduation với stats của compute_cohort, như analytics.scan).
+
+Chạy:  python -m ml.scripts.check_cohort [--students 2000] [--seed 42]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ml.services.cohort import compute_cohort, four_from_10_array
+from ml.services.academic import assess_academic_warning, assess_graduation
+from ml.services.context import RequestContext, StudentContext
+from ml.services.logic import _answer_academic_warning, _calculate_gpa_and_credits, four_from_10
+
+
+def _make_curriculum(rng: random.Random, n_sem: int = 8, per_sem: int = 8) -> Dict[str, Any]:
+    semesters = []
+    for s in range(1, n_sem + 1):
+        courses = []
+        for k in range(per_sem):
+            courses.append(
+                {
+                    "code": f"C{s}{k:02d}",
+                    "name": f"Môn {s}.{k}",
+                    "credit": rng.choice([0, 1, 2, 3, 3, 4]),
+                    "countInGpa": rng.random() > 0.15,
+                    "countInCredits": rng.random() > 0.1,
+                }
+            )
+        semesters.append({"semester": f"HK{s}", "courses": courses})
+    return {"_id": "demo", "updatedAt": "1", "semesters": semesters}
+
+
+def _make_context(rng: random.Random, curriculum: Dict[str, Any]) -> Dict[str, Any]:
+    codes = [c["code"] for s in curriculum["semesters"] for c in s["courses"]] + ["KHAC01"]
+    n_sem = rng.randint(1, 8)
+    results: Dict[str, Dict[str, Any]] = {}
+    sem_gpa4: Dict[str, float] = {}
+    cum_gpa4: Dict[str, float] = {}
+    for s in range(1, n_sem + 1):
+        sem: Dict[str, Any] = {}
+        for code in rng.sample(codes, rng.randint(0, 10)):
+            grade = rng.choice([None, "", round(rng.uniform(0, 10), 2), rng.randint(0, 10)])
+            status = rng.choice(["passed", "failed", "studying", "", "Passed"])
+            sem[code] = {"grade": grade, "status": status}
+        results[f"HK{s}"] = sem
+        sem_gpa4[f"HK{s}"] = round(rng.uniform(0.5, 4.0), 2)
+        cum_gpa4[f"HK{s}"] = round(rng.uniform(0.8, 4.0), 2)
+    return {
+        "results": results,
+        "curriculum": curriculum,
+        "stats": {"semGpa4": sem_gpa4, "cumGpa4": cum_gpa4},
+    }
+
+
+def _scalar_warning(ctx: Dict[str, Any]) -> bool:
+    rctx = RequestContext("cohort-check")
+    rctx._ctx, rctx._loaded = ctx, True
+    reply = asyncio.run(_answer_academic_warning(rctx))
+    return "thuộc vùng có nguy cơ" in reply
+
+
+def _graduation_key(a: Dict[str, Any]) -> Dict[str, Any]:
+    # Môn nợ của bản cohort có thêm grade4 → chỉ so mã môn
+    return {**a, "debt_courses": [c["code"] for c in a.get("debt_courses", [])]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    curricula = [_make_curriculum(rng), _make_curriculum(rng)]
+    curricula[1]["_id"] = "demo2"
+    contexts: List[Dict[str, Any]] = [
+        _make_context(rng, rng.choice(curricula)) for _ in range(args.students)
+    ]
+
+    t0 = time.perf_counter()
+    scalar = [_calculate_gpa_and_credits(f"u{i}", ctx) for i, ctx in enumerate(contexts)]
+    t1 = time.perf_counter()
+    batch = compute_cohort(contexts)
+    t2 = time.perf_counter()
+
+    mismatches = 0
+    for ctx, s, b in zip(contexts, scalar, batch):
+        got = {k: b[k] for k in s}
+        got["debt_courses"] = [
+            {k: v for k, v in c.items() if k != "grade4"} for c in b["debt_courses"]
+        ]
+        ok = got == s
+        ok = ok and all(c["grade4"] == four_from_10(c["grade"]) for c in b["debt_courses"])
+        warning = b["academic_warning"]
+        ok = ok and bool(warning and warning["at_risk"]) == _scalar_warning(ctx)
+        sc = StudentContext(ctx)
+        ok = ok and warning == assess_academic_warning(sc)
+        ok = ok and _graduation_key(assess_graduation(None, sc, b)) == _graduation_key(assess_graduation(None, sc))
+        mismatches += 0 if ok else 1
+
+    grid = np.round(np.arange(0, 10.001, 0.005), 3)
+    grid_mismatches = int(
+        sum(a != four_from_10(float(g)) for a, g in zip(four_from_10_array(grid), grid))
+    )
+
+    print(f"students={len(contexts)} mismatches={mismatches} four_from_10 grid mismatches={grid_mismatches}")
+    print(f"scalar: {(t1 - t0) * 1000:.1f} ms   cohort: {(t2 - t1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Kiểm tra tra môn học trên các route của /chat với curriculum thật (tên môn trong bench_course_match):
+
+- câu hỏi chung gần giống tên môn ("ngôn ngữ lập trình nào dễ học" ~ "Ngôn ngữ lập trình C++") không bị
+  course_fallback trả lời thành câu hỏi về môn học (fallback chỉ khớp chính xác);
+- câu nhắc đúng tên môn vẫn đi qua course_fallback;
+- câu gõ sai tên môn vẫn tìm được môn trên các route hỏi về môn học (course, exam_format, điểm môn).
+
+Chạy:  python -m ml.scripts.check_course_match
+"""
+
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+from ml.scripts.bench_course_match import COURSE_NAMES
+from ml.services.context import RequestContext
+from ml.services.logic import _answer_course, _answer_course_fallback, _answer_exam_format, _answer_gpa
+from ml.services.nlp_utils import find_course_in_text
+
+# Câu hỏi chung (không hỏi về một môn cụ thể) mà tra mờ sẽ khớp nhầm một môn
+GENERAL_QUESTIONS = [
+    "ngôn ngữ lập trình nào dễ học",
+    "nên học ngôn ngữ lập trình gì trước",
+    "ngôn ngữ lập trình nào phổ biến nhất",
+    "lập trình game có khó không",
+    "kỹ năng làm việc với khách hàng",
+]
+
+# (câu hỏi, tên môn mong đợi) — nhắc đúng tên môn, course_fallback phải trả lời
+EXACT_QUESTIONS = [
+    ("ngôn ngữ lập trình C++ học những gì", "Ngôn ngữ lập trình C++"),
+    ("cấu trúc dữ liệu và giải thuật", "Cấu trúc dữ liệu và giải thuật"),
+    ("INT1012", "Ngôn ngữ lập trình C++"),
+]
+
+# (câu hỏi gõ sai, tên môn mong đợi) cho các route hỏi về môn học
+TYPO_QUESTIONS = [
+    ("môn cau truc du lieu va giai thuan học gì", "Cấu trúc dữ liệu và giải thuật"),
+    ("hình thức thi môn kien truc may tinh va he dieu hanh", "Kiến trúc máy tính và hệ điều hành"),
+    ("điểm môn xac xuat thong ke của mình", "Xác suất thống kê"),
+]
+
+
+def _context() -> Dict[str, Any]:
+    courses = [
+        {"code": f"INT{1000 + i}", "name": name, "credit": 3, "countInGpa": True, "countInCredits": True}
+        for i, name in enumerate(COURSE_NAMES)
+    ]
+    semesters = [{"semester": f"HK{i // 8 + 1}", "courses": courses[i:i + 8]} for i in range(0, len(courses), 8)]
+    return {
+        "curriculum": {"_id": "course-match-check", "updatedAt": "1", "semesters": semesters},
+        "results": {"HK1": {c["code"]: {"grade": 8, "status": "passed"} for c in courses[:8]}},
+        "deadlines": [],
+    }
+
+
+def _rctx(ctx: Dict[str, Any]) -> RequestContext:
+    rctx = RequestContext("course-match-check")
+    rctx._ctx, rctx._loaded = ctx, True
+    return rctx
+
+
+async def _run(ctx: Dict[str, Any]) -> List[Tuple[str, bool, str]]:
+    checks: List[Tuple[str, bool, str]] = []
+    for text in GENERAL_QUESTIONS:
+        fuzzy = find_course_in_text(text, ctx, fuzzy=True)
+        reply = await _answer_course_fallback(text, _rctx(ctx))
+        detail = f"fuzzy lookup would match {fuzzy['name']!r}" if fuzzy else "no fuzzy match either"
+        checks.append((f"general: {text}", reply is None, detail if reply is None else reply[:80]))
+    for text, name in EXACT_QUESTIONS:
+        reply = await _answer_course_fallback(text, _rctx(ctx))
+        checks.append((f"exact:   {text}", bool(reply and name in reply), (reply or "None")[:80]))
+    handlers = [_answer_course, _answer_exam_format, _answer_gpa]
+    for (text, name), handler in zip(TYPO_QUESTIONS, handlers):
+        reply = await handler(text, _rctx(ctx))
+        checks.append((f"typo:    {text}", name in reply, reply[:80]))
+    return checks
+
+
+def main() -> None:
+    checks = asyncio.run(_run(_context()))
+    for name, ok, detail in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}  ({detail})")
+    failed = sum(not ok for _, ok, _ in checks)
+    print(f"{len(checks)} checks, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
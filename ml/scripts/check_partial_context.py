@@ -0,0 +1,106 @@
+"""
+Kiểm tra /chat khi /api/chatbot/context chậm hoặc lỗi và fetch_context chỉ ghép được một phần context
+(deadlines / results, không có curriculum), với transport giả của httpx (không cần backend chạy):
+
+- câu hỏi cần chương trình học (tín chỉ, môn học) chờ context tổng hợp tới hết CONTEXT_FETCH_BUDGET
+  thay vì trả lời từ phần context hẹp;
+- context tổng hợp lỗi hẳn → các câu hỏi đó báo tạm thiếu dữ liệu chương trình học (không phải "không tìm thấy");
+- câu hỏi chỉ cần deadline vẫn trả lời ngay từ phần context, kèm PARTIAL_NOTE.
+
+Chạy:  python -m ml.scripts.check_partial_context
+"""
+
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+from ml.services import data_client
+from ml.services.circuit_breaker import CircuitBreaker
+from ml.services.http_client import AsyncClientHolder
+from ml.services.logic import CURRICULUM_UNAVAILABLE_REPLY, PARTIAL_NOTE, handle_chat
+
+# Thời gian (giây) rút ngắn để script chạy nhanh: hedge sau 0.05s, budget 1s, context tổng hợp về sau 0.3s
+HEDGE_DELAY = 0.05
+FETCH_BUDGET = 1.0
+COMBINED_DELAY = 0.3
+
+CREDITS_QUESTION = "mình tích lũy được bao nhiêu tín chỉ rồi"
+COURSE_QUESTION = "môn Cấu trúc dữ liệu và giải thuật học gì"
+DEADLINE_QUESTION = "deadline của mình"
+
+
+def _context() -> Dict[str, Any]:
+    courses = [
+        {"code": "INT1001", "name": "Cấu trúc dữ liệu và giải thuật", "credit": 3, "countInGpa": True, "countInCredits": True},
+        {"code": "INT1002", "name": "Kiến trúc máy tính", "credit": 3, "countInGpa": True, "countInCredits": True},
+    ]
+    return {
+        "curriculum": {"_id": "partial-check", "updatedAt": "1", "semesters": [{"semester": "HK1", "courses": courses}]},
+        "results": {"HK1": {"INT1001": {"grade": 8, "status": "passed"}}},
+        "stats": {},
+        "deadlines": [],
+        "user": {"name": "Sinh viên"},
+    }
+
+
+def _install_backend(combined: str) -> None:
+    """combined: "slow" (về sau COMBINED_DELAY giây) hoặc "down" (503)."""
+    import httpx
+
+    ctx = _context()
+
+    async def handler(request: "httpx.Request") -> "httpx.Response":
+        if request.url.path == "/api/chatbot/context":
+            if combined == "down":
+                return httpx.Response(503)
+            await asyncio.sleep(COMBINED_DELAY)
+            return httpx.Response(200, json=ctx)
+        if request.url.path == "/api/deadlines":
+            return httpx.Response(200, json={"data": ctx["deadlines"]})
+        return httpx.Response(200, json={"data": ctx["results"], "stats": ctx["stats"]})
+
+    data_client._client = AsyncClientHolder(
+        lambda: httpx.AsyncClient(base_url="http://backend", transport=httpx.MockTransport(handler))
+    )
+    data_client._breaker = CircuitBreaker(failure_threshold=100, reset_timeout=60)
+    data_client._context_cache.invalidate()
+
+
+async def _run() -> List[Tuple[str, bool, str]]:
+    data_client.CONTEXT_HEDGE_DELAY, data_client.CONTEXT_FETCH_BUDGET = HEDGE_DELAY, FETCH_BUDGET
+    checks: List[Tuple[str, bool, str]] = []
+
+    _install_backend("slow")
+    narrow = await data_client.fetch_context("u-slow-1")
+    checks.append(("slow combined: narrow-only route answers early", narrow.partial, f"partial={narrow.partial}"))
+    data_client._context_cache.invalidate()
+    full = await data_client.fetch_context("u-slow-2", need_curriculum=True)
+    ok = not full.partial and bool(full.ctx and "curriculum" in full.ctx)
+    checks.append(("slow combined: curriculum route waits for it", ok, f"partial={full.partial}"))
+    data_client._context_cache.invalidate()
+    reply = await handle_chat(CREDITS_QUESTION, "u-slow-3")
+    ok = reply != CURRICULUM_UNAVAILABLE_REPLY and PARTIAL_NOTE not in reply
+    checks.append(("slow combined: credits answered from full context", ok, reply[:80]))
+    await data_client.aclose()
+
+    _install_backend("down")
+    for i, text in enumerate((CREDITS_QUESTION, COURSE_QUESTION)):
+        reply = await handle_chat(text, f"u-down-{i}")
+        checks.append((f"combined down: {text}", reply == CURRICULUM_UNAVAILABLE_REPLY, reply[:80]))
+    reply = await handle_chat(DEADLINE_QUESTION, "u-down-deadline")
+    checks.append((f"combined down: {DEADLINE_QUESTION}", reply.endswith(PARTIAL_NOTE), reply[:80]))
+    await data_client.aclose()
+    return checks
+
+
+def main() -> None:
+    checks = asyncio.run(_run())
+    for name, ok, detail in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {name}  ({detail})")
+    failed = sum(not ok for _, ok, _ in checks)
+    print(f"{len(checks)} checks, {failed} failed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Kiểm tra bộ định tuyến /chat (ml/services/router.py) cho kết quả giống chuỗi if/keyword cũ của
+handle_chat trên một golden corpus, và đo chi phí định tuyến mỗi câu.
+
+Mỗi câu được thử với mọi intent model có thể trả về, có / không có user_id và có / không có
+last_intent. Kết quả so sánh là chuỗi handler sẽ được thử (course_fallback có thể trả None và
+nhường cho rule sau).
+
+Chạy:  python -m ml.scripts.check_router [--random 20000]
+"""
+
+import argparse
+import random
+import re
+import timeit
+from typing import List, Optional
+
+from ml.services.nlp_utils import normalize
+from ml.services.router import CHAT_GROUPS, CHAT_ROUTER, MATCH_REGEX
+
+INTENTS = [None, "deadline", "gpa", "graduation", "credits", "course", "other"]
+
+GOLDEN = [
+    "Phân tích điểm mạnh điểm yếu của mình",
+    "môn nào mình học tốt, môn nào kém?",
+    "Chương trình đào tạo ngành Công nghệ đa phương tiện",
+    "quy trình đào tạo thế nào",
+    "học phí bao nhiêu",
+    "chuẩn đầu ra của ngành",
+    "Lịch thi môn Cơ sở dữ liệu",
+    "bao giờ thi CSDL",
+    "Giờ thi môn toán là mấy giờ",
+    "ngày nào thi lập trình web",
+    "Hình thức thi môn Toán cao cấp 1 là gì?",
+    "thi cuối kỳ môn này ra sao",
+    "bài tập lớn hay thi vậy",
+    "Mình có bị cảnh báo học tập không?",
+    "mức cảnh báo của mình",
+    "Khả năng tốt nghiệp đúng hạn của mình thế nào?",
+    "bao giờ mình ra trường",
+    "đồ án tốt nghiệp",
+    "TTTN là gì",
+    "Mình còn deadline nào không",
+    "hạn nộp bài tập môn CSDL",
+    "nộp bài lt web khi nào",
+    "mình đúng hạn không",
+    "Mình đang nợ môn nào?",
+    "danh sách môn nợ",
+    "môn học lại của mình",
+    "Mình tích lũy được bao nhiêu tín chỉ?",
+    "thiếu tín chỉ không",
+    "nợ môn thì sao",
+    "Các môn không tính vào GPA",
+    "môn nào ko tính gpa",
+    "Học kỳ nào GPA cao nhất?",
+    "kỳ nào tốt nhất, hk nào",
+    "GPA học kỳ 2 của mình",
+    "điểm trung bình HK3",
+    "diem hoc ki 1",
+    "GPA hiện tại của mình là bao nhiêu?",
+    "Điểm môn Toán cao cấp 1",
+    "điểm",
+    "Môn Cơ sở dữ liệu học gì",
+    "mình học gì kỳ này",
+    "Mon nay kho khong",
+    "Cơ sở dữ liệu",
+    "Kỹ thuật đồ họa",
+    "xin chào",
+    "hello bot",
+    "Hi",
+    "chào buổi sáng",
+    "ok",
+    "  có ",
+    "được",
+    "uhm",
+    "Bạn là ai?",
+    "giúp tôi với",
+    "còn gì nữa không",
+    "nữa không",
+    "tiếp tục",
+    "còn gì",
+    "Python là gì",
+    "làm sao để học tốt lập trình",
+    "thời tiết hôm nay",
+    "",
+    "   ",
+    "CN",
+    "KH&CN",
+    "hk",
+    "hk2",
+    "thi",
+    "lich",
+    "giờ thi",
+    "GIỜ THI",
+    "Giờ Thi",
+    "MÔN",
+    "Môn",
+    "học gì",
+    "HỌC GÌ",
+    "deadline tốt nghiệp",
+    "điểm mạnh GPA học kỳ 1",
+    "tín chỉ học kỳ 2 cao nhất",
+    "gpa không được tính vào học kỳ 3",
+    "lịch học phí",
+    "chương trình thi",
+]
+
+
+def legacy_route(text: str, intent: Optional[str], last_intent: Optional[str], user_id: Optional[str]) -> List[str]:
+    """Chuỗi if/keyword của handle_chat trước khi chuyển sang router (chỉ phần chọn handler)."""
+    norm_text = normalize(text)
+    text_l = text.lower()
+    out: List[str] = []
+
+    if any(k in norm_text for k in ["diem manh", "diem yeu", "manh yeu", "mon nao manh", "mon nao yeu",
+                                     "mon nao tot", "mon nao kem", "hoc luc manh", "hoc luc yeu",
+                                     "phan tich hoc luc", "phan tich diem manh", "phan tich diem yeu"]):
+        return ["strengths_weaknesses"]
+
+    if intent is None and last_intent:
+        follow_kw = ["con gi nua", "con gi", "them gi", "nua khong", "nua ko", "tiep tuc", "tieptuc", "nua k"]
+        if any(k in norm_text for k in follow_kw):
+            intent = last_intent
+
+    program_kw = ["chuong trinh dao tao", "chuong trinh dao tao cua nganh", "chuong trinh dao tao nganh",
+                  "quy trinh dao tao", "quy trinh dao tao nganh", "cong nghe da phuong tien",
+                  "nganh cong nghe da phuong tien", "tong quan nganh", "chuan dau ra", "cau truc chuong trinh",
+                  "nghe nghiep", "hoc phi", "dieu kien tuyen sinh", "quy trinh nhap hoc", "tai lieu dao tao"]
+    if any(k in norm_text for k in program_kw) or (
+        "dao tao" in norm_text and ("chuong trinh" in norm_text or "quy trinh" in norm_text)
+    ):
+        return ["program_info"]
+    if "thi" in norm_text and (
+        "lich thi" in norm_text or "lich" in norm_text or "ngay thi" in norm_text or "ngay nao" in norm_text
+        or "bao gio" in norm_text or "gio thi" in norm_text or "giờ thi" in text_l
+    ):
+        return ["exam_schedule"]
+    exam_kw = ["hinh thuc thi", "thi cuoi ky", "thi cuoi ki", "thi cuoi", "thi the nao", "thi nhu the nao",
+               "thi kieu gi", "thi mon nay ra sao", "thi mon", "bai tap lon hay thi"]
+    if any(k in norm_text for k in exam_kw):
+        return ["exam_format"]
+    if any(k in norm_text for k in ["canh bao hoc tap", "cảnh báo học tập", "muc canh bao", "mức cảnh báo"]):
+        return ["academic_warning"]
+    if intent == "graduation" or any(k in norm_text for k in ["ra truong", "tot nghiep", "tot nghiep dung han",
+                                                               "ra truong dung han"]):
+        return ["graduation"]
+    if intent == "deadline" or any(k in norm_text for k in ["deadline", "han nop", "han nop bai",
+                                                             "han nop bai tap", "nop bai"]):
+        return ["deadline"]
+    if any(k in norm_text for k in ["no mon nao", "no mon gi", "dang no mon", "mon nao no", "mon gi no",
+                                     "danh sach mon no", "mon hoc lai"]):
+        return ["debt_courses"]
+    if intent == "credits" or any(k in norm_text for k in ["no mon", "thieu tin chi", "tin chi", "bao nhieu tin",
+                                                            "tich luy duoc bao tin", "tich luy duoc bao nhieu tin",
+                                                            "tich luy bao nhieu tin"]):
+        return ["credits"]
+    if "gpa" in norm_text and (
+        "khong tinh" in norm_text or "ko tinh" in norm_text or "khong duoc tinh" in norm_text
+        or "khong tinh vao" in norm_text
+    ):
+        return ["non_gpa_courses"]
+    sem_pattern = re.search(r"(hk|hoc ky|hoc ki)\s*\d+", norm_text)
+    if any(k in norm_text for k in ["cao nhat", "tot nhat", "diem cao nhat", "gpa cao nhat"]) and any(
+        k in norm_text for k in ["hoc ky", "hoc ki", "hk"]
+    ):
+        return ["best_semester"]
+    if ("gpa" in norm_text or "diem" in norm_text or "diem trung binh" in norm_text) and sem_pattern:
+        return ["semester_gpa"]
+    if intent == "gpa" or "gpa" in norm_text or "điểm" in text_l or "diem" in norm_text:
+        return ["gpa"]
+    if intent == "course" or "môn" in text or "mon" in text or "học gì" in text or "hoc gi" in text:
+        return ["course"]
+    if user_id:
+        out.append("course_fallback")
+    if any(g in norm_text for g in ["chào", "chao", "hello", "hi", "xin chào"]):
+        return out + ["greeting"]
+    if norm_text.strip() in ["co", "ok", "oke", "dc", "duoc", "vang", "uh", "uhm", "uk"]:
+        return out + ["short_yes"]
+    if any(q in norm_text for q in ["bạn là ai", "ban la ai", "giúp tôi", "giup toi"]):
+        return out + ["about"]
+    return out + ["llm"]
+
+
+def router_route(text: str, intent: Optional[str], last_intent: Optional[str], user_id: Optional[str]) -> List[str]:
+    norm_text = normalize(text)
+    hits = CHAT_ROUTER.scan(text, norm_text)
+
+    def _intent() -> Optional[str]:
+        if intent is None and last_intent and "follow_up" in hits:
+            return last_intent
+        return intent
+
+    out: List[str] = []
+    for rule in CHAT_ROUTER.candidates(hits, _intent, has_user=bool(user_id)):
+        out.append(rule.handler)
+        if rule.handler != "course_fallback":
+            return out
+    return out + ["llm"]
+
+
+def _random_corpus(n: int, seed: int) -> List[str]:
+    # Ghép ngẫu nhiên các từ khóa (cả dạng có dấu / viết hoa) với từ nối để thử các tổ hợp rule
+    rng = random.Random(seed)
+    words: List[str] = []
+    for g in CHAT_GROUPS:
+        if g.match != MATCH_REGEX:
+            words.extend(g.keywords)
+    words += ["môn", "điểm", "Điểm", "giờ thi", "HK", "học kỳ 2", "kỳ 3", "đồ án", "csdl", "TTCN", "ĐIỂM"]
+    filler = ["mình", "của", "bao nhiêu", "là", "gì", "không", "?", "1", "2", "nào", "thế", "với", "t"]
+    out = []
+    for _ in range(n):
+        parts = [rng.choice(words if rng.random() < 0.5 else filler) for _ in range(rng.randint(1, 5))]
+        text = " ".join(parts)
+        if rng.random() < 0.3:
+            text = text.upper() if rng.random() < 0.5 else text.capitalize()
+        out.append(text)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--random", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    corpus = GOLDEN + _random_corpus(args.random, args.seed)
+    checked = 0
+    mismatches = []
+    for text in corpus:
+        for intent in INTENTS:
+            for last_intent in (None, "deadline"):
+                for user_id in (None, "u1"):
+                    checked += 1
+                    old = legacy_route(text, intent, last_intent, user_id)
+                    new = router_route(text, intent, last_intent, user_id)
+                    if old != new:
+                        mismatches.append((text, intent, last_intent, user_id, old, new))
+    print(f"checked {checked} routings ({len(corpus)} messages), mismatches: {len(mismatches)}")
+    for m in mismatches[:10]:
+        print("  ", m)
+
+    # Chi phí định tuyến mỗi câu, chưa tính model intent (normalize đã memo nên hai phía như nhau)
+    for text in GOLDEN:
+        normalize(text)
+    for name, fn in (("if-chain", legacy_route), ("router", router_route)):
+        best = min(
+            timeit.repeat(lambda: [fn(text, None, None, "u1") for text in GOLDEN], number=args.repeat, repeat=7)
+        )
+        print(f"{name:9s} {best / (args.repeat * len(GOLDEN)) * 1e6:6.2f} µs/message")
+
+    # Số câu phải gọi model intent: chuỗi cũ gọi cho mọi câu không thuộc nhóm điểm mạnh/yếu,
+    # router chỉ gọi khi gặp rule có intent mà từ khóa không khớp
+    old_calls = new_calls = wrong_needs = 0
+    for text in corpus:
+        norm_text = normalize(text)
+        hits = CHAT_ROUTER.scan(text, norm_text)
+        old_calls += "strengths" not in hits
+        for has_user in (True, False):
+            calls: List[int] = []
+            for rule in CHAT_ROUTER.candidates(hits, lambda: calls.append(1), has_user=has_user):
+                if rule.handler != "course_fallback":
+                    break
+            if has_user:
+                new_calls += len(calls)
+            # needs_intent (dùng để tính intent trước ở phía async) phải khớp với lần gọi thật
+            wrong_needs += CHAT_ROUTER.needs_intent(hits, has_user=has_user) != bool(calls)
+    print(f"intent model calls: if-chain {old_calls}, router {new_calls} (of {len(corpus)} messages)")
+    print(f"needs_intent mismatches: {wrong_needs}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Load test end-to-end cho /chat (hoặc /chat/stream) của ML service đang chạy, thường là với stub_server thay
+cho backend Node và OpenAI / Gemini (xem ml/scripts/stub_server.py).
+
+Mỗi request chọn ngẫu nhiên một route của handle_chat (theo --mix), một câu hỏi của route đó (ROUTES) và một
+user trong --users user. Chạy --concurrency client song song (mỗi client gửi request kế tiếp ngay khi nhận
+xong) trong --duration giây, rồi in throughput và latency p50 / p95 / p99 theo route. Với --stream, latency
+là thời gian tới hết stream, kèm thời gian tới sự kiện đầu tiên (TTFB).
+
+Chạy:  python -m ml.scripts.load_test [--url http://127.0.0.1:8000] [--duration 30] [--concurrency 32]
+           [--users 200] [--mix gpa=3,deadline=3,llm=1] [--llm-unique 0.2] [--stream]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Câu hỏi theo handler trả lời (tên handler trong logic._HANDLERS; "llm" = không rule nào trả lời, nhờ LLM
+# tổng quát). Cần có user_id để các rule dữ liệu cá nhân trả lời.
+ROUTES: Dict[str, List[str]] = {
+    "gpa": ["GPA hiện tại của mình là bao nhiêu?", "điểm trung bình tích lũy của mình", "gpa cua minh"],
+    "semester_gpa": ["GPA học kỳ 2 của mình", "điểm trung bình HK3", "diem hoc ki 1"],
+    "best_semester": ["Học kỳ nào GPA cao nhất?", "kỳ nào tốt nhất, hk nào"],
+    "credits": ["Mình tích lũy được bao nhiêu tín chỉ?", "thiếu tín chỉ không"],
+    "debt_courses": ["Mình đang nợ môn nào?", "danh sách môn nợ"],
+    "deadline": ["Mình còn deadline nào không", "deadline sắp tới của mình"],
+    "graduation": ["Khả năng tốt nghiệp đúng hạn của mình thế nào?", "bao giờ mình ra trường"],
+    "academic_warning": ["Mình có bị cảnh báo học tập không?", "mức cảnh báo của mình"],
+    "course": ["Môn Cơ sở dữ liệu học gì", "Môn Kỹ thuật đồ họa học gì"],
+    "exam_format": ["Hình thức thi môn Toán cao cấp là gì?"],
+    "greeting": ["xin chào", "hello bot"],
+    "strengths_weaknesses": ["Phân tích điểm mạnh điểm yếu của mình"],
+    "llm": [
+        "làm sao để học tốt lập trình python",
+        "git rebase khác gì git merge",
+        "REST API là gì",
+        "nên học react hay vue trước",
+        "cách viết CV xin thực tập IT",
+    ],
+}
+# Tỉ lệ mặc định giữa các route: câu hỏi dữ liệu cá nhân chiếm phần lớn, LLM ít hơn nhưng chậm nhất
+DEFAULT_MIX = {
+    "gpa": 3, "semester_gpa": 2, "best_semester": 1, "credits": 2, "debt_courses": 2, "deadline": 4,
+    "graduation": 1, "academic_warning": 1, "course": 2, "exam_format": 1, "greeting": 2,
+    "strengths_weaknesses": 1, "llm": 3,
+}
+
+
+def _parse_mix(text: Optional[str]) -> Dict[str, float]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"unknown route {name!r}; routes: {', '.join(ROUTES)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+async def _send(client: Any, path: str, payload: Dict[str, Any], stream: bool) -> Tuple[bool, float, float]:
+    """(thành công, latency tới hết response, latency tới sự kiện đầu tiên) — giây."""
+    t0 = time.perf_counter()
+    if not stream:
+        resp = await client.post(path, json=payload)
+        ok = resp.status_code == 200 and bool(resp.json().get("reply"))
+        dt = time.perf_counter() - t0
+        return ok, dt, dt
+    first: Optional[float] = None
+    done = False
+    async with client.stream("POST", path, json=payload) as resp:
+        if resp.status_code != 200:
+            return False, time.perf_counter() - t0, time.perf_counter() - t0
+        async for line in resp.aiter_lines():
+            if line.startswith("data:") and first is None:
+                first = time.perf_counter() - t0
+            if line.startswith("event: done"):
+                done = True
+    dt = time.perf_counter() - t0
+    return done, dt, first if first is not None else dt
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import httpx
+
+    mix = _parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(args.seed)
+    users = [f"{rng.getrandbits(96):024x}" for _ in range(args.users)]
+    path = "/chat/stream" if args.stream else "/chat"
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    ttfb: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    counter = 0
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        metrics_before = await _metrics(client)
+        deadline = time.perf_counter() + args.duration
+
+        async def _worker() -> None:
+            nonlocal counter
+            while time.perf_counter() < deadline:
+                route = rng.choices(names, weights)[0]
+                message = rng.choice(ROUTES[route])
+                counter += 1
+                if route == "llm" and rng.random() < args.llm_unique:
+                    # Câu mới chưa có trong cache câu trả lời → chắc chắn gọi provider
+                    message = f"{message} (câu {counter})"
+                payload = {"user_id": rng.choice(users), "message": message}
+                try:
+                    ok, dt, first = await _send(client, path, payload, args.stream)
+                except httpx.HTTPError:
+                    ok, dt, first = False, 0.0, 0.0
+                if ok:
+                    latencies[route].append(dt)
+                    ttfb[route].append(first)
+                else:
+                    errors[route] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+        metrics_after = await _metrics(client)
+
+    total = sum(len(v) for v in latencies.values())
+    total_errors = sum(errors.values())
+    print(f"{path} x{args.concurrency} clients, {elapsed:.1f} s: {total} ok, {total_errors} errors, "
+          f"{total / elapsed:.1f} req/s")
+    header = f"{'route':<22}{'ok':>7}{'err':>6}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    if args.stream:
+        header += f"{'ttfb p50':>10}{'ttfb p95':>10}"
+    print(header)
+    for route in sorted(set(latencies) | set(errors), key=lambda r: -len(latencies.get(r, []))):
+        ordered = sorted(latencies.get(route, [])) or [0.0]
+        row = (
+            f"{route:<22}{len(latencies.get(route, [])):>7}{errors.get(route, 0):>6}"
+            f"{len(latencies.get(route, [])) / elapsed:>8.1f}"
+            f"{_percentile(ordered, 0.5) * 1000:>9.1f}{_percentile(ordered, 0.95) * 1000:>9.1f}"
+            f"{_percentile(ordered, 0.99) * 1000:>9.1f}{ordered[-1] * 1000:>9.1f}"
+        )
+        if args.stream:
+            first = sorted(ttfb.get(route, [])) or [0.0]
+            row += f"{_percentile(first, 0.5) * 1000:>10.1f}{_percentile(first, 0.95) * 1000:>10.1f}"
+        print(row)
+    every = sorted(x for v in latencies.values() for x in v)
+    if every:
+        print(f"{'all':<22}{total:>7}{total_errors:>6}{total / elapsed:>8.1f}"
+              f"{_percentile(every, 0.5) * 1000:>9.1f}{_percentile(every, 0.95) * 1000:>9.1f}"
+              f"{_percentile(every, 0.99) * 1000:>9.1f}{every[-1] * 1000:>9.1f}  (mean {statistics.mean(every) * 1000:.1f})")
+    _print_metrics(metrics_before, metrics_after)
+
+
+async def _metrics(client: Any) -> Optional[Dict[str, Any]]:
+    try:
+        resp = await client.get("/metrics")
+        return resp.json() if resp.status_code == 200 else None
+    except Exception:
+        return None
+
+
+def _print_metrics(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    """Vài số liệu của service trong lúc chạy (chênh lệch /metrics trước / sau)."""
+    if not before or not after:
+        return
+
+    def _delta(*keys: str) -> Any:
+        a: Any = after
+        b: Any = before
+        for k in keys:
+            a, b = (a or {}).get(k), (b or {}).get(k)
+        return a - b if isinstance(a, (int, float)) and isinstance(b, (int, float)) else a
+
+    print("service:")
+    print(f"  context cache hits +{_delta('context_cache', 'hits')}, misses +{_delta('context_cache', 'misses')}; "
+          f"backend requests +{_delta('backend_pool', 'requests')}, errors +{_delta('backend_pool', 'errors')}")
+    llm = after.get("llm") or {}
+    if llm:
+        print(f"  llm provider calls +{_delta('llm', 'provider_calls')}, coalesced +{_delta('llm', 'coalesced')}, "
+              f"answer cache hits +{_delta('llm', 'answer_cache', 'hits')}; "
+              f"failovers +{_delta('llm', 'pool', 'failovers')}, hedges +{_delta('llm', 'pool', 'hedges')}")
+        limiter = llm.get("limiter") or {}
+        print(f"  llm limiter rejected +{_delta('llm', 'limiter', 'rejected')}, timed out "
+              f"+{_delta('llm', 'limiter', 'timed_out')}, peak waiting {limiter.get('peak_waiting')}, "
+              f"queue p95 {limiter.get('queue_ms_p95')} ms")
+        print("  " + json.dumps({name: {k: p.get(k) for k in ("calls", "errors", "p95_ms", "rate_limited")}
+                                 for name, p in (llm.get("pool") or {}).get("providers", {}).items()}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--mix", default=None, help="route=trọng số,... (mặc định DEFAULT_MIX)")
+    parser.add_argument("--llm-unique", type=float, default=0.2, help="tỉ lệ câu hỏi LLM không trùng câu nào trước đó")
+    parser.add_argument("--stream", action="store_true", help="gửi tới /chat/stream")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
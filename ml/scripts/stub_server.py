@@ -0,0 +1,286 @@
+"""
+Server giả lập các dịch vụ bên ngoài của ML service, để chạy / load test /chat trên máy local mà không tốn
+quota API và không cần backend Node + MongoDB:
+
+- OpenAI:  POST /v1/chat/completions (thường và stream SSE)
+- Gemini:  POST /v1beta/models/{model}:generateContent, :streamGenerateContent?alt=sse
+- Backend: GET /api/chatbot/context, /api/deadlines, /api/results, /api/users/name (?userId=...);
+  dữ liệu sinh ngẫu nhiên nhưng cố định theo userId (chương trình đào tạo, điểm, deadline)
+- GET /_stub/stats: số request / lỗi giả lập theo endpoint
+
+Latency (trung bình ± jitter, một phần request chậm gấp --slow-factor lần) và tỉ lệ lỗi chỉnh riêng cho
+backend / OpenAI / Gemini. Trỏ ML service vào server này:
+
+    BACKEND_BASE=http://127.0.0.1:5070 LLM_PROVIDER=openai,gemini OPENAI_API_KEY=stub GEMINI_API_KEY=stub \\
+    OPENAI_BASE_URL=http://127.0.0.1:5070/v1 GEMINI_BASE_URL=http://127.0.0.1:5070/v1beta LLM_CACHE_PATH= \\
+    uvicorn ml.app:app --port 8000
+
+Chạy:  python -m ml.scripts.stub_server [--port 5070] [--backend-latency-ms 30] [--llm-latency-ms 800]
+           [--openai-error-rate 0] [--gemini-error-rate 0] [--backend-error-rate 0] [--slow-rate 0]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ml.scripts.bench_course_match import COURSE_NAMES
+
+_EXAM_FORMATS = ["Tự luận", "Trắc nghiệm", "Vấn đáp", "Bài tập lớn", "Thực hành"]
+_SEMESTERS = 8
+_COURSES_PER_SEMESTER = 6
+# Câu trả lời giả của LLM: câu mở đầu nhắc lại câu hỏi, rồi các từ đệm cho đủ --tokens token
+_FILLER = (
+    "Đây là câu trả lời giả lập từ stub server , dùng để đo tải của chatbot mà không gọi API thật ."
+).split()
+
+
+def _curriculum() -> Dict[str, Any]:
+    rng = random.Random(0)
+    names = list(COURSE_NAMES)
+    semesters = []
+    for s in range(_SEMESTERS):
+        courses = []
+        for c in range(_COURSES_PER_SEMESTER):
+            i = s * _COURSES_PER_SEMESTER + c
+            name = names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "")
+            courses.append({
+                "code": f"INT{1100 + i}",
+                "name": name,
+                "credit": rng.choice([2, 3, 3, 4]),
+                "countInGpa": "thể chất" not in name,
+                "countInCredits": "thể chất" not in name,
+                "examFormat": rng.choice(_EXAM_FORMATS),
+            })
+        semesters.append({"semester": f"HK{s + 1}", "courses": courses})
+    return {"specialization": "dev", "name": "Công nghệ đa phương tiện", "requiredCredits": 150, "semesters": semesters}
+
+
+_CURRICULUM = _curriculum()
+
+
+def _gpa4(grade: float) -> float:
+    for threshold, value in ((8.5, 4.0), (8.0, 3.5), (7.0, 3.0), (6.5, 2.5), (5.5, 2.0), (5.0, 1.5), (4.0, 1.0)):
+        if grade >= threshold:
+            return value
+    return 0.0
+
+
+def _user_context(user_id: str) -> Dict[str, Any]:
+    """Context cùng dạng /api/chatbot/context của backend, cố định theo userId."""
+    rng = random.Random(zlib.crc32(user_id.encode()))
+    current = rng.randint(2, _SEMESTERS - 1)
+    results: Dict[str, Dict[str, Any]] = {}
+    sem_gpa: Dict[str, float] = {}
+    cum_gpa: Dict[str, float] = {}
+    total_points = total_credits = 0.0
+    for sem in _CURRICULUM["semesters"][:current]:
+        name = sem["semester"]
+        entries: Dict[str, Any] = {}
+        points = credits = 0.0
+        for course in sem["courses"]:
+            if name == f"HK{current}":
+                entries[course["code"]] = {"status": "in-progress"}
+                continue
+            grade = round(min(max(rng.gauss(7.2, 1.5), 0.0), 10.0), 1)
+            entries[course["code"]] = {"grade": grade, "status": "passed" if grade >= 4 else "failed"}
+            if course["countInGpa"]:
+                points += _gpa4(grade) * course["credit"]
+                credits += course["credit"]
+        results[name] = entries
+        if credits:
+            total_points += points
+            total_credits += credits
+            sem_gpa[name] = round(points / credits, 2)
+            cum_gpa[name] = round(total_points / total_credits, 2)
+
+    now = datetime.now(timezone.utc)
+    current_courses = _CURRICULUM["semesters"][current - 1]["courses"]
+    deadlines = []
+    for i in range(rng.randint(2, 6)):
+        course = rng.choice(current_courses)
+        offset = rng.uniform(-20, 40)
+        is_exam = rng.random() < 0.3
+        end_at = now + timedelta(days=offset)
+        status = "overdue" if offset < 0 else ("ongoing" if offset < 7 else "upcoming")
+        if offset < 0 and rng.random() < 0.5:
+            status = "completed"
+        deadlines.append({
+            "_id": f"{user_id[:16]}{i:08x}",
+            "title": ("Thi cuối kỳ " if is_exam else "Bài tập lớn ") + course["name"],
+            "courseCode": course["code"],
+            "startAt": (end_at - timedelta(days=14)).isoformat(),
+            "endAt": end_at.isoformat(),
+            "isExam": is_exam,
+            "status": status,
+            "note": "",
+        })
+
+    return {
+        "user": {"id": user_id, "name": f"Sinh viên {user_id[-4:]}", "email": f"{user_id}@stub.local", "provider": "local"},
+        "results": results,
+        "stats": {"semGpa4": sem_gpa, "cumGpa4": cum_gpa},
+        "specialization": _CURRICULUM["specialization"],
+        "currentStudySem": f"HK{current}",
+        "curriculum": _CURRICULUM,
+        "deadlines": deadlines,
+    }
+
+
+def _reply_tokens(question: str, n_tokens: int) -> List[str]:
+    words = question.split()[:12] or ["..."]
+    tokens = [" Về", " câu", " hỏi", f' "{words[0]}'] + [f" {w}" for w in words[1:]] + ['":']
+    i = 0
+    while len(tokens) < n_tokens:
+        tokens.append(f" {_FILLER[i % len(_FILLER)]}")
+        i += 1
+    return tokens[:max(n_tokens, 1)]
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="ML service stub")
+    rng = random.Random(args.seed)
+    counts: Counter = Counter()
+    started = time.monotonic()
+
+    def _latency(mean_ms: float) -> float:
+        delay = mean_ms * rng.uniform(1 - args.jitter, 1 + args.jitter) / 1000
+        if rng.random() < args.slow_rate:
+            delay *= args.slow_factor
+        return max(delay, 0.0)
+
+    def _fail(endpoint: str, rate: float) -> bool:
+        counts[f"{endpoint}.requests"] += 1
+        if rng.random() < rate:
+            counts[f"{endpoint}.errors"] += 1
+            return True
+        return False
+
+    # --- Backend ---
+
+    async def _backend(endpoint: str, user_id: Optional[str]) -> Optional[JSONResponse]:
+        await asyncio.sleep(_latency(args.backend_latency_ms))
+        if _fail(endpoint, args.backend_error_rate):
+            return JSONResponse({"message": "Service unavailable (stub)"}, status_code=503)
+        if not user_id:
+            return JSONResponse({"message": "userId required"}, status_code=400)
+        return None
+
+    @app.get("/api/chatbot/context")
+    async def chatbot_context(userId: Optional[str] = None):
+        return await _backend("context", userId) or _user_context(userId)  # type: ignore[arg-type]
+
+    @app.get("/api/deadlines")
+    async def deadlines(userId: Optional[str] = None):
+        return await _backend("deadlines", userId) or {"data": _user_context(userId)["deadlines"]}  # type: ignore[arg-type]
+
+    @app.get("/api/results")
+    async def results(userId: Optional[str] = None):
+        error = await _backend("results", userId)
+        if error is not None:
+            return error
+        ctx = _user_context(userId)  # type: ignore[arg-type]
+        return {
+            "data": ctx["results"],
+            "stats": ctx["stats"],
+            "specialization": ctx["specialization"],
+            "currentStudySem": ctx["currentStudySem"],
+        }
+
+    @app.get("/api/users/name")
+    async def user_name(userId: Optional[str] = None):
+        return await _backend("users", userId) or {"name": _user_context(userId)["user"]["name"]}  # type: ignore[arg-type]
+
+    # --- LLM ---
+
+    async def _stream(events: List[str], total: float, done: Optional[str]) -> AsyncIterator[str]:
+        # Latency chia đều cho các token: client nhận token đầu tiên sau total / số token
+        for event in events:
+            await asyncio.sleep(total / len(events))
+            yield event
+        if done:
+            yield done
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        latency = _latency(args.llm_latency_ms)
+        if _fail("openai", args.openai_error_rate):
+            await asyncio.sleep(latency / 10)
+            error = {"message": "Rate limit reached (stub)", "type": "rate_limit_error"}
+            return JSONResponse({"error": error}, status_code=429)
+        question = next((m.get("content", "") for m in reversed(body.get("messages") or []) if m.get("role") == "user"), "")
+        tokens = _reply_tokens(question, args.tokens)
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            }
+        events = [f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': t}}]}, ensure_ascii=False)}\n\n" for t in tokens]
+        return StreamingResponse(_stream(events, latency, "data: [DONE]\n\n"), media_type="text/event-stream")
+
+    @app.post("/v1beta/models/{target}")
+    async def gemini_generate(target: str, request: Request):
+        body = await request.json()
+        latency = _latency(args.llm_latency_ms)
+        if _fail("gemini", args.gemini_error_rate):
+            await asyncio.sleep(latency / 10)
+            error = {"code": 429, "message": "Resource has been exhausted (stub)", "status": "RESOURCE_EXHAUSTED"}
+            return JSONResponse({"error": error}, status_code=429)
+        parts = ((body.get("contents") or [{}])[0].get("parts") or [{}])
+        prompt = parts[0].get("text", "")
+        # Prompt gửi Gemini = system prompt + "Dữ liệu đầu vào:" + câu hỏi (xem llm_client._gemini_request)
+        tokens = _reply_tokens(prompt.rsplit("Dữ liệu đầu vào:", 1)[-1].strip(), args.tokens)
+
+        def _candidate(text: str) -> Dict[str, Any]:
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+
+        if target.endswith(":streamGenerateContent"):
+            events = [f"data: {json.dumps(_candidate(t), ensure_ascii=False)}\r\n\r\n" for t in tokens]
+            return StreamingResponse(_stream(events, latency, None), media_type="text/event-stream")
+        if not target.endswith(":generateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"Unknown method {target}"}}, status_code=404)
+        await asyncio.sleep(latency)
+        return _candidate("".join(tokens))
+
+    @app.get("/_stub/stats")
+    async def stats():
+        return {"uptime_s": round(time.monotonic() - started, 1), **dict(sorted(counts.items()))}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5070)
+    parser.add_argument("--backend-latency-ms", type=float, default=30.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="thời gian trả lời đủ câu của LLM")
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency ngẫu nhiên trong mean × (1 ± jitter)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="tỉ lệ request chậm gấp --slow-factor lần")
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--backend-error-rate", type=float, default=0.0, help="tỉ lệ trả 503")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="tỉ lệ trả 429")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="tỉ lệ trả 429")
+    parser.add_argument("--tokens", type=int, default=40, help="số token mỗi câu trả lời LLM")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
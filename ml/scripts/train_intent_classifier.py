@@ -1,6 +1,10 @@
+import argparse
+import hashlib
+import json
 from pathlib import Path
 
 import joblib
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
@@ -56,24 +60,92 @@ def build_training_data():
     return texts, labels
 
 
-def main():
-    texts, labels = build_training_data()
+def export_compact(pipeline, out_path, source_path):
+    """
+    Xuất phần cần cho suy luận (vocab, idf, hệ số LogisticRegression dạng float32) ra file .npz
+    để ml/services/intent.py chấm bằng NumPy mà không cần sklearn (xem CompactIntentModel).
+    """
+    tfidf = pipeline.steps[0][1]
+    clf = pipeline.steps[-1][1]
+    if (
+        tfidf.analyzer != "word"
+        or tfidf.tokenizer is not None
+        or tfidf.preprocessor is not None
+        or tfidf.stop_words is not None
+        or tfidf.strip_accents is not None
+        or tfidf.binary
+        or tfidf.sublinear_tf
+        or not tfidf.use_idf
+        or tfidf.norm not in ("l1", "l2", None)
+    ):
+        raise ValueError("Cấu hình TfidfVectorizer này chưa được bản compact hỗ trợ")
+
+    terms = [None] * len(tfidf.vocabulary_)
+    for term, idx in tfidf.vocabulary_.items():
+        terms[idx] = term
+    coef = clf.coef_
+    intercept = clf.intercept_
+    if coef.shape[0] == 1:
+        # Bài toán 2 lớp: sklearn lưu một hàng cho lớp dương; thêm hàng 0 cho lớp âm và dùng softmax
+        # (softmax của [0, z] chính là sigmoid(z))
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([[0.0], intercept])
+        multinomial = True
+    else:
+        multi_class = getattr(clf, "multi_class", "auto")
+        multinomial = multi_class == "multinomial" or (multi_class != "ovr" and clf.solver != "liblinear")
 
-    pipeline = Pipeline(
-        [
-            ("tfidf", TfidfVectorizer(ngram_range=(1, 2), lowercase=True)),
-            ("clf", LogisticRegression(max_iter=1000)),
-        ]
+    meta = {
+        "token_pattern": tfidf.token_pattern,
+        "ngram_range": list(tfidf.ngram_range),
+        "lowercase": bool(tfidf.lowercase),
+        "norm": tfidf.norm,
+        "multinomial": multinomial,
+        "source_sha1": hashlib.sha1(Path(source_path).read_bytes()).hexdigest(),
+    }
+    np.savez(
+        out_path,
+        meta=np.array(json.dumps(meta)),
+        terms=np.array(terms),
+        idf=tfidf.idf_.astype(np.float64),
+        coef=coef.astype(np.float32),
+        intercept=intercept.astype(np.float64),
+        classes=np.array([str(c) for c in clf.classes_]),
     )
 
-    pipeline.fit(texts, labels)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--export-only",
+        action="store_true",
+        help="Không train lại, chỉ xuất bản compact từ models/intent_clf.pkl hiện có",
+    )
+    args = parser.parse_args()
 
     out_path = MODELS_DIR / "intent_clf.pkl"
-    joblib.dump(pipeline, out_path)
-    print(f"Đã train xong mô hình phân loại intent và lưu vào: {out_path}")
+    compact_path = MODELS_DIR / "intent_clf.npz"
 
+    if args.export_only:
+        pipeline = joblib.load(out_path)
+    else:
+        texts, labels = build_training_data()
 
-if __name__ == "__main__":
-    main()
+        pipeline = Pipeline(
+            [
+                ("tfidf", TfidfVectorizer(ngram_range=(1, 2), lowercase=True)),
+                ("clf", LogisticRegression(max_iter=1000)),
+            ]
+        )
+
+        pipeline.fit(texts, labels)
+
+        joblib.dump(pipeline, out_path)
+        print(f"Đã train xong mô hình phân loại intent và lưu vào: {out_path}")
 
+    export_compact(pipeline, compact_path, out_path)
+    print(f"Đã xuất bản compact (NumPy) vào: {compact_path}")
 
+
+if __name__ == "__main__":
+    main()
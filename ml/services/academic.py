@@ -0,0 +1,255 @@
+"""
+Các phép đánh giá học tập thuần (không I/O, không async): GPA / tín chỉ / môn nợ, cảnh báo học tập,
+khả năng tốt nghiệp đúng hạn. Dùng chung cho câu trả lời /chat (logic.py) và các endpoint
+analytics (analytics.py), nên chỉ nhận dữ liệu thuần và trả về dict.
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+from ml.services.context import StudentContext, compile_context, sem_num
+
+
+_DIGIT_RE = re.compile(r"\d")
+
+# Giả định: Tốt nghiệp yêu cầu GPA >= 2.0 (hệ 4) và đủ tín chỉ
+GRADUATION_MIN_GPA4 = 2.0
+# Giả định khung chương trình chuẩn: 8 học kỳ chính (4 năm, 2 kỳ/năm)
+STANDARD_SEMESTERS = 8
+
+
+def four_from_10(grade10: float) -> float:
+    """
+    Chuyển đổi điểm hệ 10 sang hệ 4.
+    Theo bảng: 8.95-10 → 4.0, 8.45-8.94 → 3.7, 7.95-8.44 → 3.5,
+    6.95-7.94 → 3.0, 6.45-6.94 → 2.5, 5.45-6.44 → 2.0,
+    4.95-5.44 → 1.5, 3.95-4.94 → 1.0, dưới 3.95 → 0.0
+    """
+    if grade10 >= 8.95:
+        return 4.0
+    elif grade10 >= 8.45:
+        return 3.7
+    elif grade10 >= 7.95:
+        return 3.5
+    elif grade10 >= 6.95:
+        return 3.0
+    elif grade10 >= 6.45:
+        return 2.5
+    elif grade10 >= 5.45:
+        return 2.0
+    elif grade10 >= 4.95:
+        return 1.5
+    elif grade10 >= 3.95:
+        return 1.0
+    else:
+        return 0.0
+
+
+def calculate_gpa_and_credits(
+    user_id: Optional[str],
+    ctx: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Tính GPA tích lũy, tín chỉ tích lũy, và danh sách môn nợ."""
+    # Trong /api/chatbot/context, backend trả:
+    # - results: object {semesterKey: {courseCode: {grade,status,...}}}
+    # - curriculum: object với field semesters
+    return gpa_and_credits(compile_context(ctx))
+
+
+def gpa_and_credits(sc: StudentContext) -> Dict[str, Any]:
+    """Như calculate_gpa_and_credits nhưng nhận context đã biên dịch."""
+    if not sc.results or not sc.curriculum:
+        return {
+            "gpa": None,
+            "total_credits_passed": 0,
+            "total_credits_gpa": 0,
+            "required_credits": 0,
+            "required_credits_gpa": 0,
+            "debt_courses": [],
+            "error": "Không tìm thấy dữ liệu kết quả học tập hoặc chương trình học.",
+        }
+
+    return sc.gpa_stats()
+
+
+def assess_academic_warning(sc: StudentContext) -> Optional[Dict[str, Any]]:
+    """
+    Đánh giá nguy cơ cảnh báo học tập theo stats.semGpa4 / stats.cumGpa4 của học kỳ mới nhất:
+    - ĐTB chung học kỳ chính < 1.0
+    - ĐTB chung tích lũy dưới các ngưỡng tùy năm: 1.20, 1.40, 1.60, 1.80
+    Trả về None nếu chưa đủ dữ liệu.
+    """
+    sem_gpa4 = sc.sem_gpa4
+    cum_gpa4 = sc.cum_gpa4
+    if not isinstance(sem_gpa4, dict) or not isinstance(cum_gpa4, dict) or not sem_gpa4:
+        return None
+
+    last_key = sc.latest_sem_key
+    try:
+        gpa_sem: Optional[float] = float(sem_gpa4[last_key])
+    except Exception:
+        gpa_sem = None
+
+    try:
+        gpa_cum: Optional[float] = float(cum_gpa4.get(last_key, 0.0))
+    except Exception:
+        gpa_cum = None
+
+    sem_index = sem_num(last_key)
+    year = (sem_index + 1) // 2 if sem_index > 0 else 1
+    if year <= 1:
+        threshold = 1.20
+    elif year == 2:
+        threshold = 1.40
+    elif year == 3:
+        threshold = 1.60
+    else:
+        threshold = 1.80
+
+    sem_below = gpa_sem is not None and gpa_sem < 1.0
+    cum_below = gpa_cum is not None and gpa_cum < threshold
+    return {
+        "semester": sem_index,
+        "year": year,
+        "gpa_sem": gpa_sem,
+        "gpa_cum": gpa_cum,
+        "threshold": threshold,
+        "sem_below": sem_below,
+        "cum_below": cum_below,
+        "at_risk": sem_below or cum_below,
+    }
+
+
+def assess_graduation(
+    user_id: Optional[str], sc: StudentContext, stats: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Ước lượng khả năng tốt nghiệp đúng hạn từ tiến độ tín chỉ, GPA và môn nợ.
+    `stats` (GPA / tín chỉ / môn nợ) đã tính sẵn thì dùng luôn, vd một dòng của cohort.compute_cohort.
+    Nếu thiếu dữ liệu, dict trả về có khóa "error".
+    """
+    if stats is None:
+        stats = gpa_and_credits(sc)
+    gpa10 = stats.get("gpa")  # GPA hệ 10
+    total_credits_passed = stats.get("total_credits_passed", 0)
+    required_credits = stats.get("required_credits", 0)
+    debt_courses: List[Dict[str, Any]] = stats.get("debt_courses", [])
+
+    if gpa10 is None or required_credits == 0:
+        return {
+            "error": stats.get(
+                "error", "Không thể ước lượng: Thiếu thông tin về GPA hoặc tổng tín chỉ yêu cầu."
+            )
+        }
+
+    # GPA hệ 4 (kỳ mới nhất) từ backend; nếu không có thì chuyển đổi từ hệ 10
+    gpa4 = sc.latest_cum_gpa4
+    if gpa4 is None:
+        gpa4 = four_from_10(gpa10)
+
+    # 1. Mức rủi ro GPA
+    if gpa4 < GRADUATION_MIN_GPA4:
+        gpa_risk = 2
+    elif gpa4 < 2.3:
+        gpa_risk = 1
+    else:
+        gpa_risk = 0
+
+    # 2. Tín chỉ còn thiếu
+    remaining_credits = required_credits - total_credits_passed
+
+    # 3. Rủi ro nợ môn theo trọng số tín chỉ
+    debt_credits = sum(c["credit"] for c in debt_courses)
+    if debt_credits == 0:
+        debt_risk_text = "rất thấp"
+        debt_risk = 0
+    elif debt_credits <= 4:
+        debt_risk_text = "thấp"
+        debt_risk = 1
+    elif debt_credits <= 10:
+        debt_risk_text = "trung bình"
+        debt_risk = 2
+    else:
+        debt_risk_text = "cao"
+        debt_risk = 3
+
+    # 4. Tiến độ theo số học kỳ đã thực sự học có tích lũy tín chỉ (dựa trên dữ liệu điểm từng kỳ),
+    # tránh trường hợp backend tạo sẵn nhiều key HK nhưng chưa có tín chỉ -> làm lệch tốc độ học/kỳ.
+    sem_gpa4 = sc.sem_gpa4
+    credits_per_sem = sc.passed_credits_per_sem
+    if credits_per_sem:
+        semesters_passed = len(credits_per_sem)
+    elif isinstance(sem_gpa4, dict) and sem_gpa4:
+        # Fallback: nếu chưa tách được theo học kỳ thì ước lượng từ GPA
+        semesters_passed = len(sem_gpa4)
+    else:
+        semesters_passed = 1
+
+    # Nếu backend có truyền kỳ học hiện tại (do người dùng chọn trên Tiến trình) thì override vị trí hiện tại
+    current_study_sem = str(sc.raw.get("currentStudySem") or "").strip() or None
+    if current_study_sem and _DIGIT_RE.search(current_study_sem):
+        semesters_passed = max(semesters_passed, sem_num(current_study_sem))
+
+    # Tốc độ học trung bình của riêng sinh viên (tín chỉ/kỳ); nhịp chuẩn dùng khi chưa có tín chỉ nào
+    ideal_avg_credits_per_sem = required_credits / STANDARD_SEMESTERS
+    user_avg_credits_per_sem = (
+        total_credits_passed / semesters_passed if semesters_passed > 0 else ideal_avg_credits_per_sem
+    )
+    if user_avg_credits_per_sem <= 0:
+        user_avg_credits_per_sem = ideal_avg_credits_per_sem or required_credits
+
+    # Dự báo số học kỳ cần thêm để hoàn thành tín chỉ nếu giữ nhịp hiện tại
+    if remaining_credits > 0 and user_avg_credits_per_sem > 0:
+        semesters_needed = math.ceil(remaining_credits / user_avg_credits_per_sem)
+    else:
+        semesters_needed = 0
+
+    remaining_semesters_ideal = max(STANDARD_SEMESTERS - semesters_passed, 0)
+
+    # Tổng hợp mức khả năng tốt nghiệp đúng hạn bằng thang rủi ro
+    on_track = remaining_credits <= 0 and gpa4 >= GRADUATION_MIN_GPA4 and debt_credits == 0
+    risk_score: Optional[int] = None
+    if on_track:
+        level = "CAO"
+    else:
+        risk_score = 0
+        # Rủi ro tín chỉ còn thiếu
+        if remaining_credits > 60:
+            risk_score += 2
+        elif remaining_credits > 40:
+            risk_score += 1
+        # Rủi ro về số kỳ cần thêm so với số kỳ chuẩn còn lại
+        if semesters_needed > remaining_semesters_ideal + 1:
+            risk_score += 2
+        elif semesters_needed > remaining_semesters_ideal:
+            risk_score += 1
+        # Rủi ro do GPA và nợ môn
+        risk_score += gpa_risk + debt_risk
+
+        if risk_score <= 1:
+            level = "CAO"
+        elif risk_score <= 4:
+            level = "TRUNG BÌNH / KHẢ QUAN"
+        else:
+            level = "THẤP"
+
+    return {
+        "gpa10": gpa10,
+        "gpa4": gpa4,
+        "gpa_risk": gpa_risk,
+        "total_credits_passed": total_credits_passed,
+        "required_credits": required_credits,
+        "remaining_credits": remaining_credits,
+        "debt_courses": debt_courses,
+        "debt_credits": debt_credits,
+        "debt_risk": debt_risk,
+        "debt_risk_text": debt_risk_text,
+        "semesters_passed": semesters_passed,
+        "user_avg_credits_per_sem": user_avg_credits_per_sem,
+        "semesters_needed": semesters_needed,
+        "remaining_semesters_ideal": remaining_semesters_ideal,
+        "on_track": on_track,
+        "risk_score": risk_score,
+        "level": level,
+    }
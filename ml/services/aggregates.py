@@ -0,0 +1,172 @@
+"""
+Tổng hợp GPA / tín chỉ.
+
+- Phần chỉ phụ thuộc chương trình học (map môn theo mã, tổng tín chỉ yêu cầu, ...) được tính
+  **một lần cho mỗi curriculum** (nhận diện bằng fingerprint) và dùng chung cho mọi sinh viên
+  cùng chuyên ngành.
+- Phần phụ thuộc kết quả học tập tính lại bằng một lượt qua results (vài chục dòng, rẻ hơn việc băm
+  results để so version); StudentContext giữ kết quả cho cả payload nên mỗi payload chỉ tính một lần.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Số curriculum giữ trong bộ nhớ (mỗi chuyên ngành một bản, thường rất ít)
+_CURRICULUM_CACHE_SIZE = 32
+
+
+def _digest(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def curriculum_fingerprint(curriculum: Dict[str, Any]) -> str:
+    """
+    Định danh một phiên bản curriculum. Bản ghi từ Mongo có _id + updatedAt (timestamps) nên
+    dùng luôn; nếu thiếu thì băm nội dung.
+    """
+    cid = curriculum.get("_id")
+    updated = curriculum.get("updatedAt")
+    if cid and updated:
+        return f"{cid}@{updated}"
+    return _digest(curriculum)
+
+
+class CurriculumIndex:
+    """Các bảng tra chỉ phụ thuộc chương trình học."""
+
+    def __init__(self, curriculum: Dict[str, Any], fingerprint: str):
+        self.fingerprint = fingerprint
+        self.semesters: List[Dict[str, Any]] = curriculum.get("semesters") or []
+
+        # Môn học theo mã (trùng mã thì môn khai báo sau ghi đè, như các vòng lặp cũ)
+        self.course_map: Dict[str, Dict[str, Any]] = {}
+        # Hình thức thi theo mã (chỉ các môn có examFormat)
+        self.exam_format_by_code: Dict[str, str] = {}
+        self.non_gpa_courses: List[Dict[str, str]] = []
+        self.required_credits = 0
+        self.required_credits_gpa = 0
+        for sem in self.semesters:
+            sem_name = str(sem.get("semester") or "")
+            seen_in_sem = set()
+            for course in sem.get("courses", []):
+                code = str(course.get("code") or "")
+                if code:
+                    self.course_map[code] = course
+                # Mỗi học kỳ chỉ xét môn trùng mã đầu tiên; kỳ đầu tiên có examFormat hợp lệ thắng
+                if code not in seen_in_sem:
+                    seen_in_sem.add(code)
+                    raw_fmt = course.get("examFormat")
+                    if isinstance(raw_fmt, str) and raw_fmt.strip():
+                        self.exam_format_by_code.setdefault(code, raw_fmt.strip())
+                if course.get("countInCredits", False):
+                    self.required_credits += course.get("credit", 0)
+                if course.get("countInGpa", False):
+                    self.required_credits_gpa += course.get("credit", 0)
+                if course.get("countInGpa", False) is False:
+                    self.non_gpa_courses.append(
+                        {
+                            "code": code,
+                            "name": str(course.get("name") or ""),
+                            "credit": str(course.get("credit") or ""),
+                            "semester": sem_name,
+                        }
+                    )
+
+
+_curricula: "OrderedDict[str, CurriculumIndex]" = OrderedDict()
+_curricula_lock = threading.Lock()
+
+
+def curriculum_index(curriculum: Dict[str, Any]) -> CurriculumIndex:
+    """CurriculumIndex dùng chung theo fingerprint (mỗi phiên bản curriculum chỉ dựng một lần)."""
+    fp = curriculum_fingerprint(curriculum)
+    with _curricula_lock:
+        idx = _curricula.get(fp)
+        if idx is not None:
+            _curricula.move_to_end(fp)
+            return idx
+    idx = CurriculumIndex(curriculum, fp)
+    with _curricula_lock:
+        _curricula[fp] = idx
+        while len(_curricula) > _CURRICULUM_CACHE_SIZE:
+            _curricula.popitem(last=False)
+    return idx
+
+
+# Đóng góp của một dòng kết quả (học kỳ, mã môn): (điểm*tín GPA, tín GPA, tín đã qua, môn nợ)
+_Contribution = Tuple[float, int, int, Optional[Dict[str, Any]]]
+_EMPTY: _Contribution = (0.0, 0, 0, None)
+
+
+def _contribution(code: str, result: Dict[str, Any], cindex: CurriculumIndex) -> _Contribution:
+    course_info = cindex.course_map.get(code)
+    # Nếu chương trình học không có thông tin môn này thì bỏ qua
+    if not course_info:
+        return _EMPTY
+
+    is_count_in_gpa = course_info.get("countInGpa", False)
+    is_count_in_credits = course_info.get("countInCredits", False)
+    course_credit = course_info.get("credit", 0)
+
+    raw_grade = result.get("grade", None)
+    grade: Optional[float] = float(raw_grade) if isinstance(raw_grade, (int, float)) else None
+    status = str(result.get("status", "") or "").lower()
+
+    gpa_points = 0.0
+    gpa_credits = 0
+    passed_credits = 0
+    debt: Optional[Dict[str, Any]] = None
+
+    # Điểm GPA (hệ 10) – chỉ tính khi có điểm số
+    if is_count_in_gpa and course_credit > 0 and grade is not None:
+        gpa_points = grade * course_credit
+        gpa_credits = course_credit
+
+    # passed => tín chỉ đã qua; failed => môn nợ; còn lại (chưa học / đang học) => không tính
+    if is_count_in_credits and course_credit > 0:
+        if status == "passed":
+            passed_credits = course_credit
+        elif status == "failed":
+            debt = {
+                "code": code,
+                "name": course_info.get("name", code),
+                "credit": course_credit,
+                "grade": grade if grade is not None else 0.0,
+            }
+    return (gpa_points, gpa_credits, passed_credits, debt)
+
+
+def gpa_stats(results: Dict[str, Any], cindex: CurriculumIndex) -> Dict[str, Any]:
+    """GPA hệ 10, tín chỉ tích lũy, môn nợ (theo thứ tự results) và tổng tín chỉ yêu cầu."""
+    total_gpa_points = 0.0
+    total_credits_gpa = 0
+    total_credits_passed = 0
+    debt_courses: List[Dict[str, Any]] = []
+    for sem_data in results.values():
+        for code, result in sem_data.items():
+            points, gpa_credits, passed_credits, debt = _contribution(code, result, cindex)
+            if gpa_credits:
+                total_gpa_points += points
+                total_credits_gpa += gpa_credits
+            total_credits_passed += passed_credits
+            if debt is not None:
+                debt_courses.append(debt)
+    gpa = (total_gpa_points / total_credits_gpa) if total_credits_gpa > 0 else 0.0
+    return {
+        "gpa": round(gpa, 2),
+        "total_credits_passed": total_credits_passed,
+        "total_credits_gpa": total_credits_gpa,
+        "required_credits": cindex.required_credits,
+        "required_credits_gpa": cindex.required_credits_gpa,
+        "debt_courses": debt_courses,
+    }
+
+
+def curriculum_stats() -> Dict[str, Any]:
+    with _curricula_lock:
+        return {"curricula": len(_curricula)}
@@ -0,0 +1,82 @@
+"""
+Automaton Aho-Corasick tối giản (thuần Python) để tìm nhiều chuỗi con cùng lúc trong một lượt duyệt văn bản.
+
+    ac = AhoCorasick([("co so du lieu", 1), ("lap trinh", 2)])
+    ac.find_all("hoc lap trinh va co so du lieu")  # -> {1, 2}
+
+Mỗi pattern mang theo một payload bất kỳ; trùng pattern thì giữ tất cả payload.
+"""
+
+from collections import deque
+from typing import Any, Dict, Generic, Iterable, Iterator, List, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AhoCorasick(Generic[T]):
+    def __init__(self, patterns: Iterable[Tuple[str, T]]):
+        # Node 0 là gốc. _goto[n]: ký tự -> node con; _out[n]: payload của các pattern kết thúc tại n
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[T]] = [[]]
+        self._count = 0
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(payload)
+            self._count += 1
+        self._build_links()
+
+    def _build_links(self) -> None:
+        # BFS: fail link của một node là hậu tố dài nhất cũng là tiền tố của một pattern;
+        # output của node được gộp thêm output của node fail để không phải lần theo chuỗi fail khi tìm.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, T]]:
+        """Yield (vị trí kết thúc, payload) cho mọi lần xuất hiện của mọi pattern."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for payload in out[node]:
+                    yield i, payload
+
+    def find_all(self, text: str) -> Set[T]:
+        """Tập payload của các pattern xuất hiện trong text (ít nhất một lần)."""
+        found: Set[Any] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
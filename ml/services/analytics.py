@@ -0,0 +1,148 @@
+"""
+Analytics cho nhiều sinh viên một lượt (quét cảnh báo học tập, danh sách rủi ro tốt nghiệp).
+
+- Context được lấy song song từ backend nhưng giới hạn ANALYTICS_FETCH_CONCURRENCY request cùng lúc
+  (qua circuit breaker như /chat, nhưng không ghi vào cache context / cache biên dịch của luồng chat).
+- Context về tới đâu gom thành lô ANALYTICS_BATCH_SIZE sinh viên rồi chấm một lượt bằng NumPy (cohort.py)
+  ngay trong service: chấm theo lô rẻ hơn nhiều so với gửi từng context sang process khác.
+- Kết quả được trả dần theo từng lô, không chờ cả lớp.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+from ml.config import ANALYTICS_BATCH_SIZE, ANALYTICS_FETCH_CONCURRENCY
+from ml.services.academic import assess_graduation
+from ml.services.context import StudentContext
+from ml.services.data_client import ContextResult, fetch_context_uncached
+
+
+def _warning_row(warning: Any) -> Dict[str, Any]:
+    if warning is None:
+        return {"status": "error", "error": "insufficient_data"}
+    return {"status": "ok", "at_risk": warning["at_risk"], "warning": warning}
+
+
+def _graduation_row(a: Dict[str, Any]) -> Dict[str, Any]:
+    if "error" in a:
+        return {"status": "error", "error": "insufficient_data", "detail": a["error"]}
+    return {
+        "status": "ok",
+        # "THẤP" = khả năng tốt nghiệp đúng hạn thấp
+        "at_risk": a["level"] == "THẤP",
+        "level": a["level"],
+        "risk_score": a["risk_score"],
+        "gpa4": a["gpa4"],
+        "total_credits_passed": a["total_credits_passed"],
+        "required_credits": a["required_credits"],
+        "remaining_credits": a["remaining_credits"],
+        "debt_credits": a["debt_credits"],
+        "debt_courses": [c["code"] for c in a["debt_courses"]],
+        "semesters_needed": a["semesters_needed"],
+        "remaining_semesters_ideal": a["remaining_semesters_ideal"],
+    }
+
+
+# --- Hàm chấm theo lô: nhận user_ids + payload /api/chatbot/context, trả kết quả theo đúng thứ tự ---
+# cohort (NumPy) được import khi chấm lần đầu để import service vẫn nhẹ.
+
+def score_academic_warning(user_ids: List[str], contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from ml.services.cohort import academic_warning_batch
+
+    return [_warning_row(w) for w in academic_warning_batch([ctx.get("stats") or {} for ctx in contexts])]
+
+
+def score_graduation(user_ids: List[str], contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from ml.services.cohort import compute_cohort
+
+    # GPA / tín chỉ / môn nợ tính một lượt cho cả lô; StudentContext dựng trực tiếp (không qua
+    # compile_context) để không chiếm chỗ của context đang chat trong cache biên dịch
+    return [
+        _graduation_row(assess_graduation(user_id, StudentContext(ctx), stats))
+        for user_id, ctx, stats in zip(user_ids, contexts, compute_cohort(contexts))
+    ]
+
+
+Scorer = Callable[[List[str], List[Dict[str, Any]]], List[Dict[str, Any]]]
+
+SCORERS: Dict[str, Scorer] = {
+    "academic-warning": score_academic_warning,
+    "graduation-risk": score_graduation,
+}
+
+_metrics = {"scans": 0, "users": 0, "errors": 0, "in_flight": 0, "batches": 0}
+
+
+def analytics_stats() -> Dict[str, Any]:
+    return {"batch_size": ANALYTICS_BATCH_SIZE, **_metrics}
+
+
+def _score_batch(scorer: Scorer, batch: List[Tuple[str, ContextResult]]) -> List[Dict[str, Any]]:
+    user_ids = [user_id for user_id, _ in batch]
+    contexts = [result.ctx or {} for _, result in batch]
+    _metrics["batches"] += 1
+    try:
+        rows = scorer(user_ids, contexts)
+    except Exception:
+        # Một payload hỏng làm hỏng cả lô → chấm lại từng người để chỉ người đó báo lỗi
+        rows = []
+        for user_id, ctx in zip(user_ids, contexts):
+            try:
+                rows.append(scorer([user_id], [ctx])[0])
+            except Exception as e:
+                rows.append({"status": "error", "error": "scoring_failed", "detail": str(e)})
+    return [
+        {"user_id": user_id, **row, "stale": result.stale, "partial": result.partial}
+        for (user_id, result), row in zip(batch, rows)
+    ]
+
+
+async def scan(kind: str, user_ids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Chấm điểm `kind` (xem SCORERS) cho danh sách user, yield kết quả theo từng lô chấm xong
+    và một dòng tổng kết cuối cùng ({"done": true, ...}).
+    """
+    scorer = SCORERS[kind]
+    sem = asyncio.Semaphore(max(ANALYTICS_FETCH_CONCURRENCY, 1))
+    batch_size = max(ANALYTICS_BATCH_SIZE, 1)
+    _metrics["scans"] += 1
+
+    async def _fetch(user_id: str) -> Tuple[str, ContextResult]:
+        async with sem:
+            return user_id, await fetch_context_uncached(user_id)
+
+    # Bỏ user trùng nhưng giữ thứ tự
+    tasks = [asyncio.ensure_future(_fetch(uid)) for uid in dict.fromkeys(user_ids)]
+    summary = {"done": True, "total": len(tasks), "ok": 0, "errors": 0, "at_risk": 0}
+    remaining = len(tasks)
+    _metrics["in_flight"] += remaining
+    pending: List[Tuple[str, ContextResult]] = []
+    try:
+        for fut in asyncio.as_completed(tasks):
+            user_id, result = await fut
+            rows: List[Dict[str, Any]] = []
+            if result.ctx is None:
+                rows.append({"user_id": user_id, "status": "error", "error": "context_unavailable"})
+            else:
+                pending.append((user_id, result))
+            if pending and (len(pending) >= batch_size or len(rows) + len(pending) == remaining):
+                rows.extend(_score_batch(scorer, pending))
+                pending = []
+            for row in rows:
+                remaining -= 1
+                _metrics["in_flight"] -= 1
+                _metrics["users"] += 1
+                if row.get("status") == "ok":
+                    summary["ok"] += 1
+                    summary["at_risk"] += 1 if row.get("at_risk") else 0
+                else:
+                    summary["errors"] += 1
+                    _metrics["errors"] += 1
+                yield row
+        yield summary
+    finally:
+        _metrics["in_flight"] -= remaining
+        # Client ngắt kết nối giữa chừng → huỷ các user chưa xong
+        for t in tasks:
+            if not t.done():
+                t.cancel()
@@ -0,0 +1,247 @@
+"""
+Cache câu trả lời của LLM tổng quát (ask_general_llm / stream_general_llm) cho các câu hỏi kiến thức chung.
+
+- Khoá là câu hỏi đã normalize; câu gần giống ("hoc lap trinh web bat dau tu dau" / "bat dau hoc lap trinh
+  web tu dau") được tìm bằng cosine trên vector TF-IDF (từ đơn + cặp từ liền nhau) của các câu đã cache.
+- Giới hạn số câu (bỏ câu dùng lâu nhất) và thời gian sống; lưu xuống file JSON (ghi file tạm rồi
+  os.replace) để giữ qua các lần khởi động lại.
+- Chỉ cache câu trả lời thật của provider (không cache thông báo lỗi / cấu hình), và chỉ cho system prompt
+  mặc định: prompt riêng của handler có thể chứa dữ liệu cá nhân.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ml.services.nlp_utils import normalize
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def question_key(message: str) -> str:
+    """Câu hỏi đã normalize, bỏ dấu câu ("...từ đâu?" và "...từ đâu" là một khoá)."""
+    return " ".join(_WORD_RE.findall(normalize(message)))
+
+
+# Từ đệm / xưng hô không đổi nghĩa câu hỏi ("... la gi vay ban"); bỏ khi so độ giống
+_FILLER_WORDS = frozenset(
+    "a ah ak ad oi vay z nhe nha nhi ha ban minh to em toi anh chi giup voi thi muon hoi cho xin".split()
+)
+# Cặp từ liền nhau giữ một phần thứ tự từ nhưng nhẹ hơn từ đơn, để đảo vài từ không làm câu "khác" hẳn
+_BIGRAM_WEIGHT = 0.5
+
+
+def _terms(norm_text: str) -> List[str]:
+    words = [w for w in norm_text.split() if w not in _FILLER_WORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class AnswerCache:
+    def __init__(self, path: Optional[Path], maxsize: int = 2000, ttl: float = 0, threshold: float = 0.85):
+        self.path = path
+        self.maxsize = max(int(maxsize), 0)
+        # ttl <= 0 → không hết hạn theo thời gian
+        self.ttl = ttl if ttl > 0 else None
+        # threshold >= 1 → chỉ nhận câu trùng khớp (sau normalize)
+        self.threshold = threshold
+        # câu đã normalize → (thời điểm lưu (unix time), câu trả lời); thứ tự = LRU
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Các lần ghi file nối tiếp nhau: bản chụp cũ không ghi đè bản mới hơn
+        self._save_lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        # Index TF-IDF: df của từng term, vector (đã chuẩn hoá) và posting list của từng câu. Câu mới được thêm
+        # vào index ngay với idf hiện tại; idf của các câu cũ được tính lại cả lượt khi index đã đổi nhiều.
+        self._df: Counter = Counter()
+        self._vectors: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._changes = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    # --- Lưu / nạp file ---
+
+    def _load_locked(self) -> None:
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            items = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for item in items:
+            try:
+                stored_at, q, a = float(item["t"]), str(item["q"]), str(item["a"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if self.ttl is None or now - stored_at <= self.ttl:
+                self._data[q] = (stored_at, a)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        self._rebuild_locked()
+
+    def save(self) -> None:
+        """Ghi cache xuống file nếu có thay đổi (file tạm + os.replace: không bao giờ để lại file ghi dở)."""
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                items = [{"q": q, "t": t, "a": a} for q, (t, a) in self._data.items()]
+                self._dirty = False
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+
+    # --- Index TF-IDF ---
+
+    def _idf(self, term: str) -> float:
+        # idf "smooth" như TfidfVectorizer; term chưa gặp có df = 0
+        return math.log((len(self._data) + 1) / (self._df.get(term, 0) + 1)) + 1
+
+    def _vector(self, terms: List[str]) -> Dict[str, float]:
+        # tf dạng log (1 + log tf) * idf, chuẩn hoá L2
+        vec = {
+            t: (1 + math.log(c)) * self._idf(t) * (_BIGRAM_WEIGHT if " " in t else 1.0)
+            for t, c in Counter(terms).items()
+        }
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def _index_add_locked(self, q: str) -> None:
+        terms = _terms(q)
+        self._df.update(set(terms))
+        vec = self._vectors[q] = self._vector(terms)
+        for t in vec:
+            self._postings.setdefault(t, set()).add(q)
+
+    def _index_remove_locked(self, q: str) -> None:
+        vec = self._vectors.pop(q, None)
+        if vec is None:
+            return
+        for t in vec:
+            self._df[t] -= 1
+            if self._df[t] <= 0:
+                del self._df[t]
+            posting = self._postings.get(t)
+            if posting is not None:
+                posting.discard(q)
+                if not posting:
+                    del self._postings[t]
+
+    def _rebuild_locked(self) -> None:
+        terms_by_q = {q: _terms(q) for q in self._data}
+        self._df = Counter()
+        for terms in terms_by_q.values():
+            self._df.update(set(terms))
+        self._vectors = {q: self._vector(terms) for q, terms in terms_by_q.items()}
+        self._postings = {}
+        for q, vec in self._vectors.items():
+            for t in vec:
+                self._postings.setdefault(t, set()).add(q)
+        self._changes = 0
+
+    def _remove_locked(self, q: str) -> None:
+        del self._data[q]
+        self._index_remove_locked(q)
+        self._dirty = True
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    # --- API ---
+
+    def get(self, message: str) -> Optional[str]:
+        if self.maxsize == 0:
+            return None
+        key = question_key(message)
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load_locked()
+            item = self._data.get(key)
+            if item is not None and self._expired(item[0], now):
+                self._remove_locked(key)
+                item = None
+            if item is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if self.threshold < 1:
+                # Cosine với các câu có chung ít nhất một term, câu điểm cao nhất (còn hạn) thắng
+                query = self._vector(_terms(key))
+                scores: Dict[str, float] = {}
+                for t, w in query.items():
+                    for q in self._postings.get(t, ()):
+                        scores[q] = scores.get(q, 0.0) + w * self._vectors[q][t]
+                for q, score in sorted(scores.items(), key=lambda kv: -kv[1]):
+                    if score < self.threshold:
+                        break
+                    if self._expired(self._data[q][0], now):
+                        self._remove_locked(q)
+                        continue
+                    self._data.move_to_end(q)
+                    self.hits += 1
+                    self.similar_hits += 1
+                    return self._data[q][1]
+            self.misses += 1
+            return None
+
+    def put(self, message: str, answer: str) -> None:
+        if self.maxsize == 0:
+            return
+        key = question_key(message)
+        with self._lock:
+            if not self._loaded:
+                self._load_locked()
+            if key in self._data:
+                self._index_remove_locked(key)
+            self._data[key] = (time.time(), answer)
+            self._data.move_to_end(key)
+            self._index_add_locked(key)
+            while len(self._data) > self.maxsize:
+                q, _ = self._data.popitem(last=False)
+                self._index_remove_locked(q)
+            self._dirty = True
+            self._changes += 1
+            if self._changes > max(64, len(self._data) // 4):
+                self._rebuild_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded = True
+            self._dirty = bool(self._data) or self._dirty
+            self._data.clear()
+            self._rebuild_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
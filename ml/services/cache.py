@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Cache nhỏ trong RAM của process: giới hạn số phần tử (LRU) + thời gian sống (TTL).
+    Dùng chung cho các chỗ cần nhớ tạm kết quả (context của từng user, ...).
+    An toàn khi gọi từ nhiều thread (mỗi thao tác giữ lock rất ngắn).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None, max_stale: Optional[float] = None):
+        self.maxsize = max(int(maxsize), 0)
+        # ttl=None hoặc <= 0 → không hết hạn theo thời gian, chỉ bị đẩy ra theo LRU
+        self.ttl = ttl if ttl and ttl > 0 else None
+        # max_stale: phần tử đã hết TTL vẫn được giữ lại (tới tuổi này) để đọc qua get_stale()
+        self.max_stale = max_stale if max_stale and max_stale > 0 else None
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            stored_at, value = item
+            if self.ttl is not None and now - stored_at > self.ttl:
+                if self.max_stale is None or now - stored_at > self.max_stale:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Đọc phần tử còn hạn mà không đổi thứ tự LRU và không tính vào hits/misses."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if self.ttl is not None and now - stored_at > self.ttl:
+            return None
+        return value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Đọc phần tử kể cả khi đã hết TTL (miễn chưa quá max_stale), không tính vào hits/misses."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            limit = self.max_stale if self.max_stale is not None else self.ttl
+            if limit is not None and now - stored_at > limit:
+                return None
+            self.stale_hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> int:
+        """Xoá một key (hoặc toàn bộ cache nếu key=None). Trả về số phần tử đã xoá."""
+        with self._lock:
+            if key is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_hits": self.stale_hits,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker đơn giản cho các lời gọi tới một dịch vụ bên ngoài.
+    - closed: gọi bình thường, đếm số lần lỗi liên tiếp.
+    - open: sau `failure_threshold` lỗi liên tiếp → từ chối ngay (fail fast) trong `reset_timeout` giây.
+    - half_open: hết thời gian chờ → cho đúng một request thăm dò; thành công thì đóng lại, lỗi thì mở tiếp.
+      Request thăm dò bị huỷ / bỏ dở thì gọi release() để nhường lượt thăm dò; nếu không ai release,
+      sau `reset_timeout` giây kể từ lúc thăm dò cũng cho request khác thăm dò lại (không kẹt half_open mãi).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        # Thời điểm cho request thăm dò đi (None = chưa có request thăm dò nào đang chạy)
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.OPEN and self._opened_at is not None:
+                if now - self._opened_at >= self.reset_timeout:
+                    # Cho một request đi thăm dò, các request khác vẫn bị từ chối
+                    self._state = self.HALF_OPEN
+                    self._probe_started = now
+                    return True
+            if self._state == self.HALF_OPEN:
+                # Lượt thăm dò trước đã được nhả, hoặc treo quá reset_timeout → cho request này thăm dò
+                if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                    self._probe_started = now
+                    return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+    def release(self) -> None:
+        """Request được allow_request() cho đi nhưng kết thúc mà không có kết quả (bị huỷ, bỏ dở):
+        không tính thành công hay lỗi, chỉ nhả lượt thăm dò nếu đang half_open."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
@@ -0,0 +1,259 @@
+"""
+Tính GPA / tín chỉ / môn nợ / cảnh báo học tập cho **cả một lớp** bằng NumPy.
+
+Kết quả của từng sinh viên được trải thành các ma trận (sinh viên × dòng kết quả) — điểm,
+chỉ số môn trong curriculum, trạng thái — rồi tính một lượt cho cả nhóm sinh viên dùng chung
+curriculum. Kết quả trùng khớp với bản tính từng người (_calculate_gpa_and_credits, four_from_10,
+_answer_academic_warning):
+- tổng điểm GPA cộng tuần tự theo đúng thứ tự results (np.cumsum, không dùng tổng pairwise);
+- làm tròn GPA bằng round() của Python trên từng giá trị, giống bản gốc.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ml.services.aggregates import CurriculumIndex, curriculum_index
+from ml.services.context import sem_num
+
+
+# Bảng quy đổi hệ 10 → hệ 4 (xem four_from_10): g >= ngưỡng[i] thì lấy giá trị[i + 1]
+_GRADE4_THRESHOLDS = np.array([3.95, 4.95, 5.45, 6.45, 6.95, 7.95, 8.45, 8.95])
+_GRADE4_VALUES = np.array([0.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 3.7, 4.0])
+
+# Ngưỡng ĐTB tích lũy theo năm học (năm 1, 2, 3, từ năm 4)
+_WARNING_CUM_THRESHOLDS = np.array([1.20, 1.40, 1.60, 1.80])
+_WARNING_SEM_THRESHOLD = 1.0
+
+_STATUS_OTHER, _STATUS_PASSED, _STATUS_FAILED = 0, 1, 2
+_STATUS_CODES = {"passed": _STATUS_PASSED, "failed": _STATUS_FAILED}
+
+_MISSING_DATA_ERROR = "Không tìm thấy dữ liệu kết quả học tập hoặc chương trình học."
+
+
+def four_from_10_array(grades10: np.ndarray) -> np.ndarray:
+    """Bản vectorized của four_from_10 (tra ngưỡng bằng searchsorted)."""
+    idx = np.searchsorted(_GRADE4_THRESHOLDS, grades10, side="right")
+    return _GRADE4_VALUES[idx]
+
+
+class _CurriculumArrays:
+    """Thông tin môn học của một curriculum dưới dạng mảng, đánh chỉ số theo course_map."""
+
+    def __init__(self, cindex: CurriculumIndex):
+        self.codes: List[str] = list(cindex.course_map.keys())
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        courses = [cindex.course_map[c] for c in self.codes]
+        raw_credits = [c.get("credit", 0) for c in courses]
+        # Tín chỉ nguyên thì cộng bằng int64 để kết quả là số nguyên như bản gốc
+        integral = all(isinstance(x, int) and not isinstance(x, bool) for x in raw_credits)
+        self.credit = np.array(
+            [x or 0 for x in raw_credits], dtype=np.int64 if integral else np.float64
+        )
+        self.in_gpa = np.array([bool(c.get("countInGpa", False)) for c in courses], dtype=bool)
+        self.in_credits = np.array([bool(c.get("countInCredits", False)) for c in courses], dtype=bool)
+        self.names: List[Any] = [c.get("name", code) for c, code in zip(courses, self.codes)]
+        if not self.codes:
+            # Curriculum rỗng: giữ một phần tử giả để phép tra chỉ số không lỗi (mọi dòng đều unknown)
+            self.credit = np.zeros(1, dtype=np.int64)
+            self.in_gpa = np.zeros(1, dtype=bool)
+            self.in_credits = np.zeros(1, dtype=bool)
+
+
+def _row_sums(values: np.ndarray) -> np.ndarray:
+    # Cộng tuần tự từng dòng (như vòng for của bản gốc) để tổng float trùng khớp từng bit;
+    # np.sum dùng cộng pairwise nên có thể lệch ở chữ số cuối.
+    return np.cumsum(values, axis=1)[:, -1]
+
+
+def _padded_row_sums(values: np.ndarray, rows: np.ndarray, cols: np.ndarray, n: int, width: int) -> np.ndarray:
+    """Rải giá trị phẳng vào ma trận (sinh viên × dòng kết quả) đệm 0 rồi cộng tuần tự từng dòng."""
+    matrix = np.zeros((n, width), dtype=values.dtype)
+    matrix[rows, cols] = values
+    return _row_sums(matrix)
+
+
+def _compute_group(
+    cindex: CurriculumIndex, results_list: Sequence[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    arrs = _CurriculumArrays(cindex)
+    n = len(results_list)
+    index_get = arrs.index.get
+
+    # Gom mọi dòng kết quả của cả nhóm thành danh sách phẳng (theo thứ tự sinh viên, thứ tự results)
+    # và đổi sang mảng một lần; chỉ các số hạng cần cộng mới được rải vào ma trận đệm
+    codes: List[str] = []
+    course_list: List[int] = []
+    grades: List[float] = []
+    statuses: List[int] = []
+    lengths: List[int] = []
+    for results in results_list:
+        start = len(codes)
+        for sem_data in results.values():
+            for code, result in sem_data.items():
+                codes.append(code)
+                course_list.append(index_get(code, -1))
+                raw_grade = result.get("grade", None)
+                grades.append(float(raw_grade) if isinstance(raw_grade, (int, float)) else math.nan)
+                statuses.append(_STATUS_CODES.get(str(result.get("status", "") or "").lower(), _STATUS_OTHER))
+        lengths.append(len(codes) - start)
+
+    course = np.array(course_list, dtype=np.int64)
+    grade = np.array(grades, dtype=np.float64)
+    status = np.array(statuses, dtype=np.int8)
+    row_lengths = np.array(lengths, dtype=np.int64)
+    starts = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=starts[1:])
+    # Vị trí (sinh viên, cột) của từng dòng phẳng trong ma trận đệm
+    rows = np.repeat(np.arange(n), row_lengths)
+    cols = np.arange(len(codes)) - np.repeat(starts[:-1], row_lengths)
+    width = max(int(row_lengths.max(initial=0)), 1)
+
+    known = course >= 0
+    safe_course = np.where(known, course, 0)
+    credit = np.where(known, arrs.credit[safe_course], 0)
+    in_gpa = known & arrs.in_gpa[safe_course]
+    in_credits = known & arrs.in_credits[safe_course]
+    has_grade = ~np.isnan(grade)
+    positive = credit > 0
+
+    gpa_mask = in_gpa & positive & has_grade
+    total_points = _padded_row_sums(np.where(gpa_mask, grade * credit, 0.0), rows, cols, n, width)
+    total_credits_gpa = _padded_row_sums(np.where(gpa_mask, credit, 0), rows, cols, n, width)
+
+    credit_mask = in_credits & positive
+    passed_mask = credit_mask & (status == _STATUS_PASSED)
+    failed_mask = credit_mask & (status == _STATUS_FAILED)
+    total_credits_passed = _padded_row_sums(np.where(passed_mask, credit, 0), rows, cols, n, width)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gpa10 = np.where(total_credits_gpa > 0, total_points / total_credits_gpa, 0.0)
+    gpa4 = four_from_10_array(gpa10)
+
+    # Môn nợ: chỉ tính trên các dòng trượt; tolist() đổi sang số Python một lần cho cả nhóm
+    debt_courses: List[List[Dict[str, Any]]] = [[] for _ in range(n)]
+    debt = np.flatnonzero(failed_mask)
+    debt_grade = np.where(has_grade[debt], grade[debt], 0.0)
+    for pos, i, c, cr, g, g4 in zip(
+        debt.tolist(),
+        rows[debt].tolist(),
+        course[debt].tolist(),
+        credit[debt].tolist(),
+        debt_grade.tolist(),
+        four_from_10_array(debt_grade).tolist(),
+    ):
+        debt_courses[i].append({"code": codes[pos], "name": arrs.names[c], "credit": cr, "grade": g, "grade4": g4})
+
+    return [
+        {
+            "gpa": round(g10, 2),
+            "gpa4_from_10": g4,
+            "total_credits_passed": passed,
+            "total_credits_gpa": credits_gpa,
+            "required_credits": cindex.required_credits,
+            "required_credits_gpa": cindex.required_credits_gpa,
+            "debt_courses": debts,
+        }
+        for g10, g4, passed, credits_gpa, debts in zip(
+            gpa10.tolist(),
+            gpa4.tolist(),
+            total_credits_passed.tolist(),
+            total_credits_gpa.tolist(),
+            debt_courses,
+        )
+    ]
+
+
+def academic_warning_batch(stats_list: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Trạng thái cảnh báo học tập theo stats.semGpa4 / stats.cumGpa4, cùng quy tắc và cùng dạng kết quả
+    với assess_academic_warning. Sinh viên thiếu dữ liệu → None.
+    """
+    n = len(stats_list)
+    sem_index = np.zeros(n, dtype=np.int64)
+    gpa_sem = np.full(n, np.nan)
+    gpa_cum = np.full(n, np.nan)
+    valid = np.zeros(n, dtype=bool)
+
+    for i, stats in enumerate(stats_list):
+        sem_gpa4 = (stats or {}).get("semGpa4") or {}
+        cum_gpa4 = (stats or {}).get("cumGpa4") or {}
+        if not isinstance(sem_gpa4, dict) or not isinstance(cum_gpa4, dict) or not sem_gpa4:
+            continue
+        valid[i] = True
+        last_key = sorted(sem_gpa4.keys(), key=sem_num)[-1]
+        sem_index[i] = sem_num(last_key)
+        try:
+            gpa_sem[i] = float(sem_gpa4[last_key])
+        except Exception:
+            pass
+        try:
+            gpa_cum[i] = float(cum_gpa4.get(last_key, 0.0))
+        except Exception:
+            pass
+
+    year = np.where(sem_index > 0, (sem_index + 1) // 2, 1)
+    threshold = _WARNING_CUM_THRESHOLDS[np.clip(year, 1, len(_WARNING_CUM_THRESHOLDS)) - 1]
+    # So sánh với NaN luôn False, giống nhánh "gpa is None" của bản gốc
+    sem_low = gpa_sem < _WARNING_SEM_THRESHOLD
+    cum_low = gpa_cum < threshold
+
+    out: List[Optional[Dict[str, Any]]] = []
+    for i in range(n):
+        if not valid[i]:
+            out.append(None)
+            continue
+        out.append(
+            {
+                "semester": int(sem_index[i]),
+                "year": int(year[i]),
+                "gpa_sem": None if math.isnan(gpa_sem[i]) else float(gpa_sem[i]),
+                "gpa_cum": None if math.isnan(gpa_cum[i]) else float(gpa_cum[i]),
+                "threshold": float(threshold[i]),
+                "sem_below": bool(sem_low[i]),
+                "cum_below": bool(cum_low[i]),
+                "at_risk": bool(sem_low[i] or cum_low[i]),
+            }
+        )
+    return out
+
+
+def compute_cohort(contexts: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Tính cho nhiều sinh viên một lượt. `contexts` là các payload /api/chatbot/context.
+    Sinh viên được gom theo curriculum (mỗi nhóm một lượt vectorized); kết quả trả về theo đúng
+    thứ tự đầu vào, mỗi phần tử gồm các trường như _calculate_gpa_and_credits cộng thêm
+    `gpa4_from_10`, `grade4` cho từng môn nợ và `academic_warning`.
+    """
+    out: List[Optional[Dict[str, Any]]] = [None] * len(contexts)
+    groups: Dict[str, List[int]] = {}
+    indexes: Dict[str, CurriculumIndex] = {}
+
+    for i, ctx in enumerate(contexts):
+        results = ctx.get("results") or {}
+        curriculum = ctx.get("curriculum") or {}
+        if not results or not curriculum:
+            out[i] = {
+                "gpa": None,
+                "total_credits_passed": 0,
+                "total_credits_gpa": 0,
+                "required_credits": 0,
+                "required_credits_gpa": 0,
+                "debt_courses": [],
+                "error": _MISSING_DATA_ERROR,
+            }
+            continue
+        cindex = curriculum_index(curriculum)
+        indexes[cindex.fingerprint] = cindex
+        groups.setdefault(cindex.fingerprint, []).append(i)
+
+    for fp, members in groups.items():
+        rows = _compute_group(indexes[fp], [contexts[i].get("results") or {} for i in members])
+        for i, row in zip(members, rows):
+            out[i] = row
+
+    warnings = academic_warning_batch([ctx.get("stats") or {} for ctx in contexts])
+    for row, warning in zip(out, warnings):
+        row["academic_warning"] = warning
+    return out  # type: ignore[return-value]
@@ -0,0 +1,175 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ml.config import CONTEXT_CACHE_MAXSIZE
+from ml.services.aggregates import CurriculumIndex, curriculum_index, gpa_stats
+from ml.services.data_client import fetch_context
+
+
+_SEM_NUM_RE = re.compile(r"(\d+)")
+
+
+def sem_num(key: Any) -> int:
+    """Số thứ tự học kỳ trong key (HK1, HK2, hoc ky 3, ...); không có số → 0."""
+    m = _SEM_NUM_RE.search(str(key))
+    return int(m.group(1)) if m else 0
+
+
+def _latest_key(d: Dict[str, Any]) -> Optional[str]:
+    # Giữ đúng cách chọn cũ: sorted(..., key=sem_num)[-1] (trùng số thì lấy key xuất hiện sau)
+    return sorted(d.keys(), key=sem_num)[-1] if d else None
+
+
+class StudentContext:
+    """
+    Context đã được "biên dịch" một lần từ payload /api/chatbot/context: các map tra theo mã môn,
+    dòng thời gian học kỳ đã sắp xếp, deadline / lịch thi đã lọc sẵn.
+    Các handler chỉ còn tra cứu O(1) thay vì duyệt lại curriculum/results mỗi lần.
+    """
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw = raw
+        self.curriculum: Dict[str, Any] = raw.get("curriculum") or {}
+        self.results: Dict[str, Any] = raw.get("results") or {}
+        self.semesters: List[Dict[str, Any]] = self.curriculum.get("semesters") or []
+
+        # Phần chỉ phụ thuộc chương trình học: dựng một lần cho mỗi curriculum, dùng chung giữa các user
+        self.curriculum_index: CurriculumIndex = curriculum_index(self.curriculum)
+        self.course_map = self.curriculum_index.course_map
+        self.exam_format_by_code = self.curriculum_index.exam_format_by_code
+        self.non_gpa_courses = self.curriculum_index.non_gpa_courses
+        self.required_credits = self.curriculum_index.required_credits
+        self.required_credits_gpa = self.curriculum_index.required_credits_gpa
+
+        # Kết quả theo mã môn: lấy học kỳ đầu tiên có môn đó (thứ tự như trong results)
+        self.result_by_code: Dict[str, Dict[str, Any]] = {}
+        for sem_data in self.results.values():
+            for code, result in sem_data.items():
+                self.result_by_code.setdefault(code, result)
+
+        stats = raw.get("stats") or {}
+        self.sem_gpa4: Any = stats.get("semGpa4") or {}
+        self.cum_gpa4: Any = stats.get("cumGpa4") or {}
+        # Key học kỳ theo số thứ tự (trùng số thì lấy key xuất hiện đầu tiên)
+        self.sem_gpa4_key_by_num: Dict[int, str] = {}
+        self.latest_sem_key: Optional[str] = None
+        if isinstance(self.sem_gpa4, dict):
+            for key in self.sem_gpa4.keys():
+                self.sem_gpa4_key_by_num.setdefault(sem_num(key), key)
+            self.latest_sem_key = _latest_key(self.sem_gpa4)
+        # GPA tích lũy hệ 4 của học kỳ mới nhất (None nếu backend chưa tính / dữ liệu lỗi)
+        self.latest_cum_gpa4: Optional[float] = None
+        if isinstance(self.cum_gpa4, dict) and self.cum_gpa4:
+            try:
+                self.latest_cum_gpa4 = float(self.cum_gpa4[_latest_key(self.cum_gpa4)])
+            except Exception:
+                self.latest_cum_gpa4 = None
+
+        deadlines = raw.get("deadlines") or []
+        self.exam_deadlines: List[Dict[str, Any]] = [d for d in deadlines if d.get("isExam")]
+        self.task_deadlines: List[Dict[str, Any]] = [d for d in deadlines if not d.get("isExam", False)]
+        self.tasks_by_course: Dict[str, List[Dict[str, Any]]] = {}
+        for d in self.task_deadlines:
+            self.tasks_by_course.setdefault(str(d.get("courseCode") or "").lower(), []).append(d)
+        self.exams_by_course: Dict[str, List[Dict[str, Any]]] = {}
+        for d in self.exam_deadlines:
+            self.exams_by_course.setdefault(str(d.get("courseCode", "")).lower(), []).append(d)
+
+        self._passed_credits_per_sem: Optional[Dict[str, float]] = None
+        self._gpa_stats: Optional[Dict[str, Any]] = None
+
+    def gpa_stats(self) -> Dict[str, Any]:
+        """
+        GPA hệ 10, tín chỉ tích lũy, môn nợ và tổng tín chỉ yêu cầu (xem aggregates.gpa_stats).
+        Cùng một payload chỉ tính một lần.
+        """
+        if self._gpa_stats is None:
+            self._gpa_stats = gpa_stats(self.results, self.curriculum_index)
+        return self._gpa_stats
+
+    @property
+    def passed_credits_per_sem(self) -> Dict[str, float]:
+        """Tín chỉ đã qua (môn tính tín chỉ) theo từng học kỳ, chỉ gồm các kỳ có tín chỉ > 0."""
+        if self._passed_credits_per_sem is None:
+            per_sem: Dict[str, float] = {}
+            for sem_key, sem_results in self.results.items():
+                passed = 0.0
+                for code, result in sem_results.items():
+                    course_info = self.course_map.get(code) or {}
+                    if not course_info.get("countInCredits", False):
+                        continue
+                    credit = float(course_info.get("credit") or 0)
+                    status = str(result.get("status", "") or "").lower()
+                    if status == "passed" and credit > 0:
+                        passed += credit
+                if passed > 0:
+                    per_sem[str(sem_key)] = passed
+            self._passed_credits_per_sem = per_sem
+        return self._passed_credits_per_sem
+
+
+# Mỗi payload chỉ biên dịch một lần: payload lấy từ cache context được dùng lại giữa các
+# lượt chat, nên nhớ theo id(payload) (giữ tham chiếu tới payload để id không bị tái sử dụng).
+_compiled: "OrderedDict[int, StudentContext]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_context(raw: Dict[str, Any]) -> StudentContext:
+    key = id(raw)
+    with _compiled_lock:
+        sc = _compiled.get(key)
+        if sc is not None and sc.raw is raw:
+            _compiled.move_to_end(key)
+            return sc
+    sc = StudentContext(raw)
+    with _compiled_lock:
+        _compiled[key] = sc
+        while len(_compiled) > max(CONTEXT_CACHE_MAXSIZE, 1):
+            _compiled.popitem(last=False)
+    return sc
+
+
+class RequestContext:
+    """
+    Ngữ cảnh của **một lượt chat**: lấy context từ backend tối đa một lần rồi dùng lại
+    cho mọi handler trong cùng lượt (fallback tìm môn, trả lời môn học, lời chào, ...).
+    """
+
+    def __init__(self, user_id: Optional[str]):
+        self.user_id = user_id
+        self._ctx: Optional[Dict[str, Any]] = None
+        self._loaded = False
+        # True nếu context là bản cũ (backend đang lỗi), để câu trả lời kèm lời nhắc
+        self.stale = False
+        # True nếu chỉ có một phần context (deadlines/results, không có curriculum/user)
+        self.partial = False
+        # Route cần curriculum (đặt trước lần get() đầu tiên): chờ context đầy đủ tới hết budget
+        self.need_curriculum = False
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Trả về context đầy đủ của user (hoặc None nếu không có user_id / backend lỗi)."""
+        if not self._loaded:
+            self._loaded = True
+            if self.user_id:
+                try:
+                    self._ctx, self.stale, self.partial = await fetch_context(
+                        self.user_id, need_curriculum=self.need_curriculum
+                    )
+                except Exception:
+                    self._ctx = None
+        return self._ctx
+
+    async def student(self) -> Optional[StudentContext]:
+        """Context đã biên dịch (xem StudentContext), hoặc None nếu không lấy được context."""
+        ctx = await self.get()
+        return compile_context(ctx) if ctx else None
+
+    async def user_name(self) -> Optional[str]:
+        ctx = await self.get()
+        if not ctx:
+            return None
+        user = ctx.get("user") or {}
+        name = (user.get("name") or "").strip()
+        return name or None
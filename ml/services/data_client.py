@@ -1,39 +1,309 @@
-from typing import Optional, Dict, Any, List
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, NamedTuple
 
-import requests
+from ml.config import (
+    BACKEND_BASE,
+    BACKEND_BREAKER_FAILURES,
+    BACKEND_BREAKER_RESET,
+    BACKEND_CONNECT_TIMEOUT,
+    BACKEND_KEEPALIVE,
+    BACKEND_KEEPALIVE_EXPIRY,
+    BACKEND_POOL_SIZE,
+    BACKEND_READ_TIMEOUT,
+    CONTEXT_CACHE_MAXSIZE,
+    CONTEXT_CACHE_TTL,
+    CONTEXT_FETCH_BUDGET,
+    CONTEXT_HEDGE_DELAY,
+    CONTEXT_STALE_MAX_AGE,
+)
+from ml.services.cache import TTLCache
+from ml.services.circuit_breaker import CircuitBreaker
+from ml.services.http_client import AsyncClientHolder
 
-from ml.config import BACKEND_BASE
+if TYPE_CHECKING:
+    import httpx
 
 
-def _safe_get(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-  """Hàm trợ giúp thực hiện cuộc gọi GET API một cách an toàn."""
-  url = f"{BACKEND_BASE}{path}"
-  try:
-      resp = requests.get(url, params=params, timeout=3)
-      if not resp.ok:
-          return None
-      return resp.json()
-  except Exception:
-      # Log lỗi nếu cần, nhưng trả về None để logic chính xử lý
-      return None
+# Context của từng user được giữ tạm trong RAM để các câu hỏi liên tiếp không
+# phải gọi lại /api/chatbot/context (curriculum + results + deadlines + stats).
+# Context đã hết TTL vẫn được giữ (tới CONTEXT_STALE_MAX_AGE) để dùng tạm khi backend lỗi.
+_context_cache = TTLCache(
+    maxsize=CONTEXT_CACHE_MAXSIZE,
+    ttl=CONTEXT_CACHE_TTL,
+    max_stale=CONTEXT_STALE_MAX_AGE,
+)
 
+# Backend chậm/chết → sau vài lỗi liên tiếp thì từ chối ngay thay vì chờ hết timeout mỗi lần
+_breaker = CircuitBreaker(
+    failure_threshold=BACKEND_BREAKER_FAILURES,
+    reset_timeout=BACKEND_BREAKER_RESET,
+)
 
-def fetch_deadlines_for_user(user_id: str) -> Optional[Dict[str, Any]]:
-    return _safe_get("/api/deadlines", params={"userId": user_id})
+# Các task đang gọi /api/chatbot/context theo user (giữ tham chiếu để không bị GC giữa chừng,
+# và để các request đồng thời của cùng user dùng chung một lần gọi)
+_context_tasks: Dict[str, "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
 
 
-def fetch_results_for_user(user_id: str) -> Optional[Dict[str, Any]]:
-    return _safe_get("/api/results", params={"userId": user_id})
+def _new_client() -> "httpx.AsyncClient":
+    # Một AsyncClient dùng chung: giữ pool kết nối keep-alive tới BACKEND_BASE nên các
+    # request sau không phải bắt tay TCP lại, và không chiếm thread nào khi đang chờ.
+    # httpx import tại đây (lần đầu gọi backend) để import service / worker analytics nhẹ hơn.
+    import httpx
 
+    return httpx.AsyncClient(
+        base_url=BACKEND_BASE,
+        limits=httpx.Limits(
+            max_connections=BACKEND_POOL_SIZE,
+            max_keepalive_connections=BACKEND_POOL_SIZE if BACKEND_KEEPALIVE else 0,
+            keepalive_expiry=BACKEND_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            BACKEND_READ_TIMEOUT,
+            connect=BACKEND_CONNECT_TIMEOUT,
+            pool=BACKEND_READ_TIMEOUT,
+        ),
+    )
 
-def fetch_full_context(user_id: str) -> Optional[Dict[str, Any]]:
-    """Lấy toàn bộ ngữ cảnh cần thiết cho chatbot (curriculum, results, deadlines, user)."""
-    return _safe_get("/api/chatbot/context", params={"userId": user_id})
 
+_client = AsyncClientHolder(_new_client)
 
-def fetch_user_info(user_id: str) -> Optional[Dict[str, Any]]:
+_pool_lock = threading.Lock()
+_pool_metrics: Dict[str, int] = {
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+}
+
+
+def _track(delta: int, error: bool = False) -> None:
+    with _pool_lock:
+        if delta > 0:
+            _pool_metrics["requests"] += 1
+        if error:
+            _pool_metrics["errors"] += 1
+        _pool_metrics["in_flight"] += delta
+        if _pool_metrics["in_flight"] > _pool_metrics["peak_in_flight"]:
+            _pool_metrics["peak_in_flight"] = _pool_metrics["in_flight"]
+
+
+async def _safe_get(path: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Hàm trợ giúp thực hiện cuộc gọi GET API một cách an toàn (qua pool kết nối dùng chung).
+    Khi circuit breaker đang mở thì trả None ngay, không gửi request.
+    """
+    if not _breaker.allow_request():
+        return None
+    client = _client.get()
+    _track(+1)
+    failed = False
+    # Đã ghi kết quả (thành công / lỗi) vào circuit breaker chưa
+    recorded = False
+    try:
+        resp = await client.get(path, params=params)
+        if resp.status_code >= 500:
+            failed = True
+            return None
+        # Lỗi 4xx (thiếu userId, user không tồn tại, ...) không có nghĩa là backend có vấn đề
+        _breaker.record_success()
+        recorded = True
+        if not resp.is_success:
+            return None
+        return resp.json()
+    except Exception:
+        # Log lỗi nếu cần, nhưng trả về None để logic chính xử lý
+        failed = True
+        return None
+    finally:
+        if failed:
+            _breaker.record_failure()
+        elif not recorded:
+            # Bị huỷ giữa chừng (CancelledError, ví dụ fetch_context huỷ các endpoint hẹp):
+            # không biết backend ra sao, chỉ nhả lượt thăm dò để circuit không kẹt ở half_open
+            _breaker.release()
+        _track(-1, error=failed)
+
+
+async def aclose() -> None:
+    """Đóng pool kết nối tới backend (gọi khi tắt service)."""
+    await _client.aclose()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Số liệu sử dụng pool kết nối tới backend (để xem trên /metrics)."""
+    with _pool_lock:
+        stats: Dict[str, Any] = dict(_pool_metrics)
+    stats["pool_size"] = BACKEND_POOL_SIZE
+    stats["keepalive"] = BACKEND_KEEPALIVE
+    stats.update(_client.connection_stats())
+    return stats
+
+
+async def fetch_deadlines_for_user(user_id: str) -> Optional[Dict[str, Any]]:
+    return await _safe_get("/api/deadlines", params={"userId": user_id})
+
+
+async def fetch_results_for_user(user_id: str) -> Optional[Dict[str, Any]]:
+    return await _safe_get("/api/results", params={"userId": user_id})
+
+
+class ContextResult(NamedTuple):
+    ctx: Optional[Dict[str, Any]]
+    # Context cũ lấy từ cache vì backend đang lỗi
+    stale: bool = False
+    # Chỉ có một phần context (deadlines / results) do /api/chatbot/context không trả kịp
+    partial: bool = False
+
+
+async def fetch_full_context(user_id: str) -> Optional[Dict[str, Any]]:
+    """Lấy toàn bộ ngữ cảnh cần thiết cho chatbot (curriculum, results, deadlines, user).
+    Kết quả được cache theo user_id trong CONTEXT_CACHE_TTL giây.
+    """
+    result = await fetch_context(user_id)
+    return None if result.partial else result.ctx
+
+
+async def fetch_context(user_id: str, need_curriculum: bool = False) -> ContextResult:
+    """
+    Lấy context cho một lượt chat theo thứ tự ưu tiên:
+    - Context còn hạn trong cache.
+    - Backend đang lỗi (circuit mở) mà còn context cũ → trả ngay bản cũ (stale),
+      đồng thời làm mới ở nền khi circuit cho phép thăm dò.
+    - Gọi /api/chatbot/context; nếu sau CONTEXT_HEDGE_DELAY giây chưa xong (hoặc lỗi) thì gọi
+      song song /api/deadlines và /api/results. Trong CONTEXT_FETCH_BUDGET giây, bên nào về trước
+      thì dùng: context đầy đủ, hoặc context cũ (nếu có), hoặc ghép phần context từ các endpoint hẹp.
+    need_curriculum=True (câu hỏi cần chương trình học): không trả phần context hẹp ngay khi các endpoint
+    hẹp về đủ mà chờ context tổng hợp tới hết CONTEXT_FETCH_BUDGET, vì phần context không có curriculum.
+    """
+    ctx = _context_cache.get(user_id)
+    if ctx is not None:
+        return ContextResult(ctx)
+
+    stale = _context_cache.get_stale(user_id)
+    if stale is not None and _breaker.state != CircuitBreaker.CLOSED:
+        # Không bắt người dùng chờ backend đang lỗi: trả context cũ ngay, thăm dò ở nền
+        _context_task(user_id)
+        return ContextResult(stale, stale=True)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CONTEXT_FETCH_BUDGET
+    # Task dùng chung giữa các request của cùng user: chỉ chờ (asyncio.wait không huỷ task)
+    combined = _context_task(user_id)
+    await asyncio.wait({combined}, timeout=min(CONTEXT_HEDGE_DELAY, CONTEXT_FETCH_BUDGET))
+    if combined.done() and combined.result() is not None:
+        return ContextResult(combined.result())
+
+    # Hedge: context tổng hợp chậm/lỗi → gọi thêm các endpoint hẹp song song
+    narrow = {
+        "deadlines": loop.create_task(fetch_deadlines_for_user(user_id)),
+        "results": loop.create_task(fetch_results_for_user(user_id)),
+    }
+    pending = set(narrow.values())
+    if not combined.done():
+        pending.add(combined)
+    while pending:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        _, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if combined.done() and combined.result() is not None:
+            break
+        # Các endpoint hẹp đã về đủ → trả lời ngay, không chờ context tổng hợp hết budget
+        # (trừ khi câu hỏi cần curriculum: phần context hẹp không trả lời được)
+        if not need_curriculum and all(t.done() for t in narrow.values()):
+            break
+
+    for task in narrow.values():
+        if not task.done():
+            task.cancel()
+    # combined không bị huỷ: nếu về muộn vẫn được ghi vào cache cho lần sau
+    if combined.done() and combined.result() is not None:
+        return ContextResult(combined.result())
+    if stale is not None:
+        return ContextResult(stale, stale=True)
+
+    partial = _assemble_partial(
+        {name: t.result() for name, t in narrow.items() if t.done() and not t.cancelled()}
+    )
+    if partial is not None:
+        return ContextResult(partial, partial=True)
+    return ContextResult(None)
+
+
+async def fetch_context_uncached(user_id: str) -> ContextResult:
+    """
+    Lấy context cho quét hàng loạt (analytics): dùng context còn hạn trong cache nếu có, nếu không thì gọi
+    /api/chatbot/context mà không ghi vào cache và không đổi thứ tự LRU / số liệu cache, để quét cả lớp
+    không đẩy context của những người đang chat ra khỏi cache. Vẫn đi qua circuit breaker như /chat.
+    """
+    ctx = _context_cache.peek(user_id)
+    if ctx is not None:
+        return ContextResult(ctx)
+    ctx = await _safe_get("/api/chatbot/context", params={"userId": user_id})
+    if ctx is not None:
+        return ContextResult(ctx)
+    # Backend lỗi → dùng context cũ nếu còn (get_stale không đổi thứ tự LRU)
+    stale = _context_cache.get_stale(user_id)
+    return ContextResult(stale, stale=stale is not None)
+
+
+def _assemble_partial(parts: Dict[str, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Ghép phản hồi của /api/deadlines và /api/results thành context cùng dạng /api/chatbot/context
+    (chỉ có các key lấy được; thiếu curriculum/user)."""
+    ctx: Dict[str, Any] = {}
+    deadlines = parts.get("deadlines")
+    if deadlines and "data" in deadlines:
+        ctx["deadlines"] = deadlines.get("data") or []
+    results = parts.get("results")
+    if results and "data" in results:
+        ctx["results"] = results.get("data") or {}
+        ctx["stats"] = results.get("stats") or {}
+        ctx["specialization"] = results.get("specialization")
+        ctx["currentStudySem"] = results.get("currentStudySem")
+    return ctx or None
+
+
+async def _load_context(user_id: str) -> Optional[Dict[str, Any]]:
+    ctx = await _safe_get("/api/chatbot/context", params={"userId": user_id})
+    # Không cache lỗi (None) để lần sau còn thử gọi lại backend
+    if ctx is not None:
+        _context_cache.set(user_id, ctx)
+    return ctx
+
+
+def _context_task(user_id: str) -> "asyncio.Task[Optional[Dict[str, Any]]]":
+    """Task gọi /api/chatbot/context cho user; nếu đang có task chạy dở thì dùng lại."""
+    task = _context_tasks.get(user_id)
+    if task is not None and not task.done():
+        return task
+    task = asyncio.get_running_loop().create_task(_load_context(user_id))
+    _context_tasks[user_id] = task
+
+    def _done(t: "asyncio.Task[Any]") -> None:
+        if _context_tasks.get(user_id) is t:
+            del _context_tasks[user_id]
+
+    task.add_done_callback(_done)
+    return task
+
+
+def invalidate_context(user_id: Optional[str] = None) -> int:
+    """Xoá context đã cache của một user (hoặc tất cả nếu user_id=None),
+    dùng khi backend vừa cập nhật điểm/deadline của user đó."""
+    return _context_cache.invalidate(user_id)
+
+
+def context_cache_stats() -> Dict[str, Any]:
+    return _context_cache.stats()
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return _breaker.stats()
+
+
+async def fetch_user_info(user_id: str) -> Optional[Dict[str, Any]]:
     """Lấy thông tin người dùng (chủ yếu là tên)."""
-    data = _safe_get("/api/users/name", params={"userId": user_id})
+    data = await _safe_get("/api/users/name", params={"userId": user_id})
     if data and "name" in data:
         return data
     return None
\ No newline at end of file
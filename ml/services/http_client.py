@@ -0,0 +1,46 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    # httpx chỉ được import khi tạo client lần đầu (xem factory của data_client / llm_client)
+    import httpx
+
+
+class AsyncClientHolder:
+    """
+    Giữ một httpx.AsyncClient dùng chung (pool kết nối keep-alive) cho event loop hiện tại.
+    Client của httpx gắn với event loop đã tạo ra nó, nên nếu loop thay đổi
+    (vd: script gọi asyncio.run nhiều lần) thì tạo client mới.
+    """
+
+    def __init__(self, factory: Callable[[], "httpx.AsyncClient"]):
+        self._factory = factory
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self) -> "httpx.AsyncClient":
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = self._factory()
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Số kết nối đang mở / đang rảnh trong pool (đọc từ httpcore, nếu có)."""
+        opened = 0
+        idle = 0
+        client = self._client
+        pool = getattr(getattr(client, "_transport", None), "_pool", None) if client else None
+        for conn in list(getattr(pool, "connections", None) or []):
+            opened += 1
+            try:
+                if conn.is_idle():
+                    idle += 1
+            except Exception:
+                pass
+        return {"connections_opened": opened, "idle_connections": idle}
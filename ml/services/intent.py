@@ -1,40 +1,338 @@
-from typing import Optional
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
 
-import joblib
+from ml.config import INTENT_BATCH_MAX_SIZE, INTENT_BATCH_WINDOW_MS, INTENT_CACHE_MAXSIZE, MODELS_DIR
+from ml.services.cache import TTLCache
 
-from ml.config import MODELS_DIR
+if TYPE_CHECKING:
+    import numpy as np
 
 
 INTENT_MODEL_PATH = MODELS_DIR / "intent_clf.pkl"
+# Bản compact xuất từ pipeline (scripts/train_intent_classifier.py): vocab, idf, hệ số LogisticRegression
+INTENT_COMPACT_PATH = MODELS_DIR / "intent_clf.npz"
 
 _intent_model = None
+# Chỉ một thread được nạp model; các request đồng thời lúc khởi động chờ nhau thay vì nạp hai lần
+_load_lock = threading.Lock()
+_status: Dict[str, Any] = {
+    "ready": False,
+    "loaded": False,
+    "format": None,
+    "load_seconds": None,
+    "error": None,
+    "reloads": 0,
+}
+# (tên, mtime, kích thước) của các file model lúc nạp; khác đi thì nạp lại model và xoá cache dự đoán
+_loaded_signature: Tuple[Tuple[str, int, int], ...] = ()
+# Kiểm tra file model tối đa một lần mỗi chừng này giây (stat file trên mỗi câu là thừa)
+_MODEL_CHECK_INTERVAL = 5.0
+_next_model_check = 0.0
+
+
+def _file_sha1(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class CompactIntentModel:
+    """
+    TF-IDF (word n-gram) + LogisticRegression chấm bằng NumPy, không cần sklearn.
+    Cùng giao diện dùng ở đây với Pipeline: `classes_` và `predict_proba(texts)`.
+    NumPy chỉ được import khi nạp model (warm_up lúc khởi động), không phải lúc import module.
+    """
+
+    def __init__(self, path: Path):
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            self._vocab: Dict[str, int] = {str(t): i for i, t in enumerate(data["terms"].tolist())}
+            self._idf = data["idf"]
+            self._coef = data["coef"]  # (số lớp, số đặc trưng), float32
+            self._intercept = data["intercept"].astype(np.float64)
+            self.classes_ = data["classes"]
+        self.source_sha1: Optional[str] = meta.get("source_sha1")
+        self._token_re = re.compile(meta["token_pattern"])
+        self._min_n, self._max_n = meta["ngram_range"]
+        self._lowercase = bool(meta["lowercase"])
+        self._norm: Optional[str] = meta["norm"]
+        self._multinomial = bool(meta["multinomial"])
+
+    def _ngrams(self, text: str) -> List[str]:
+        # Giống analyzer "word" của TfidfVectorizer: lowercase → token_pattern → n-gram nối bằng dấu cách
+        if self._lowercase:
+            text = text.lower()
+        tokens = self._token_re.findall(text)
+        out: List[str] = []
+        for n in range(self._min_n, min(self._max_n, len(tokens)) + 1):
+            if n == 1:
+                out.extend(tokens)
+            else:
+                out.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return out
+
+    def predict_proba(self, texts: Sequence[str]) -> "np.ndarray":
+        import numpy as np
+
+        n = len(texts)
+        scores = np.tile(self._intercept, (n, 1))
+        rows: List[int] = []
+        cols: List[int] = []
+        counts: List[int] = []
+        for row, text in enumerate(texts):
+            tf: Dict[int, int] = {}
+            for gram in self._ngrams(text):
+                j = self._vocab.get(gram)
+                if j is not None:
+                    tf[j] = tf.get(j, 0) + 1
+            rows.extend([row] * len(tf))
+            cols.extend(tf.keys())
+            counts.extend(tf.values())
+        if cols:
+            r = np.array(rows, dtype=np.int64)
+            c = np.array(cols, dtype=np.int64)
+            weights = np.array(counts, dtype=np.float64) * self._idf[c]
+            if self._norm == "l2":
+                weights /= np.sqrt(np.bincount(r, weights * weights, minlength=n))[r]
+            elif self._norm == "l1":
+                weights /= np.bincount(r, np.abs(weights), minlength=n)[r]
+            # Cả batch một phép nhân ma trận, chỉ trên các cột (n-gram) thực sự xuất hiện
+            used, c_local = np.unique(c, return_inverse=True)
+            x = np.zeros((n, len(used)))
+            x[r, c_local] = weights
+            scores += x @ self._coef[:, used].astype(np.float64).T
+        if self._multinomial:
+            scores -= scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+        else:
+            # one-vs-rest: sigmoid từng lớp rồi chuẩn hoá theo hàng như LogisticRegression
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+
+def _load_model_file():
+    """
+    Ưu tiên bản compact (chỉ cần NumPy, nạp nhanh, ít bộ nhớ). Dùng pipeline sklearn nếu chưa có
+    bản compact, bản compact lỗi, hoặc được xuất từ một file .pkl khác với file hiện tại.
+    """
+    if INTENT_COMPACT_PATH.exists():
+        try:
+            model = CompactIntentModel(INTENT_COMPACT_PATH)
+            if not INTENT_MODEL_PATH.exists() or model.source_sha1 == _file_sha1(INTENT_MODEL_PATH):
+                return model, "compact"
+        except Exception as e:
+            _status["error"] = f"compact: {type(e).__name__}: {e}"
+    if INTENT_MODEL_PATH.exists():
+        import joblib  # chỉ cần khi phải dùng pipeline sklearn
+
+        return joblib.load(INTENT_MODEL_PATH), "sklearn"
+    return None, None
+
+
+def _model_files_signature() -> Tuple[Tuple[str, int, int], ...]:
+    sig = []
+    for path in (INTENT_COMPACT_PATH, INTENT_MODEL_PATH):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        sig.append((path.name, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
 
 
 def load_intent_model():
-    global _intent_model
-    if _intent_model is None and INTENT_MODEL_PATH.exists():
-        _intent_model = joblib.load(INTENT_MODEL_PATH)
+    global _intent_model, _loaded_signature
+    if _intent_model is not None:
+        return _intent_model
+    with _load_lock:
+        if _intent_model is None and (INTENT_COMPACT_PATH.exists() or INTENT_MODEL_PATH.exists()):
+            started = time.perf_counter()
+            _loaded_signature = _model_files_signature()
+            model, fmt = _load_model_file()
+            _status["load_seconds"] = round(time.perf_counter() - started, 3)
+            _status["loaded"] = model is not None
+            _status["format"] = fmt
+            _intent_model = model
     return _intent_model
 
 
+def warm_up() -> Dict[str, Any]:
+    """
+    Nạp model và chạy thử một lần predict_proba (import thư viện, khởi tạo model) để request
+    đầu tiên sau khi deploy không phải chịu độ trễ này. Gọi lúc khởi động service.
+    Không có file model hoặc nạp lỗi thì service vẫn chạy (predict_intent trả None).
+    """
+    try:
+        model = load_intent_model()
+        if model is not None:
+            model.predict_proba(["xin chao"])
+    except Exception as e:
+        _status["error"] = f"{type(e).__name__}: {e}"
+    _status["ready"] = True
+    return intent_model_status()
+
+
+def intent_model_status() -> Dict[str, Any]:
+    path = INTENT_COMPACT_PATH if _status["format"] == "compact" else INTENT_MODEL_PATH
+    return {"path": path.name, **_status}
+
+
+# Ngưỡng confidence đơn giản, nếu quá thấp thì coi như không chắc
+_MIN_CONFIDENCE = 0.45
+
+_metrics = {"calls": 0, "texts": 0, "batches": 0, "batched_texts": 0, "max_batch": 0}
+
+# Câu hỏi của sinh viên lặp lại rất nhiều ("gpa cua toi", "con no mon nao"...): nhớ
+# text đầu vào của model (ở /chat là text đã normalize) → (label, confidence)
+_prediction_cache = TTLCache(maxsize=INTENT_CACHE_MAXSIZE)
+
+
+def _check_model_files() -> None:
+    """File model đổi (train lại / deploy model mới) → nạp lại model và bỏ các dự đoán đã cache."""
+    global _intent_model, _next_model_check
+    now = time.monotonic()
+    if now < _next_model_check:
+        return
+    _next_model_check = now + _MODEL_CHECK_INTERVAL
+    if _model_files_signature() == _loaded_signature:
+        return
+    with _load_lock:
+        _intent_model = None
+        _prediction_cache.invalidate()
+        _status["reloads"] += 1
+    load_intent_model()
+
+
+def _label(prediction: Tuple[str, float]) -> Optional[str]:
+    label, confidence = prediction
+    return None if confidence < _MIN_CONFIDENCE else label
+
+
+def _score(texts: Sequence[str], use_cache: bool = True) -> List[Optional[str]]:
+    texts = list(texts)
+    _check_model_files()
+    model = load_intent_model()
+    if not model or not texts:
+        return [None] * len(texts)
+
+    cached: List[Optional[Tuple[str, float]]] = [None] * len(texts)
+    if use_cache:
+        cached = [_prediction_cache.get(t) for t in texts]
+    missing = list(dict.fromkeys(t for t, hit in zip(texts, cached) if hit is None))
+    if missing:
+        _metrics["calls"] += 1
+        _metrics["texts"] += len(missing)
+        try:
+            probs = model.predict_proba(missing)
+            labels = model.classes_
+            idx = probs.argmax(axis=1)
+        except Exception:
+            return [None] * len(texts)
+        scored = {}
+        for text, row, i in zip(missing, probs, idx):
+            scored[text] = (str(labels[i]), float(row[i]))
+            _prediction_cache.set(text, scored[text])
+        cached = [hit if hit is not None else scored[t] for t, hit in zip(texts, cached)]
+    return [_label(p) for p in cached]  # type: ignore[arg-type]
+
+
+def predict_intents(texts: Sequence[str]) -> List[Optional[str]]:
+    """
+    Bản batch của predict_intent: các câu chưa có trong cache đi qua TF-IDF + LogisticRegression
+    trong một lần predict_proba, kết quả theo đúng thứ tự đầu vào.
+    """
+    return _score(texts)
+
+
 def predict_intent(text: str) -> Optional[str]:
     """
     Dùng mô hình nhỏ (TF-IDF + LogisticRegression) để dự đoán intent.
     Trả về: 'deadline' | 'gpa' | 'graduation' | 'credits' | 'course' | 'other' | None
     """
-    model = load_intent_model()
-    if not model:
-        return None
-    try:
-        probs = model.predict_proba([text])[0]
-        labels = model.classes_
-        idx = int(probs.argmax())
-        label = str(labels[idx])
-        # Ngưỡng confidence đơn giản, nếu quá thấp thì coi như không chắc
-        if float(probs[idx]) < 0.45:
-            return None
-        return label
-    except Exception:
-        return None
+    return predict_intents([text])[0]
+
+
+class _MicroBatcher:
+    """
+    Gom các câu cần dự đoán intent của những request /chat đồng thời trong một cửa sổ ngắn
+    (hoặc tới khi đủ max_size câu) rồi chấm một lượt bằng model trên thread pool.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, window: float, max_size: int):
+        self.loop = loop
+        self._window = window
+        self._max_size = max(max_size, 1)
+        self._pending: List[Tuple[str, "asyncio.Future[Optional[str]]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def predict(self, text: str) -> Optional[str]:
+        fut: "asyncio.Future[Optional[str]]" = self.loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self._window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self.loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, "asyncio.Future[Optional[str]]"]]) -> None:
+        _metrics["batches"] += 1
+        _metrics["batched_texts"] += len(batch)
+        _metrics["max_batch"] = max(_metrics["max_batch"], len(batch))
+        try:
+            # predict_intent_async đã tra cache (và trượt) cho các câu này
+            labels = await self.loop.run_in_executor(None, _score, [t for t, _ in batch], False)
+        except Exception:
+            labels = [None] * len(batch)
+        for (_, fut), label in zip(batch, labels):
+            # Request đã bị huỷ (client ngắt) thì future đã done, bỏ qua
+            if not fut.done():
+                fut.set_result(label)
+
+
+_batcher: Optional[_MicroBatcher] = None
+
+
+async def predict_intent_async(text: str) -> Optional[str]:
+    """
+    predict_intent cho handler async. Khi bật INTENT_BATCH_WINDOW_MS, các request đồng thời được
+    gom thành một batch; tắt (0) thì chấm ngay như predict_intent.
+    """
+    global _batcher
+    if INTENT_BATCH_WINDOW_MS <= 0:
+        return predict_intent(text)
+    # Đã có trong cache thì trả ngay, không phải chờ cửa sổ gom batch
+    _check_model_files()
+    hit = _prediction_cache.get(text)
+    if hit is not None:
+        return _label(hit)
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher.loop is not loop:
+        _batcher = _MicroBatcher(loop, INTENT_BATCH_WINDOW_MS / 1000.0, INTENT_BATCH_MAX_SIZE)
+    return await _batcher.predict(text)
 
 
+def intent_stats() -> Dict[str, Any]:
+    return {
+        "batch_window_ms": INTENT_BATCH_WINDOW_MS,
+        "batch_max_size": INTENT_BATCH_MAX_SIZE,
+        **_metrics,
+        "cache": _prediction_cache.stats(),
+    }
@@ -1,9 +1,40 @@
-from typing import Optional
-import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import json
 
-import requests
+from ml.config import (
+    BASE_DIR,
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_MODEL,
+    GEMINI_RPM,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET,
+    LLM_CACHE_MAXSIZE,
+    LLM_CACHE_PATH,
+    LLM_CACHE_SIMILARITY,
+    LLM_CACHE_TTL,
+    LLM_FAILOVER_BUDGET,
+    LLM_HEDGE,
+    LLM_MAX_CONCURRENCY,
+    LLM_PROVIDER,
+    LLM_QUEUE_SIZE,
+    LLM_QUEUE_TIMEOUT,
+    LLM_RATE_BURST,
+    LLM_TIMEOUT,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    OPENAI_RPM,
+)
+from ml.services.answer_cache import AnswerCache, question_key
+from ml.services.http_client import AsyncClientHolder
+from ml.services.llm_pool import CallResult, ProviderConfig, ProviderPool
+from ml.services.rate_limit import ConcurrencyLimiter
 
-from ml.config import BASE_DIR
+if TYPE_CHECKING:
+    import httpx
 
 
 SYSTEM_PROMPT = (
@@ -23,136 +54,436 @@ SYSTEM_PROMPT = (
 )
 
 
-def ask_general_llm(message: str, system_prompt: Optional[str] = None) -> Optional[str]:
+def _new_client() -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(timeout=LLM_TIMEOUT)
+
+
+# Client dùng chung cho các provider bên ngoài (OpenAI / Gemini), tách riêng với pool tới backend;
+# tạo (và import httpx) khi gọi LLM lần đầu
+_client = AsyncClientHolder(_new_client)
+
+# Câu trả lời cho các câu hỏi chung, giữ qua các lần khởi động lại (xem answer_cache.py)
+_answers = AnswerCache(
+    Path(LLM_CACHE_PATH) if LLM_CACHE_PATH else None,
+    maxsize=LLM_CACHE_MAXSIZE,
+    ttl=LLM_CACHE_TTL,
+    threshold=LLM_CACHE_SIMILARITY,
+)
+
+
+_NO_PROVIDER_REPLY = (
+    "Hiện tại server Python **chưa thấy cấu hình LLM_PROVIDER** "
+    "(OpenAI / Gemini), nên mình chưa thể nhờ thêm mô hình AI khác "
+    "trả lời các câu hỏi kiến thức chung. Bạn hãy kiểm tra lại việc "
+    "set biến môi trường trong đúng cửa sổ đang chạy server ML."
+)
+_OPENAI_NO_KEY_REPLY = (
+    "Hệ thống đang được cấu hình dùng OpenAI cho các câu hỏi kiến thức chung, "
+    "nhưng **chưa có OPENAI_API_KEY** hoặc key không hợp lệ, nên mình tạm "
+    "thời không gọi được ChatGPT. Bạn hãy kiểm tra lại cấu hình server."
+)
+_OPENAI_ERROR_REPLY = (
+    "Mình đã cố gắng gọi ChatGPT (OpenAI) để trả lời câu hỏi kiến thức chung, "
+    "nhưng đang gặp lỗi (có thể do mạng hoặc API key). "
+    "Bạn hãy kiểm tra lại cấu hình server giúp mình nhé."
+)
+_GEMINI_NO_KEY_REPLY = (
+    "Hệ thống đang được cấu hình dùng Gemini cho các câu hỏi kiến thức chung, "
+    "nhưng **chưa có GEMINI_API_KEY** hoặc key không hợp lệ, nên mình tạm "
+    "thời không gọi được Gemini. Bạn hãy kiểm tra lại cấu hình server."
+)
+_GEMINI_ERROR_REPLY = (
+    "Mình đã cố gắng gọi Gemini để trả lời câu hỏi kiến thức chung, "
+    "nhưng đang gặp lỗi (có thể do mạng hoặc cấu hình API). "
+    "Bạn hãy kiểm tra lại cấu hình server giúp mình nhé."
+)
+_NO_KEY_REPLIES = {"openai": _OPENAI_NO_KEY_REPLY, "gemini": _GEMINI_NO_KEY_REPLY}
+_ERROR_REPLIES = {"openai": _OPENAI_ERROR_REPLY, "gemini": _GEMINI_ERROR_REPLY}
+
+
+def _gemini_status_reply(status: int, err_msg: Optional[str]) -> str:
+    return (
+        "Mình đã cố gắng gọi Gemini để trả lời câu hỏi kiến thức chung, "
+        f"nhưng API trả về mã lỗi **{status}**"
+        + (f": {err_msg}" if err_msg else ".")
+        + " Bạn hãy kiểm tra lại API key / quota / project cho Gemini giúp mình nhé."
+    )
+
+
+# --- Cấu hình provider: đọc một lần lúc import (ml/config.py) ---
+
+def _load_providers() -> Tuple[List[ProviderConfig], Optional[str]]:
+    """
+    Các provider dùng được theo thứ tự trong LLM_PROVIDER, kèm câu trả lời khi không dùng được provider nào
+    (chưa cấu hình / thiếu API key; None nếu tên provider không được hỗ trợ).
+    """
+    names = [n.strip().lower() for n in LLM_PROVIDER.split(",") if n.strip()]
+    if not names:
+        # Chưa bật LLM_PROVIDER → thông báo rõ để dễ debug.
+        return [], _NO_PROVIDER_REPLY
+    settings = {
+        "openai": (OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL, OPENAI_RPM),
+        "gemini": (GEMINI_API_KEY, GEMINI_MODEL, GEMINI_BASE_URL, GEMINI_RPM),
+    }
+    configs: List[ProviderConfig] = []
+    for name in dict.fromkeys(names):
+        if name in settings and settings[name][0]:
+            api_key, model, base_url, rpm = settings[name]
+            configs.append(ProviderConfig(name=name, api_key=api_key, model=model, base_url=base_url, rpm=rpm))
+    unavailable = next((_NO_KEY_REPLIES[n] for n in names if n in _NO_KEY_REPLIES), None)
+    return configs, unavailable
+
+
+_providers, _UNAVAILABLE_REPLY = _load_providers()
+_pool = ProviderPool(
+    _providers,
+    failover_budget=LLM_FAILOVER_BUDGET,
+    hedge=LLM_HEDGE,
+    breaker_failures=LLM_BREAKER_FAILURES,
+    breaker_reset=LLM_BREAKER_RESET,
+    rate_burst=LLM_RATE_BURST,
+)
+# Giới hạn số lời gọi provider cùng lúc (kể cả stream); câu trả lời từ cache / single-flight không chiếm chỗ
+_limiter = ConcurrencyLimiter(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+
+
+async def aclose() -> None:
+    await _client.aclose()
+    await asyncio.to_thread(_answers.save)
+
+
+# Single-flight: các lời gọi đồng thời cùng (provider:model, system prompt, câu hỏi đã normalize) dùng chung
+# một request tới provider (vd. cả lớp hỏi cùng một câu ngay sau khi giảng viên đăng bài)
+_inflight: Dict[Tuple[str, str, str], "asyncio.Task[CallResult]"] = {}
+_metrics = {"provider_calls": 0, "coalesced": 0}
+
+
+def llm_stats() -> Dict[str, Any]:
+    return {
+        "answer_cache": _answers.stats(),
+        "in_flight": len(_inflight),
+        **_metrics,
+        "pool": _pool.stats(),
+        "limiter": _limiter.stats(),
+    }
+
+
+def _use_answer_cache(system_prompt: Optional[str]) -> bool:
+    # Chỉ câu hỏi chung (system prompt riêng của handler có thể kèm dữ liệu cá nhân) và khi có provider dùng được
+    return system_prompt is None and bool(_providers)
+
+
+async def _remember_answer(message: str, reply: str) -> None:
+    _answers.put(message, reply)
+    # Ghi file trong thread để không chặn event loop
+    await asyncio.to_thread(_answers.save)
+
+
+def _openai_request(
+    config: ProviderConfig, message: str, system_prompt: str, stream: bool = False
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    url = f"{config.base_url}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {config.api_key}",
+        "Content-Type": "application/json",
+    }
+    payload: Dict[str, Any] = {
+        "model": config.model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message},
+        ],
+        "temperature": 0.6,
+        "max_tokens": 512,
+    }
+    if stream:
+        payload["stream"] = True
+    return url, headers, payload
+
+
+def _gemini_request(
+    config: ProviderConfig, message: str, system_prompt: str, stream: bool = False
+) -> Tuple[str, Dict[str, Any]]:
+    # Bản stream trả về SSE (alt=sse)
+    method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+    url = f"{config.base_url}/models/{config.model}:{method}key={config.api_key}"
+    payload = {
+        "contents": [
+            {
+                "parts": [
+                    {
+                        "text": system_prompt
+                        + "\n\nDữ liệu đầu vào:\n"
+                        + message
+                    }
+                ]
+            }
+        ]
+    }
+    return url, payload
+
+
+def _gemini_text(data: Any) -> str:
+    """Ghép các phần text trong candidate đầu tiên của một response (hoặc một sự kiện stream) Gemini."""
+    candidates = (data.get("candidates") if isinstance(data, dict) else None) or []
+    if not candidates:
+        return ""
+    parts = candidates[0].get("content", {}).get("parts") or []
+    texts = [p.get("text", "") for p in parts if isinstance(p, dict)]
+    return "\n".join(t for t in texts if t)
+
+
+async def ask_general_llm(message: str, system_prompt: Optional[str] = None) -> Optional[str]:
     """
     Gọi LLM bên ngoài (OpenAI ChatGPT hoặc Google Gemini) để trả lời các câu hỏi
     không liên quan tới dữ liệu cá nhân trong hệ thống.
 
-    Cấu hình qua biến môi trường:
-    - LLM_PROVIDER: 'openai' hoặc 'gemini'
-    - OPENAI_API_KEY, OPENAI_MODEL (tuỳ chọn, mặc định 'gpt-4o-mini')
-    - GEMINI_API_KEY, GEMINI_MODEL (tuỳ chọn, mặc định 'gemini-1.5-flash-latest')
+    Cấu hình qua biến môi trường (đọc lúc khởi động, xem ml/config.py):
+    - LLM_PROVIDER: 'openai', 'gemini' hoặc danh sách theo thứ tự ưu tiên ('openai,gemini')
+    - OPENAI_API_KEY, OPENAI_MODEL (tuỳ chọn, mặc định 'gpt-4o-mini'), OPENAI_BASE_URL
+    - GEMINI_API_KEY, GEMINI_MODEL, GEMINI_BASE_URL
+    - LLM_FAILOVER_BUDGET, LLM_HEDGE: chuyển / gọi thêm provider kế tiếp khi provider đang gọi chậm hoặc lỗi
+      (xem llm_pool.py)
+
+    Câu hỏi chung (system prompt mặc định) được trả từ cache câu trả lời nếu đã có câu giống / gần giống
+    (xem answer_cache.py), không gọi provider.
     """
-    provider_raw = os.environ.get("LLM_PROVIDER", "")
-    provider = provider_raw.strip().lower()
-    if not provider:
-        # Chưa bật LLM_PROVIDER → thông báo rõ để dễ debug.
-        return (
-            "Hiện tại server Python **chưa thấy cấu hình LLM_PROVIDER** "
-            "(OpenAI / Gemini), nên mình chưa thể nhờ thêm mô hình AI khác "
-            "trả lời các câu hỏi kiến thức chung. Bạn hãy kiểm tra lại việc "
-            "set biến môi trường trong đúng cửa sổ đang chạy server ML."
-        )
-
-    # Chọn system prompt sử dụng (mặc định dùng SYSTEM_PROMPT chung)
+    if not _providers:
+        return _UNAVAILABLE_REPLY
+    cacheable = _use_answer_cache(system_prompt)
+    if cacheable:
+        cached = _answers.get(message)
+        if cached is not None:
+            return cached
+    reply, _ok = await _ask_shared(message, system_prompt, cacheable)
+    return reply
+
+
+def _flight_key(message: str, system_prompt: Optional[str]) -> Tuple[str, str, str]:
+    return _pool.signature, system_prompt or SYSTEM_PROMPT, question_key(message)
+
+
+async def _ask_shared(message: str, system_prompt: Optional[str], cacheable: bool) -> CallResult:
+    """
+    Gọi pool provider qua single-flight. Lời gọi đầu tiên tạo task gọi provider (kèm lưu cache); các lời gọi
+    trùng khoá tới khi task xong chỉ chờ kết quả của nó. asyncio.shield: một request bị huỷ (client ngắt kết
+    nối) không huỷ lời gọi mà các request khác đang chờ.
+    """
+    key = _flight_key(message, system_prompt)
+    task = _inflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_ask_and_remember(message, system_prompt, cacheable))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+        _metrics["provider_calls"] += 1
+    else:
+        _metrics["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+async def _ask_and_remember(message: str, system_prompt: Optional[str], cacheable: bool) -> CallResult:
     used_system_prompt = system_prompt or SYSTEM_PROMPT
 
-    if provider == "openai":
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return (
-                "Hệ thống đang được cấu hình dùng OpenAI cho các câu hỏi kiến thức chung, "
-                "nhưng **chưa có OPENAI_API_KEY** hoặc key không hợp lệ, nên mình tạm "
-                "thời không gọi được ChatGPT. Bạn hãy kiểm tra lại cấu hình server."
-            )
+    async def _call(config: ProviderConfig) -> CallResult:
+        if config.name == "openai":
+            return await _ask_openai(config, message, used_system_prompt)
+        return await _ask_gemini(config, message, used_system_prompt)
 
-        model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": used_system_prompt},
-                {"role": "user", "content": message},
-            ],
-            "temperature": 0.6,
-            "max_tokens": 512,
-        }
+    # Hàng đợi đầy, hoặc mọi provider đang bị ngắt (circuit breaker) / hết quota → báo lỗi ngay bằng thông báo
+    # của provider đầu tiên
+    fallback = _ERROR_REPLIES[_providers[0].name]
+    if not await _limiter.acquire():
+        return fallback, False
+    try:
+        reply, ok = await _pool.call(_call, fallback=fallback)
+    finally:
+        _limiter.release()
+    if ok and cacheable and reply:
+        await _remember_answer(message, reply)
+    return reply, ok
 
-        try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()
-            choices = data.get("choices") or []
-            if not choices:
-                return None
-            content = choices[0].get("message", {}).get("content")
-            return content.strip() if isinstance(content, str) else None
-        except Exception:
-            return (
-                "Mình đã cố gắng gọi ChatGPT (OpenAI) để trả lời câu hỏi kiến thức chung, "
-                "nhưng đang gặp lỗi (có thể do mạng hoặc API key). "
-                "Bạn hãy kiểm tra lại cấu hình server giúp mình nhé."
-            )
 
-    if provider == "gemini":
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            return (
-                "Hệ thống đang được cấu hình dùng Gemini cho các câu hỏi kiến thức chung, "
-                "nhưng **chưa có GEMINI_API_KEY** hoặc key không hợp lệ, nên mình tạm "
-                "thời không gọi được Gemini. Bạn hãy kiểm tra lại cấu hình server."
+async def _ask_openai(config: ProviderConfig, message: str, system_prompt: str) -> CallResult:
+    """(câu trả lời, True nếu là câu trả lời thật của provider — không phải thông báo lỗi)."""
+    url, headers, payload = _openai_request(config, message, system_prompt)
+    try:
+        resp = await _client.get().post(url, headers=headers, json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        choices = data.get("choices") or []
+        if not choices:
+            return None, False
+        content = choices[0].get("message", {}).get("content")
+        return (content.strip(), True) if isinstance(content, str) else (None, False)
+    except Exception:
+        return _OPENAI_ERROR_REPLY, False
+
+
+async def _ask_gemini(config: ProviderConfig, message: str, system_prompt: str) -> CallResult:
+    url, payload = _gemini_request(config, message, system_prompt)
+    try:
+        resp = await _client.get().post(url, json=payload)
+        # Không dùng raise_for_status ngay, để còn đọc body khi lỗi
+        status = resp.status_code
+        data = resp.json()
+        if status != 200:
+            # Thử lấy message lỗi từ body (nếu có)
+            err_msg = (
+                data.get("error", {}).get("message")
+                if isinstance(data, dict)
+                else None
             )
+            return _gemini_status_reply(status, err_msg), False
+
+        if not data.get("candidates"):
+            return "Gemini không trả về phương án trả lời nào. Bạn thử hỏi lại câu khác giúp mình nhé.", False
+        # Ghép các phần text lại
+        content = _gemini_text(data).strip()
+        if not content:
+            return "Gemini không trả về nội dung văn bản phù hợp.", False
+        return content, True
+    except Exception:
+        return _GEMINI_ERROR_REPLY, False
+
+
+async def _sse_events(resp: "httpx.Response") -> AsyncIterator[Any]:
+    """Các sự kiện `data: {...}` (đã parse JSON) của một response SSE; dừng ở `data: [DONE]`."""
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+
+async def stream_general_llm(message: str, system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Giống ask_general_llm nhưng trả dần từng đoạn text ngay khi provider gửi về (stream của OpenAI /
+    Gemini), để /chat/stream không phải chờ hết câu trả lời. Các thông báo lỗi cấu hình / lỗi gọi API
+    được trả thành một đoạn duy nhất; lỗi giữa chừng (đã gửi một phần) thì dừng ở phần đã gửi.
+    Không yield gì nếu provider không được hỗ trợ hoặc không có nội dung (tương ứng ask_general_llm trả None).
+    Câu trả lời có trong cache được trả thành một đoạn; câu trả lời stream trọn vẹn được lưu vào cache.
+    """
+    if not _providers:
+        if _UNAVAILABLE_REPLY:
+            yield _UNAVAILABLE_REPLY
+        return
+    cacheable = _use_answer_cache(system_prompt)
+    if cacheable:
+        cached = _answers.get(message)
+        if cached is not None:
+            yield cached
+            return
+    parts: List[str] = []
+    complete = True
+    async for text, ok in _stream_pool(message, system_prompt or SYSTEM_PROMPT):
+        complete = complete and ok
+        if text:
+            parts.append(text)
+            yield text
+    reply = "".join(parts).strip()
+    if complete and cacheable and reply:
+        await _remember_answer(message, reply)
+
 
-        # Mặc định dùng model theo quickstart mới (có thể override bằng GEMINI_MODEL)
-        model = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-preview-09-2025")
-        # Dùng v1beta (ổn định hơn với API key hiện tại của bạn)
-        url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
-            f"{model}:generateContent?key={api_key}"
-        )
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": used_system_prompt
-                            + "\n\nDữ liệu đầu vào:\n"
-                            + message
-                        }
-                    ]
-                }
-            ]
-        }
+async def _stream_pool(message: str, system_prompt: str) -> AsyncIterator[Tuple[str, bool]]:
+    """
+    Stream từ provider đầu tiên dùng được; provider lỗi trước khi gửi được chữ nào thì chuyển sang provider
+    kế tiếp (không hedge: đã gửi token cho client thì không đổi provider được). Hết provider / hàng đợi đầy →
+    thông báo lỗi của provider đầu tiên. Giữ một chỗ của _limiter tới khi stream xong.
+    """
+    if not await _limiter.acquire():
+        yield _ERROR_REPLIES[_providers[0].name], False
+        return
+    try:
+        async for item in _stream_candidates(message, system_prompt):
+            yield item
+    finally:
+        _limiter.release()
 
+
+async def _stream_candidates(message: str, system_prompt: str) -> AsyncIterator[Tuple[str, bool]]:
+    first_error: Optional[str] = None
+    for state in _pool.candidates():
+        if first_error is not None:
+            _pool.failovers += 1
+        stream = _stream_openai if state.config.name == "openai" else _stream_gemini
+        sent = False
+        recorded = False
         try:
-            resp = requests.post(url, json=payload, timeout=15)
-            # Không dùng raise_for_status ngay, để còn đọc body khi lỗi
-            status = resp.status_code
-            data = resp.json()
-            if status != 200:
-                # Thử lấy message lỗi từ body (nếu có)
-                err_msg = (
-                    data.get("error", {}).get("message")
-                    if isinstance(data, dict)
-                    else None
-                )
-                return (
-                    "Mình đã cố gắng gọi Gemini để trả lời câu hỏi kiến thức chung, "
-                    f"nhưng API trả về mã lỗi **{status}**"
-                    + (f": {err_msg}" if err_msg else ".")
-                    + " Bạn hãy kiểm tra lại API key / quota / project cho Gemini giúp mình nhé."
-                )
-
-            candidates = data.get("candidates") or []
-            if not candidates:
-                return "Gemini không trả về phương án trả lời nào. Bạn thử hỏi lại câu khác giúp mình nhé."
-            parts = candidates[0].get("content", {}).get("parts") or []
-            # Ghép các phần text lại
-            texts = [p.get("text", "") for p in parts if isinstance(p, dict)]
-            content = "\n".join(t for t in texts if t)
-            return content.strip() or "Gemini không trả về nội dung văn bản phù hợp."
-        except Exception as e:
-            return (
-                "Mình đã cố gắng gọi Gemini để trả lời câu hỏi kiến thức chung, "
-                "nhưng đang gặp lỗi (có thể do mạng hoặc cấu hình API). "
-                "Bạn hãy kiểm tra lại cấu hình server giúp mình nhé."
-            )
+            async for text, ok in stream(state.config, message, system_prompt):
+                if ok:
+                    if not sent:
+                        # Latency stream không so được với lời gọi thường → không tính vào p95 của pool
+                        state.record(None, True)
+                        recorded = True
+                    sent = True
+                    yield text, True
+                elif sent:
+                    # Đứt giữa chừng
+                    yield "", False
+                else:
+                    first_error = first_error or text
+                    state.record(None, False)
+                    recorded = True
+        finally:
+            if not recorded:
+                # Stream bị bỏ dở (client ngắt, bị huỷ) trước khi có kết quả → nhả lượt thăm dò half_open
+                state.breaker.release()
+        if sent:
+            return
+    yield first_error or _ERROR_REPLIES[_providers[0].name], False
 
-    # Provider không được hỗ trợ
-    return None
+
+async def _stream_openai(config: ProviderConfig, message: str, system_prompt: str) -> AsyncIterator[Tuple[str, bool]]:
+    """Các đoạn (text, ok) của stream; ok=False cho thông báo lỗi, và ("", False) khi stream bị đứt giữa chừng."""
+    url, headers, payload = _openai_request(config, message, system_prompt, stream=True)
+    sent = False
+    try:
+        async with _client.get().stream("POST", url, headers=headers, json=payload) as resp:
+            resp.raise_for_status()
+            async for event in _sse_events(resp):
+                choices = event.get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if isinstance(delta, str) and delta:
+                    # Bỏ khoảng trắng đầu câu trả lời như bản không stream (strip)
+                    if not sent:
+                        delta = delta.lstrip()
+                        if not delta:
+                            continue
+                    sent = True
+                    yield delta, True
+    except Exception:
+        yield ("" if sent else _OPENAI_ERROR_REPLY), False
 
 
+async def _stream_gemini(config: ProviderConfig, message: str, system_prompt: str) -> AsyncIterator[Tuple[str, bool]]:
+    url, payload = _gemini_request(config, message, system_prompt, stream=True)
+    sent = False
+    try:
+        async with _client.get().stream("POST", url, json=payload) as resp:
+            if resp.status_code != 200:
+                # Lỗi trả về một JSON bình thường (không phải SSE)
+                try:
+                    data = json.loads(await resp.aread())
+                    err_msg = data.get("error", {}).get("message") if isinstance(data, dict) else None
+                except ValueError:
+                    err_msg = None
+                yield _gemini_status_reply(resp.status_code, err_msg), False
+                return
+            async for event in _sse_events(resp):
+                text = _gemini_text(event)
+                if not sent:
+                    text = text.lstrip()
+                if text:
+                    sent = True
+                    yield text, True
+    except Exception:
+        yield ("" if sent else _GEMINI_ERROR_REPLY), False
+        return
+    if not sent:
+        yield "Gemini không trả về nội dung văn bản phù hợp.", False
@@ -0,0 +1,229 @@
+"""
+Pool các provider LLM bên ngoài (OpenAI / Gemini) cho llm_client.
+
+- Cấu hình đọc một lần lúc khởi động (ml/config.py): LLM_PROVIDER là danh sách provider theo thứ tự ưu tiên
+  ("openai,gemini"); provider thiếu API key bị bỏ qua.
+- Mỗi provider có thống kê latency (p95 trên các lần gọi gần đây), tỉ lệ lỗi, một circuit breaker và một
+  token bucket theo quota của provider (OPENAI_RPM / GEMINI_RPM); provider hết token được bỏ qua như khi
+  breaker mở.
+- call(): gọi provider đầu tiên; nếu lỗi thì chuyển ngay sang provider kế tiếp, nếu quá LLM_FAILOVER_BUDGET
+  giây chưa xong thì gọi thêm provider kế tiếp (vẫn chờ cả hai). Bật LLM_HEDGE thì provider kế tiếp được gọi
+  sớm hơn, ngay khi lời gọi hiện tại vượt p95 của chính provider đó. Kết quả tốt đầu tiên thắng, các lời gọi
+  còn lại bị huỷ.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ml.services.circuit_breaker import CircuitBreaker
+from ml.services.rate_limit import TokenBucket
+
+# Số lần gọi gần nhất dùng để tính p95 / tỉ lệ lỗi, và số mẫu tối thiểu trước khi tin p95
+_WINDOW = 200
+_MIN_SAMPLES = 20
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    name: str
+    api_key: str
+    model: str
+    base_url: str
+    # Số request tối đa mỗi phút; 0 = không giới hạn
+    rpm: float = 0
+
+
+# Kết quả một lời gọi provider: (câu trả lời, True nếu là câu trả lời thật — không phải thông báo lỗi)
+CallResult = Tuple[Optional[str], bool]
+
+
+class ProviderState:
+    def __init__(self, config: ProviderConfig, breaker_failures: int, breaker_reset: float, rate_burst: float):
+        self.config = config
+        self.breaker = CircuitBreaker(failure_threshold=breaker_failures, reset_timeout=breaker_reset)
+        self.bucket = TokenBucket(config.rpm / 60, burst=rate_burst)
+        self.rate_limited = 0
+        self._latencies: "deque[float]" = deque(maxlen=_WINDOW)
+        self._outcomes: "deque[bool]" = deque(maxlen=_WINDOW)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def admit(self) -> bool:
+        """Có được gọi provider lúc này không; lấy một token nếu được."""
+        # Xét token trước (không lấy): breaker ở half_open chỉ cho một request thăm dò, không được phí lượt đó
+        if not self.bucket.available():
+            self.rate_limited += 1
+            return False
+        if not self.breaker.allow_request():
+            return False
+        if not self.bucket.try_acquire():
+            # Token vừa bị lấy mất: không gọi → trả lại lượt thăm dò half_open (nếu vừa được cho)
+            self.breaker.release()
+            return False
+        return True
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        """Kết quả một lời gọi; latency=None: không tính vào p95 (vd. stream, đo tới token đầu tiên)."""
+        with self._lock:
+            self.calls += 1
+            self._outcomes.append(ok)
+            if ok:
+                if latency is not None:
+                    self._latencies.append(latency)
+            else:
+                self.errors += 1
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < _MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return round(self._outcomes.count(False) / len(self._outcomes), 4) if self._outcomes else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "model": self.config.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": self.error_rate(),
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "rate_limited": self.rate_limited,
+            "rate_limit": self.bucket.stats(),
+            "breaker": self.breaker.stats(),
+        }
+
+
+class ProviderPool:
+    def __init__(
+        self,
+        configs: List[ProviderConfig],
+        failover_budget: float,
+        hedge: bool = False,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+        rate_burst: float = 1.0,
+    ):
+        self.providers = [ProviderState(c, breaker_failures, breaker_reset, rate_burst) for c in configs]
+        # failover_budget <= 0 → chỉ chuyển provider khi lỗi
+        self.failover_budget = failover_budget if failover_budget > 0 else None
+        self.hedge = hedge
+        self.failovers = 0
+        self.hedges = 0
+        self.rejected = 0
+
+    @property
+    def signature(self) -> str:
+        """Danh sách provider:model, dùng trong khoá single-flight của llm_client."""
+        return ",".join(f"{p.config.name}:{p.config.model}" for p in self.providers)
+
+    def candidates(self) -> Iterator[ProviderState]:
+        """Các provider theo thứ tự ưu tiên, bỏ qua provider có breaker đang mở / hết token (xét lười từng cái)."""
+        for state in self.providers:
+            if state.admit():
+                yield state
+            else:
+                self.rejected += 1
+
+    def _start_delay(self, state: ProviderState) -> Optional[float]:
+        """Sau bao lâu (giây, tính từ lúc gọi `state`) thì gọi thêm provider kế tiếp."""
+        delay = self.failover_budget
+        if self.hedge:
+            p95 = state.p95()
+            if p95 is not None and (delay is None or p95 < delay):
+                return p95
+        return delay
+
+    async def _timed(self, state: ProviderState, fn: Callable[[ProviderConfig], Awaitable[CallResult]]) -> CallResult:
+        t0 = time.monotonic()
+        try:
+            result = await fn(state.config)
+        except BaseException:
+            # Bị huỷ (thua provider khác, người gọi bỏ đi): không tính là lỗi, nhưng nếu đây là request
+            # thăm dò half_open thì phải nhả lượt, không thì breaker kẹt ở half_open
+            state.breaker.release()
+            raise
+        state.record(time.monotonic() - t0, result[1])
+        return result
+
+    async def call(self, fn: Callable[[ProviderConfig], Awaitable[CallResult]], fallback: Optional[str]) -> CallResult:
+        """
+        Gọi fn(config) theo chính sách failover / hedge ở đầu file. Trả về kết quả tốt đầu tiên; nếu mọi provider
+        đều lỗi thì trả kết quả lỗi của provider gọi đầu tiên, không gọi được provider nào thì (fallback, False).
+        """
+        pending = self.candidates()
+        running: Dict["asyncio.Future[CallResult]", ProviderState] = {}
+        first_error: Optional[CallResult] = None
+        last_started: Optional[Tuple[ProviderState, float]] = None
+
+        def _start_next() -> bool:
+            nonlocal last_started
+            state = next(pending, None)
+            if state is None:
+                return False
+            running[asyncio.ensure_future(self._timed(state, fn))] = state
+            last_started = (state, time.monotonic())
+            return True
+
+        if not _start_next():
+            return fallback, False
+        more = True
+        try:
+            while running:
+                timeout = None
+                if more and last_started is not None:
+                    delay = self._start_delay(last_started[0])
+                    if delay is not None:
+                        timeout = max(delay - (time.monotonic() - last_started[1]), 0.0)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Quá ngân sách (hoặc quá p95 khi hedge) → gọi thêm provider kế tiếp, vẫn chờ provider cũ
+                    budget_hit = self.failover_budget is not None and timeout is not None and (
+                        time.monotonic() - last_started[1] >= self.failover_budget  # type: ignore[index]
+                    )
+                    more = _start_next()
+                    if more:
+                        if budget_hit:
+                            self.failovers += 1
+                        else:
+                            self.hedges += 1
+                    continue
+                for task in done:
+                    running.pop(task)
+                    result = task.result()
+                    if result[1]:
+                        return result
+                    if first_error is None:
+                        first_error = result
+                # Lỗi → chuyển ngay sang provider kế tiếp (nếu còn và chưa gọi)
+                if more and not running:
+                    more = _start_next()
+                    if more:
+                        self.failovers += 1
+            return first_error if first_error is not None else (fallback, False)
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {p.config.name: p.stats() for p in self.providers},
+            "failover_budget": self.failover_budget,
+            "hedge": self.hedge,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "rejected": self.rejected,
+        }
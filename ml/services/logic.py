@@ -1,16 +1,20 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Awaitable, Callable
 
-import sys
+import re
 
 import json
-from ml.services.data_client import (
-    fetch_deadlines_for_user,
-    fetch_results_for_user,
-    fetch_full_context,
+from ml.services.academic import (
+    GRADUATION_MIN_GPA4,
+    assess_academic_warning,
+    assess_graduation,
+    calculate_gpa_and_credits as _calculate_gpa_and_credits,
+    four_from_10,
 )
-from ml.services.intent import predict_intent
+from ml.services.context import RequestContext, compile_context, sem_num
+from ml.services.intent import predict_intent, predict_intent_async
 from ml.services.nlp_utils import find_course_in_text, normalize
-from ml.services.llm_client import ask_general_llm
+from ml.services.router import CHAT_ROUTER
+from ml.services.llm_client import ask_general_llm, stream_general_llm
 from datetime import datetime
 
 # --- Session-level conversational state (đơn giản, lưu trong RAM của process) ---
@@ -33,187 +37,32 @@ def _get_session_state(user_id: Optional[str]) -> Dict[str, Any]:
 
 # --- Utility Functions ---
 
-def four_from_10(grade10: float) -> float:
-    """
-    Chuyển đổi điểm hệ 10 sang hệ 4.
-    Theo bảng: 8.95-10 → 4.0, 8.45-8.94 → 3.7, 7.95-8.44 → 3.5, 
-    6.95-7.94 → 3.0, 6.45-6.94 → 2.5, 5.45-6.44 → 2.0, 
-    4.95-5.44 → 1.5, 3.95-4.94 → 1.0, dưới 3.95 → 0.0
-    """
-    if grade10 >= 8.95:
-        return 4.0
-    elif grade10 >= 8.45:
-        return 3.7
-    elif grade10 >= 7.95:
-        return 3.5
-    elif grade10 >= 6.95:
-        return 3.0
-    elif grade10 >= 6.45:
-        return 2.5
-    elif grade10 >= 5.45:
-        return 2.0
-    elif grade10 >= 4.95:
-        return 1.5
-    elif grade10 >= 3.95:
-        return 1.0
-    else:
-        return 0.0
+_DIGITS_RE = re.compile(r"(\d+)")
 
 
-def _get_user_name(user_id: Optional[str]) -> Optional[str]:
+async def _get_user_name(rctx: RequestContext) -> Optional[str]:
     """
     Lấy tên người dùng từ context chung để cá nhân hóa lời chào.
-    Dùng lại /api/chatbot/context để tránh phải mở thêm API mới.
+    Dùng lại context của lượt chat hiện tại để tránh phải gọi thêm API.
     """
-    if not user_id:
-        return None
-    ctx = fetch_full_context(user_id)
-    if not ctx:
-        return None
-    user = ctx.get("user") or {}
-    name = (user.get("name") or "").strip()
-    return name or None
-
-
-def _calculate_gpa_and_credits(
-    user_id: str,
-    ctx: Dict[str, Any],
-) -> Dict[str, Any]:
-    """Tính GPA tích lũy, tín chỉ tích lũy, và danh sách môn nợ."""
-    # Trong /api/chatbot/context, backend trả:
-    # - results: object {semesterKey: {courseCode: {grade,status,...}}}
-    # - curriculum: object với field semesters
-    results_data = ctx.get("results") or {}
-    curriculum = ctx.get("curriculum") or {}
-
-    if not results_data or not curriculum:
-        return {
-            "gpa": None,
-            "total_credits_passed": 0,
-            "total_credits_gpa": 0,
-            "required_credits": 0,
-            "required_credits_gpa": 0,
-            "debt_courses": [],
-            "error": "Không tìm thấy dữ liệu kết quả học tập hoặc chương trình học.",
-        }
-
-    total_gpa_points = 0.0
-    total_credits_gpa = 0
-    total_credits_passed = 0
-    debt_courses: List[Dict[str, Any]] = []
-
-    # Map môn học theo code để dễ tra cứu
-    course_map: Dict[str, Dict[str, Any]] = {}
-    for sem in curriculum.get("semesters", []):
-        for course in sem.get("courses", []):
-            course_map[course.get("code", "")] = course
-
-    # Tính toán
-    for semester_data in results_data.values():
-        for code, result in semester_data.items():
-            course_info = course_map.get(code)
-
-            # Nếu chương trình học không có thông tin môn này thì bỏ qua
-            if not course_info:
-                continue
-
-            # Bỏ qua các môn không tính GPA hoặc không tính tín chỉ
-            is_count_in_gpa = course_info.get("countInGpa", False)
-            is_count_in_credits = course_info.get("countInCredits", False)
-            course_credit = course_info.get("credit", 0)
-
-            # Lấy điểm & trạng thái từ kết quả
-            raw_grade = result.get("grade", None)
-            grade: Optional[float]
-            if isinstance(raw_grade, (int, float)):
-                grade = float(raw_grade)
-            else:
-                grade = None
-            status = str(result.get("status", "") or "").lower()
-
-            # Tính điểm GPA (hệ 10) – chỉ tính khi có điểm số
-            if (
-                is_count_in_gpa
-                and course_credit > 0
-                and grade is not None
-            ):
-                total_gpa_points += grade * course_credit
-                total_credits_gpa += course_credit
-
-            # Tín chỉ đã qua / nợ:
-            # - passed  => cộng vào total_credits_passed
-            # - failed  => tính là môn nợ
-            # - thiếu grade hoặc status khác (chưa học / đang học) => KHÔNG tính là nợ
-            if is_count_in_credits and course_credit > 0:
-                if status == "passed":
-                    total_credits_passed += course_credit
-                elif status == "failed":
-                    debt_courses.append(
-                        {
-                            "code": code,
-                            "name": course_info.get("name", code),
-                            "credit": course_credit,
-                            "grade": grade if grade is not None else 0.0,
-                        }
-                    )
-
-    gpa = (total_gpa_points / total_credits_gpa) if total_credits_gpa > 0 else 0.0
-
-    # Tính tổng tín chỉ yêu cầu
-    required_credits = sum(
-        c.get("credit", 0)
-        for sem in curriculum.get("semesters", [])
-        for c in sem.get("courses", [])
-        if c.get("countInCredits", False)
-    )
-    required_credits_gpa = sum(
-        c.get("credit", 0)
-        for sem in curriculum.get("semesters", [])
-        for c in sem.get("courses", [])
-        if c.get("countInGpa", False)
-    )
+    return await rctx.user_name()
 
-    return {
-        "gpa": round(gpa, 2),
-        "total_credits_passed": total_credits_passed,
-        "total_credits_gpa": total_credits_gpa,
-        "required_credits": required_credits,
-        "required_credits_gpa": required_credits_gpa,
-        "debt_courses": debt_courses,
-    }
 
+async def _answer_deadline(message: str, rctx: RequestContext) -> str:
+    # Khi /api/chatbot/context chậm/lỗi, RequestContext đã ghép sẵn deadlines từ /api/deadlines
+    ctx = await rctx.get()
+    if not ctx or "deadlines" not in ctx:
+        return "Mình không lấy được danh sách deadline từ backend (có thể server đang tắt)."
 
-def _answer_deadline(message: str, user_id: str) -> str:
-    ctx = fetch_full_context(user_id)
-    if not ctx:
-        data = fetch_deadlines_for_user(user_id)
-        if not data or "data" not in data:
-            return "Mình không lấy được danh sách deadline từ backend (có thể server đang tắt)."
-        items = data.get("data") or []
-        total = len(items)
-        completed = sum(1 for d in items if (d.get("status") == "completed"))
-        incomplete = total - completed
-        if total == 0:
-            return "Hiện tại bạn chưa có deadline nào trong hệ thống."
-        return (
-            f"Bạn đang có tổng cộng {total} deadline, trong đó {completed} đã hoàn thành "
-            f"và {incomplete} đang còn lại. Bạn có thể vào trang Deadline hoặc Lịch để xem chi tiết."
-        )
-
-    deadlines = ctx.get("deadlines") or []
+    sc = compile_context(ctx)
     course = find_course_in_text(message, ctx)
 
     if course:
         code = course["code"]
         name = course["name"]
-        norm_code = code.lower()
-        
-        # Lọc deadline theo môn học (bỏ lịch thi)
-        course_deadlines = [
-            d
-            for d in deadlines
-            if d.get("courseCode", "").lower() == norm_code and not d.get("isExam", False)
-        ]
+
+        # Deadline của môn học (đã bỏ lịch thi)
+        course_deadlines = sc.tasks_by_course.get(code.lower(), [])
         
         if not course_deadlines:
             return f"Mình không tìm thấy deadline nào cho môn **{name} ({code})**."
@@ -264,8 +113,7 @@ def _answer_deadline(message: str, user_id: str) -> str:
 
     # Trả lời chung nếu không tìm thấy môn học cụ thể (bỏ lịch thi)
     pending_deadlines = [
-        d for d in deadlines 
-        if d.get("status") in ("upcoming", "ongoing") and not d.get("isExam", False)
+        d for d in sc.task_deadlines if d.get("status") in ("upcoming", "ongoing")
     ]
 
     if len(pending_deadlines) == 0:
@@ -291,22 +139,18 @@ def _answer_deadline(message: str, user_id: str) -> str:
     return reply
 
 
-def _answer_exam_schedule(message: str, user_id: str) -> str:
+async def _answer_exam_schedule(message: str, rctx: RequestContext) -> str:
     """
     Trả lời về **lịch thi** (ngày/giờ thi), dựa trên các deadline có isExam = True.
     - Nếu người dùng nhắc tới một môn cụ thể → trả lời lịch thi của môn đó.
     - Nếu không → tóm tắt các lịch thi sắp tới / đã thi.
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
-        data = fetch_deadlines_for_user(user_id)
-        if not data or "data" not in data:
-            return "Mình không lấy được danh sách lịch thi từ backend (có thể server đang tắt)."
-        deadlines = data.get("data") or []
-    else:
-        deadlines = ctx.get("deadlines") or []
+    ctx = await rctx.get()
+    if not ctx or "deadlines" not in ctx:
+        return "Mình không lấy được danh sách lịch thi từ backend (có thể server đang tắt)."
+    sc = compile_context(ctx)
 
-    exam_deadlines = [d for d in deadlines if d.get("isExam")]
+    exam_deadlines = sc.exam_deadlines
     if not exam_deadlines:
         return "Hiện mình không thấy lịch thi nào được lưu trong hệ thống cho bạn."
 
@@ -315,13 +159,7 @@ def _answer_exam_schedule(message: str, user_id: str) -> str:
     if course:
         code = course["code"]
         name = course["name"]
-        norm_code = code.lower()
-
-        course_exams = [
-            d
-            for d in exam_deadlines
-            if str(d.get("courseCode", "")).lower() == norm_code
-        ]
+        course_exams = sc.exams_by_course.get(code.lower(), [])
         if not course_exams:
             return f"Mình không tìm thấy lịch thi nào được lưu cho môn **{name} ({code})**."
 
@@ -422,22 +260,18 @@ def _answer_exam_schedule(message: str, user_id: str) -> str:
     return reply
 
 
-def _answer_gpa(message: str, user_id: str) -> str:
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+async def _answer_gpa(message: str, rctx: RequestContext) -> str:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu kết quả học tập để tính GPA."
+    ctx = sc.raw
 
     # Nếu trong câu hỏi có nhắc tới một môn cụ thể → trả lời điểm môn đó
-    course = find_course_in_text(message, ctx)
+    course = find_course_in_text(message, ctx, fuzzy=True)
     if course:
         code = course["code"]
         name = course["name"]
-        results_data = ctx.get("results") or {}
-        result = None
-        for sem_data in results_data.values():
-            if code in sem_data:
-                result = sem_data[code]
-                break
+        result = sc.result_by_code.get(code)
 
         if result and "grade" in result:
             grade10 = float(result.get("grade", 0))
@@ -462,23 +296,8 @@ def _answer_gpa(message: str, user_id: str) -> str:
         )
 
     # Nếu không hỏi môn cụ thể → trả lời GPA tổng quát
-    # Ưu tiên dùng GPA tích lũy hệ 4 đã được backend tính sẵn (cumGpa4)
-    stats_ctx = ctx.get("stats") or {}
-    cum_gpa4 = stats_ctx.get("cumGpa4") or {}
-    gpa4: Optional[float] = None
-    if isinstance(cum_gpa4, dict) and cum_gpa4:
-        # Lấy kỳ mới nhất dựa trên số thứ tự trong key (HK1, HK2, ...)
-        def _sem_num(k: str) -> int:
-            import re as _re
-            m = _re.search(r"(\d+)", str(k))
-            return int(m.group(1)) if m else 0
-
-        last_key = sorted(cum_gpa4.keys(), key=_sem_num)[-1]
-        try:
-            gpa4 = float(cum_gpa4[last_key])
-        except Exception:
-            gpa4 = None
-
+    # Ưu tiên dùng GPA tích lũy hệ 4 đã được backend tính sẵn (cumGpa4, kỳ mới nhất)
+    gpa4 = sc.latest_cum_gpa4
     if gpa4 is not None:
         return (
             f"Điểm trung bình tích lũy hiện tại của bạn khoảng **{gpa4} / 4.0**. "
@@ -486,7 +305,7 @@ def _answer_gpa(message: str, user_id: str) -> str:
         )
 
     # Fallback: tự tính lại nếu không có cumGpa4
-    stats = _calculate_gpa_and_credits(user_id, ctx)
+    stats = _calculate_gpa_and_credits(rctx.user_id, ctx)
     gpa = stats.get("gpa")
     if gpa is None:
         return stats.get(
@@ -497,75 +316,52 @@ def _answer_gpa(message: str, user_id: str) -> str:
     return f"GPA tích lũy hiện tại của bạn khoảng **{gpa}**. Tiếp tục cố gắng nhé!"
 
 
-def _answer_semester_gpa(message: str, user_id: str) -> str:
+async def _answer_semester_gpa(message: str, rctx: RequestContext) -> str:
     """
     Trả lời GPA theo từng học kỳ (vd: GPA học kỳ 1, HK2, ...).
     Dùng stats.semGpa4 (hệ 4) từ backend, suy ra học kỳ từ câu hỏi.
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu để tính điểm trung bình học kỳ."
 
-    stats_ctx = ctx.get("stats") or {}
-    sem_gpa4 = stats_ctx.get("semGpa4") or {}
-
-    # Nếu backend có truyền kỳ học hiện tại (do người dùng chọn trên Tiến trình), ưu tiên sử dụng nó
-    current_study_sem = str(ctx.get("currentStudySem") or "").strip() or None
+    sem_gpa4 = sc.sem_gpa4
     if not isinstance(sem_gpa4, dict) or not sem_gpa4:
         return "Hiện chưa có dữ liệu GPA theo từng học kỳ của bạn."
 
-    import re as _re
-
     norm = normalize(message)
-    m = _re.search(r"(\d+)", norm)
-    if not m:
+    if not _DIGITS_RE.search(norm):
         return "Bạn muốn xem điểm trung bình học kỳ số mấy? (ví dụ: học kỳ 1, HK2, ...)"
 
-    sem_num = int(m.group(1))
-
-    def _sem_num_from_key(k: str) -> int:
-        mm = _re.search(r"(\d+)", str(k))
-        return int(mm.group(1)) if mm else 0
-
-    target_key = None
-    for key in sem_gpa4.keys():
-        if _sem_num_from_key(key) == sem_num:
-            target_key = key
-            break
+    target_num = sem_num(norm)
+    target_key = sc.sem_gpa4_key_by_num.get(target_num)
 
     if target_key is None:
-        return f"Mình không tìm thấy dữ liệu GPA cho học kỳ {sem_num} trong hệ thống."
+        return f"Mình không tìm thấy dữ liệu GPA cho học kỳ {target_num} trong hệ thống."
 
     try:
         g4 = float(sem_gpa4[target_key])
     except Exception:
-        return f"Dữ liệu GPA học kỳ {sem_num} hiện tại không hợp lệ. Bạn thử kiểm tra lại bảng điểm trên trang Kết quả nhé."
+        return f"Dữ liệu GPA học kỳ {target_num} hiện tại không hợp lệ. Bạn thử kiểm tra lại bảng điểm trên trang Kết quả nhé."
 
     return (
-        f"Điểm trung bình **học kỳ {sem_num}** của bạn khoảng **{g4} / 4.0**."
+        f"Điểm trung bình **học kỳ {target_num}** của bạn khoảng **{g4} / 4.0**."
     )
 
 
-def _answer_best_semester(user_id: str) -> str:
+async def _answer_best_semester(rctx: RequestContext) -> str:
     """
     Trả lời: Học kỳ nào có điểm trung bình cao nhất?
     Dựa trên stats.semGpa4 (hệ 4) từ backend.
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu để so sánh điểm trung bình các học kỳ."
 
-    stats_ctx = ctx.get("stats") or {}
-    sem_gpa4 = stats_ctx.get("semGpa4") or {}
+    sem_gpa4 = sc.sem_gpa4
     if not isinstance(sem_gpa4, dict) or not sem_gpa4:
         return "Hiện chưa có dữ liệu GPA theo từng học kỳ của bạn để so sánh."
 
-    import re as _re
-
-    def _sem_num_from_key(k: str) -> int:
-        mm = _re.search(r"(\d+)", str(k))
-        return int(mm.group(1)) if mm else 0
-
     # Tìm GPA cao nhất và các học kỳ đạt mức đó
     best_val: float = -1.0
     best_keys: list[str] = []
@@ -584,8 +380,8 @@ def _answer_best_semester(user_id: str) -> str:
         return "Mình không đọc được dữ liệu GPA học kỳ của bạn."
 
     # Sắp xếp các học kỳ theo số
-    best_keys_sorted = sorted(best_keys, key=_sem_num_from_key)
-    labels = [f"HK{_sem_num_from_key(k)}" for k in best_keys_sorted]
+    best_keys_sorted = sorted(best_keys, key=sem_num)
+    labels = [f"HK{sem_num(k)}" for k in best_keys_sorted]
     if len(labels) == 1:
         return (
             f"Học kỳ có điểm trung bình cao nhất của bạn là **{labels[0]}**, "
@@ -599,13 +395,13 @@ def _answer_best_semester(user_id: str) -> str:
     )
 
 
-def _answer_debt_courses(user_id: str) -> str:
+async def _answer_debt_courses(rctx: RequestContext) -> str:
     """Trả lời ngắn gọn về danh sách môn nợ."""
-    ctx = fetch_full_context(user_id)
+    ctx = await rctx.get()
     if not ctx:
         return "Không thể lấy dữ liệu để kiểm tra môn nợ."
     
-    stats = _calculate_gpa_and_credits(user_id, ctx)
+    stats = _calculate_gpa_and_credits(rctx.user_id, ctx)
     debt_courses = stats.get("debt_courses", [])
     
     if not debt_courses:
@@ -623,12 +419,12 @@ def _answer_debt_courses(user_id: str) -> str:
     return result
 
 
-def _answer_credits(user_id: str) -> str:
-    ctx = fetch_full_context(user_id)
+async def _answer_credits(rctx: RequestContext) -> str:
+    ctx = await rctx.get()
     if not ctx:
         return "Không thể lấy dữ liệu chương trình học và kết quả học tập để kiểm tra tín chỉ."
 
-    stats = _calculate_gpa_and_credits(user_id, ctx)
+    stats = _calculate_gpa_and_credits(rctx.user_id, ctx)
     total_passed = stats.get("total_credits_passed", 0)
     required = stats.get("required_credits", 0)
     debt_courses = stats.get("debt_courses", [])
@@ -665,67 +461,37 @@ def _answer_credits(user_id: str) -> str:
             )
 
 
-def _answer_graduation(user_id: str) -> str:
+async def _answer_graduation(rctx: RequestContext) -> str:
     """Đánh giá khả năng ra trường đúng hạn theo hướng "cố vấn học tập" hơn."""
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu đầy đủ để ước lượng khả năng ra trường của bạn."
 
-    stats = _calculate_gpa_and_credits(user_id, ctx)
-    gpa10 = stats.get("gpa")  # GPA hệ 10
-    required_gpa_credits = stats.get("required_credits_gpa", 0)
-    total_gpa_credits = stats.get("total_credits_gpa", 0)
-    total_credits_passed = stats.get("total_credits_passed", 0)
-    required_credits = stats.get("required_credits", 0)
-    debt_courses = stats.get("debt_courses", [])
-
-    if gpa10 is None or required_credits == 0:
-        return stats.get("error", "Không thể ước lượng: Thiếu thông tin về GPA hoặc tổng tín chỉ yêu cầu.")
-
-    # Lấy GPA hệ 4 từ backend hoặc chuyển đổi từ hệ 10
-    stats_ctx = ctx.get("stats") or {}
-    cum_gpa4 = stats_ctx.get("cumGpa4") or {}
-
-    # Nếu backend có truyền kỳ học hiện tại (do người dùng chọn trên Tiến trình), ưu tiên sử dụng nó
-    current_study_sem = str(ctx.get("currentStudySem") or "").strip() or None
-    gpa4: Optional[float] = None
-    if isinstance(cum_gpa4, dict) and cum_gpa4:
-        # Lấy kỳ mới nhất
-        def _sem_num(k: str) -> int:
-            import re as _re
-            m = _re.search(r"(\d+)", str(k))
-            return int(m.group(1)) if m else 0
-        last_key = sorted(cum_gpa4.keys(), key=_sem_num)[-1] if cum_gpa4 else None
-        if last_key:
-            try:
-                gpa4 = float(cum_gpa4[last_key])
-            except Exception:
-                gpa4 = None
-
-    # Nếu không có GPA hệ 4 từ backend, chuyển đổi từ hệ 10
-    if gpa4 is None:
-        gpa4 = four_from_10(gpa10)
-
-    # Giả định: Tốt nghiệp yêu cầu GPA >= 2.0 (hệ 4) và đủ tín chỉ
-    MIN_GPA4 = 2.0
-
-    # 1. Kiểm tra GPA và mức rủi ro GPA
-    if gpa4 < MIN_GPA4:
+    a = assess_graduation(rctx.user_id, sc)
+    if "error" in a:
+        return a["error"]
+
+    gpa4 = a["gpa4"]
+    total_credits_passed = a["total_credits_passed"]
+    required_credits = a["required_credits"]
+    remaining_credits = a["remaining_credits"]
+    debt_courses = a["debt_courses"]
+    debt_credits = a["debt_credits"]
+    user_avg_credits_per_sem = a["user_avg_credits_per_sem"]
+    MIN_GPA4 = GRADUATION_MIN_GPA4
+
+    # 1. GPA
+    if a["gpa_risk"] == 2:
         gpa_status = f"GPA tích lũy hiện tại của bạn khoảng {gpa4:.2f}/4.0, đang thấp hơn chuẩn tối thiểu {MIN_GPA4:.2f}."
-        gpa_risk = 2
-    elif gpa4 < 2.3:
+    elif a["gpa_risk"] == 1:
         gpa_status = (
             f"GPA tích lũy hiện tại của bạn khoảng {gpa4:.2f}/4.0, hơi sát ngưỡng tối thiểu "
             "nên bạn cần cẩn thận hơn trong các kỳ tới."
         )
-        gpa_risk = 1
     else:
         gpa_status = f"GPA tích lũy hiện tại của bạn khoảng {gpa4:.2f}/4.0, khá an toàn so với ngưỡng tối thiểu."
-        gpa_risk = 0
-
-    # 2. Kiểm tra Tín chỉ
-    remaining_credits = required_credits - total_credits_passed
 
+    # 2. Tín chỉ
     if remaining_credits > 0:
         credits_status = (
             f"Bạn đã tích lũy {total_credits_passed}/{required_credits} tín chỉ. "
@@ -737,9 +503,7 @@ def _answer_graduation(user_id: str) -> str:
             "tức là đã đủ số tín chỉ tối thiểu theo chương trình."
         )
 
-    # 3. Kiểm tra Môn nợ
-    debt_credits = sum(c["credit"] for c in debt_courses)
-
+    # 3. Môn nợ
     if debt_courses:
         debt_status = (
             f"Bạn đang nợ {len(debt_courses)} môn với tổng khoảng {debt_credits} tín chỉ "
@@ -748,103 +512,16 @@ def _answer_graduation(user_id: str) -> str:
     else:
         debt_status = "Hiện tại bạn không có môn nào bị trượt phải học lại, đây là một lợi thế lớn cho tiến độ tốt nghiệp."
 
-    # Rủi ro nợ môn theo trọng số tín chỉ (vừa mô tả, vừa cho điểm rủi ro)
-    if debt_credits == 0:
-        debt_risk_text = "rất thấp"
-        debt_risk = 0
-    elif debt_credits <= 4:
-        debt_risk_text = "thấp"
-        debt_risk = 1
-    elif debt_credits <= 10:
-        debt_risk_text = "trung bình"
-        debt_risk = 2
-    else:
-        debt_risk_text = "cao"
-        debt_risk = 3
-
-    # 4. Đánh giá tiến độ theo thời gian / số học kỳ dựa trên dữ liệu thực tế
-    # Giả định khung chương trình chuẩn: 8 học kỳ chính (4 năm, 2 kỳ/năm)
-    SEMESTERS = 8
-
-    stats_ctx = ctx.get("stats") or {}
-    sem_gpa4 = stats_ctx.get("semGpa4") or {}
-
-    # Số học kỳ đã thực sự học có tích lũy tín chỉ (dựa trên dữ liệu điểm từng kỳ),
-    # tránh trường hợp backend tạo sẵn nhiều key HK nhưng chưa có tín chỉ -> làm lệch tốc độ học/kỳ.
-    results_data = ctx.get("results") or {}
-    curriculum = ctx.get("curriculum") or {}
-
-    # Map môn học theo code để biết số tín chỉ & có tính vào tín chỉ không
-    course_map: Dict[str, Dict[str, Any]] = {}
-    for sem in curriculum.get("semesters", []):
-        for course in sem.get("courses", []):
-            code = course.get("code", "")
-            if code:
-                course_map[code] = course
-
-    credits_per_sem: Dict[str, float] = {}
-    for sem_key, sem_results in results_data.items():
-        passed_credits_this_sem = 0.0
-        for code, result in sem_results.items():
-            course_info = course_map.get(code) or {}
-            if not course_info.get("countInCredits", False):
-                continue
-            credit = float(course_info.get("credit") or 0)
-            status = str(result.get("status", "") or "").lower()
-            if status == "passed" and credit > 0:
-                passed_credits_this_sem += credit
-        if passed_credits_this_sem > 0:
-            credits_per_sem[str(sem_key)] = passed_credits_this_sem
-
-    if credits_per_sem:
-        # Chỉ tính các học kỳ mà sinh viên thực sự có tín chỉ đã qua
-        semesters_passed = len(credits_per_sem)
-    else:
-        # Fallback: nếu chưa tách được theo học kỳ thì ước lượng từ GPA
-        if isinstance(sem_gpa4, dict) and sem_gpa4:
-            semesters_passed = len(sem_gpa4)
-        else:
-            semesters_passed = 1
-
-    # Nếu có currentStudySem trong context (từ backend) thì override vị trí hiện tại
-    if current_study_sem:
-        import re as _re
-
-        m = _re.search(r"(\d+)", current_study_sem)
-        if m:
-            semesters_passed = max(semesters_passed, int(m.group(1)))
-
-    # Tốc độ học trung bình của riêng sinh viên (tín chỉ/kỳ)
-    user_avg_credits_per_sem = (
-        total_credits_passed / semesters_passed if semesters_passed > 0 else ideal_avg_credits_per_sem
-    )
-    if user_avg_credits_per_sem <= 0:
-        user_avg_credits_per_sem = ideal_avg_credits_per_sem or required_credits
-
-    # Dự báo số học kỳ cần thêm để hoàn thành tín chỉ nếu giữ nhịp hiện tại
-    if remaining_credits > 0 and user_avg_credits_per_sem > 0:
-        import math as _math
-
-        semesters_needed = _math.ceil(remaining_credits / user_avg_credits_per_sem)
-    else:
-        semesters_needed = 0
-
-    # Ước lượng vị trí hiện tại trong chương trình (gần học kỳ mấy)
-    current_semester_estimate = semesters_passed
-    remaining_semesters_ideal = max(SEMESTERS - current_semester_estimate, 0)
-
-    # Tổng hợp đánh giá mức độ khả năng tốt nghiệp đúng hạn bằng thang rủi ro
-    level = "TRUNG BÌNH"
+    # 4. Nhận xét chi tiết theo từng yếu tố
+    level = a["level"]
     reasons: list[str] = []
 
     # Điều kiện rất khả quan (đủ tín chỉ, đủ GPA, không nợ môn)
-    if remaining_credits <= 0 and gpa4 >= MIN_GPA4 and debt_credits == 0:
-        level = "CAO"
+    if a["on_track"]:
         reasons.append(
             "Bạn đã đủ tín chỉ, GPA đạt yêu cầu và không còn môn nợ, gần như chỉ cần hoàn tất các thủ tục cuối cùng."
         )
     else:
-        # Xem xét từng yếu tố: GPA, tiến độ tín chỉ, nợ môn, số kỳ còn lại
         if gpa4 < MIN_GPA4:
             reasons.append(
                 "GPA hiện tại đang thấp hơn ngưỡng tối thiểu, bạn cần cải thiện điểm các kỳ tới để không rơi vào vùng rủi ro."
@@ -861,7 +538,7 @@ def _answer_graduation(user_id: str) -> str:
 
         if debt_credits > 0:
             reasons.append(
-                f"Bạn đang nợ {debt_credits} tín chỉ (mức rủi ro {debt_risk_text}); nếu không xử lý sớm, "
+                f"Bạn đang nợ {debt_credits} tín chỉ (mức rủi ro {a['debt_risk_text']}); nếu không xử lý sớm, "
                 "môn nợ sẽ chiếm chỗ các môn mới trong các kỳ sau."
             )
 
@@ -873,31 +550,6 @@ def _answer_graduation(user_id: str) -> str:
                 "sao cho vừa đủ tiến độ tốt nghiệp, vừa phù hợp sức học."
             )
 
-        # --- Đánh giá tổng hợp bằng risk_score (kết hợp gợi ý của bạn) ---
-        risk_score = 0
-
-        # Rủi ro tín chỉ còn thiếu
-        if remaining_credits > 60:
-            risk_score += 2
-        elif remaining_credits > 40:
-            risk_score += 1
-
-        # Rủi ro về số kỳ cần thêm so với số kỳ chuẩn còn lại
-        if semesters_needed > remaining_semesters_ideal + 1:
-            risk_score += 2
-        elif semesters_needed > remaining_semesters_ideal:
-            risk_score += 1
-
-        # Rủi ro do GPA và nợ môn
-        risk_score += gpa_risk + debt_risk
-
-        if risk_score <= 1:
-            level = "CAO"
-        elif risk_score <= 4:
-            level = "TRUNG BÌNH / KHẢ QUAN"
-        else:
-            level = "THẤP"
-
     final_assessment = (
         f"Khả năng tốt nghiệp đúng hạn hiện được đánh giá ở mức: {level}. "
         "Đây là ước lượng dựa trên tiến độ tín chỉ, GPA và số môn nợ hiện tại; "
@@ -925,61 +577,29 @@ def _answer_graduation(user_id: str) -> str:
     return "\n".join(reply_parts)
 
 
-def _answer_academic_warning(user_id: str) -> str:
+async def _answer_academic_warning(rctx: RequestContext) -> str:
     """
     Đánh giá nguy cơ/cấp cảnh báo học tập dựa trên quy định:
     - ĐTB chung học kỳ chính < 1.0
     - ĐTB chung tích lũy dưới các ngưỡng tùy năm: 1.20, 1.40, 1.60, 1.80
     (Ước lượng năm học dựa vào số học kỳ đã có trong kết quả.)
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu kết quả học tập để đánh giá cảnh báo học tập."
 
-    stats_ctx = ctx.get("stats") or {}
-    sem_gpa4 = stats_ctx.get("semGpa4") or {}
-    cum_gpa4 = stats_ctx.get("cumGpa4") or {}
-
-    if not isinstance(sem_gpa4, dict) or not isinstance(cum_gpa4, dict) or not sem_gpa4:
+    w = assess_academic_warning(sc)
+    if w is None:
         return "Chưa có đủ dữ liệu điểm để đánh giá cảnh báo học tập theo quy định."
 
-    import re as _re
-
-    def _sem_num(key: str) -> int:
-        m = _re.search(r"(\d+)", str(key))
-        return int(m.group(1)) if m else 0
-
-    # Lấy học kỳ mới nhất
-    last_key = sorted(sem_gpa4.keys(), key=_sem_num)[-1]
-    try:
-        gpa_sem = float(sem_gpa4[last_key])
-    except Exception:
-        gpa_sem = None
-
-    try:
-        gpa_cum = float(cum_gpa4.get(last_key, 0.0))
-    except Exception:
-        gpa_cum = None
-
-    sem_index = _sem_num(last_key)
-    year = (sem_index + 1) // 2 if sem_index > 0 else 1
-    if year <= 1:
-        threshold = 1.20
-    elif year == 2:
-        threshold = 1.40
-    elif year == 3:
-        threshold = 1.60
-    else:
-        threshold = 1.80
-
     reasons: list[str] = []
-    if gpa_sem is not None and gpa_sem < 1.0:
+    if w["sem_below"]:
         reasons.append(
-            f"- Điểm trung bình chung học kỳ gần nhất (HK{sem_index}) khoảng {gpa_sem}/4.0, thấp hơn mức 1.0."
+            f"- Điểm trung bình chung học kỳ gần nhất (HK{w['semester']}) khoảng {w['gpa_sem']}/4.0, thấp hơn mức 1.0."
         )
-    if gpa_cum is not None and gpa_cum < threshold:
+    if w["cum_below"]:
         reasons.append(
-            f"- Điểm trung bình chung tích lũy khoảng {gpa_cum}/4.0, thấp hơn ngưỡng {threshold}/4.0 cho năm học hiện tại."
+            f"- Điểm trung bình chung tích lũy khoảng {w['gpa_cum']}/4.0, thấp hơn ngưỡng {w['threshold']}/4.0 cho năm học hiện tại."
         )
 
     if not reasons:
@@ -1020,7 +640,7 @@ def _answer_program_info(_message: str) -> str:
     )
 
 
-def _answer_exam_format(message: str, user_id: Optional[str]) -> str:
+async def _answer_exam_format(message: str, rctx: RequestContext) -> str:
     """
     Trả lời về hình thức thi của một môn:
     - Ưu tiên dùng examFormat trong curriculum (nếu có).
@@ -1029,27 +649,13 @@ def _answer_exam_format(message: str, user_id: Optional[str]) -> str:
     course_label = ""
     exam_format: Optional[str] = None
 
-    if user_id:
-        try:
-            ctx = fetch_full_context(user_id)
-        except Exception:
-            ctx = None
-        if ctx:
-            course = find_course_in_text(message, ctx)
+    if rctx.user_id:
+        sc = await rctx.student()
+        if sc:
+            course = find_course_in_text(message, sc.raw, fuzzy=True)
             if course:
                 course_label = f"môn **{course['name']} ({course['code']})** "
-                curriculum = ctx.get("curriculum") or {}
-                semesters = curriculum.get("semesters") or []
-                code = course["code"]
-                for sem in semesters:
-                    for c in sem.get("courses", []):
-                        if str(c.get("code") or "") == code:
-                            raw_fmt = c.get("examFormat")
-                            if isinstance(raw_fmt, str) and raw_fmt.strip():
-                                exam_format = raw_fmt.strip()
-                            break
-                    if exam_format:
-                        break
+                exam_format = sc.exam_format_by_code.get(course["code"])
 
     prefix = f"Về hình thức thi của {course_label}" if course_label else "Về hình thức thi các môn trong ngành của bạn,"
 
@@ -1067,30 +673,15 @@ def _answer_exam_format(message: str, user_id: Optional[str]) -> str:
     )
 
 
-def _answer_non_gpa_courses(user_id: str) -> str:
+async def _answer_non_gpa_courses(rctx: RequestContext) -> str:
     """
     Liệt kê các môn học KHÔNG tính vào GPA (countInGpa === false) trong chương trình.
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu chương trình học để kiểm tra các môn không tính vào GPA."
 
-    curriculum = ctx.get("curriculum") or {}
-    semesters = curriculum.get("semesters") or []
-
-    non_gpa: list[dict[str, str]] = []
-    for sem in semesters:
-        sem_name = str(sem.get("semester") or "")
-        for c in sem.get("courses", []):
-            if c.get("countInGpa", False) is False:
-                non_gpa.append(
-                    {
-                        "code": str(c.get("code") or ""),
-                        "name": str(c.get("name") or ""),
-                        "credit": str(c.get("credit") or ""),
-                        "semester": sem_name,
-                    }
-                )
+    non_gpa = sc.non_gpa_courses
 
     if not non_gpa:
         return (
@@ -1115,7 +706,7 @@ def _answer_non_gpa_courses(user_id: str) -> str:
     )
 
 
-def _answer_strengths_weaknesses(user_id: str) -> str:
+async def _answer_strengths_weaknesses(rctx: RequestContext) -> str:
     """
     Phân tích điểm mạnh / điểm yếu dựa trên kết quả các môn đã có điểm.
     Ý tưởng đơn giản:
@@ -1123,28 +714,21 @@ def _answer_strengths_weaknesses(user_id: str) -> str:
     - Môn yếu: điểm < 5.0
     (ngưỡng có thể tinh chỉnh sau nếu cần)
     """
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+    sc = await rctx.student()
+    if not sc:
         return (
             "Mình không lấy được dữ liệu kết quả học tập để phân tích điểm mạnh điểm yếu của bạn."
         )
 
-    results_data = ctx.get("results") or {}
-    curriculum = ctx.get("curriculum") or {}
+    results_data = sc.results
+    curriculum = sc.curriculum
 
     if not results_data or not curriculum:
         return (
             "Hiện mình chưa thấy đủ dữ liệu chương trình học hoặc điểm số để phân tích điểm mạnh điểm yếu của bạn."
         )
 
-    # Map thông tin môn từ curriculum
-    course_map: Dict[str, Dict[str, Any]] = {}
-    for sem in curriculum.get("semesters", []):
-        for course in sem.get("courses", []):
-            code = str(course.get("code") or "")
-            if code:
-                course_map[code] = course
-
+    course_map = sc.course_map
     courses_with_grade: List[Dict[str, Any]] = []
 
     # Nhóm kỹ năng thô theo tên môn (sau khi normalize)
@@ -1259,7 +843,7 @@ def _answer_strengths_weaknesses(user_id: str) -> str:
             f"subjects = {json.dumps(subjects_payload, ensure_ascii=False)}"
         )
 
-        llm_reply = ask_general_llm(llm_input, system_prompt=llm_system_prompt)
+        llm_reply = await ask_general_llm(llm_input, system_prompt=llm_system_prompt)
         # Nếu LLM trả về lỗi cấu hình/mạng thì KHÔNG dùng, fallback sang phân tích nội bộ
         if llm_reply:
             bad_markers = [
@@ -1279,21 +863,7 @@ def _answer_strengths_weaknesses(user_id: str) -> str:
 
     # Thống kê tổng quát để phân tích "trend"
     # Ưu tiên dùng GPA hệ 4 từ backend nếu có, nếu không thì ước lượng từ điểm hệ 10
-    stats_ctx = ctx.get("stats") or {}
-    cum_gpa4 = stats_ctx.get("cumGpa4") or {}
-    overall_gpa4: Optional[float] = None
-
-    if isinstance(cum_gpa4, dict) and cum_gpa4:
-        def _sem_num_for_g4(k: str) -> int:
-            import re as _re
-            m = _re.search(r"(\d+)", str(k))
-            return int(m.group(1)) if m else 0
-
-        last_key = sorted(cum_gpa4.keys(), key=_sem_num_for_g4)[-1]
-        try:
-            overall_gpa4 = float(cum_gpa4[last_key])
-        except Exception:
-            overall_gpa4 = None
+    overall_gpa4 = sc.latest_cum_gpa4
 
     # Nếu không có GPA hệ 4 → ước lượng từ điểm hệ 10
     total_credits_for_avg = sum(max(c["credit"], 1.0) for c in courses_with_grade)
@@ -1494,12 +1064,12 @@ def _answer_strengths_weaknesses(user_id: str) -> str:
     lines.extend(f"- {s}" for s in suggestions)
 
     return "\n".join(lines)
-def _answer_course(message: str, user_id: str) -> str:
-    ctx = fetch_full_context(user_id)
-    if not ctx:
+async def _answer_course(message: str, rctx: RequestContext, fuzzy: bool = True) -> str:
+    sc = await rctx.student()
+    if not sc:
         return "Không thể lấy dữ liệu chương trình học để tra cứu môn học."
 
-    course = find_course_in_text(message, ctx)
+    course = find_course_in_text(message, sc.raw, fuzzy=fuzzy)
     
     if not course:
         return "Mình không tìm thấy môn học nào trong câu hỏi của bạn. Bạn muốn hỏi về môn nào?"
@@ -1507,14 +1077,8 @@ def _answer_course(message: str, user_id: str) -> str:
     code = course["code"]
     name = course["name"]
     
-    # Tìm kiếm kết quả học tập của môn đó
-    # Trong context, kết quả được đặt ở field "results"
-    results_data = ctx.get("results") or {}
-    result = None
-    for sem_data in results_data.values():
-        if code in sem_data:
-            result = sem_data[code]
-            break
+    # Kết quả học tập của môn đó (học kỳ đầu tiên có môn trong "results")
+    result = sc.result_by_code.get(code)
 
     if result and "grade" in result:
         grade10 = float(result.get("grade", 0))
@@ -1531,302 +1095,186 @@ def _answer_course(message: str, user_id: str) -> str:
         return f"Môn **{name} ({code})** chưa có điểm trong hệ thống. Hãy kiểm tra lại lịch học hoặc deadline của môn này nhé."
 
 
-def handle_chat(text: str, user_id: Optional[str] = None) -> str:
+STALE_NOTE = (
+    "\n\n_(Lưu ý: hiện mình chưa kết nối được tới dữ liệu mới nhất nên đang dùng dữ liệu "
+    "đã lưu gần đây, thông tin trên có thể chưa được cập nhật.)_"
+)
+
+PARTIAL_NOTE = (
+    "\n\n_(Lưu ý: hiện mình chưa lấy được đầy đủ dữ liệu của bạn (chương trình học, thông tin cá nhân) "
+    "nên câu trả lời trên chỉ dựa trên deadline và kết quả học tập đã có.)_"
+)
+
+# Câu hỏi cần chương trình học mà backend chỉ trả kịp một phần context (không có curriculum)
+CURRICULUM_UNAVAILABLE_REPLY = (
+    "Hiện mình tạm thời chưa lấy được dữ liệu chương trình học của bạn nên chưa trả lời chính xác "
+    "câu hỏi này được. Bạn thử hỏi lại sau ít phút nhé."
+)
+
+
+def _data_note(rctx: RequestContext, reply: Optional[str] = None) -> str:
+    """Lời nhắc kèm câu trả lời khi context là bản cũ hoặc chỉ có một phần."""
+    if rctx.stale:
+        return STALE_NOTE
+    if rctx.partial and reply != CURRICULUM_UNAVAILABLE_REPLY:
+        return PARTIAL_NOTE
+    return ""
+
+
+async def handle_chat(text: str, user_id: Optional[str] = None) -> str:
     """Xử lý câu hỏi của người dùng, dùng Intent Classification và tra cứu dữ liệu."""
+    # Context của lượt chat này: backend chỉ bị gọi tối đa một lần, các handler dùng chung
+    rctx = RequestContext(user_id)
+    reply = await _handle_chat(text, rctx)
+    return reply + _data_note(rctx, reply)
 
-    norm_text = normalize(text)
-    text_l = text.lower()
-    state = _get_session_state(user_id)
-    last_intent = state.get("last_intent")
 
-    # Ưu tiên đặc biệt: câu hỏi phân tích điểm mạnh / điểm yếu môn học
-    strengths_kw_early = [
-        "diem manh",
-        "diem yeu",
-        "manh yeu",
-        "mon nao manh",
-        "mon nao yeu",
-        "mon nao tot",
-        "mon nao kem",
-        "hoc luc manh",
-        "hoc luc yeu",
-        "phan tich hoc luc",
-        "phan tich diem manh",
-        "phan tich diem yeu",
-    ]
-    if any(k in norm_text for k in strengths_kw_early):
-        if not user_id:
-            return (
-                "Mình cần user_id để phân tích điểm mạnh điểm yếu môn học của bạn từ dữ liệu hệ thống."
-            )
-        state["last_intent"] = "strengths_weaknesses"
-        return _answer_strengths_weaknesses(user_id)
+async def handle_chat_stream(text: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Như handle_chat nhưng trả câu trả lời thành từng đoạn: câu trả lời từ rule / dữ liệu là một đoạn duy nhất,
+    câu hỏi kiến thức chung thì chuyển tiếp từng đoạn token của LLM ngay khi nhận được.
+    """
+    rctx = RequestContext(user_id)
+    reply = await _route_chat(text, rctx)
+    if reply is not None:
+        yield reply + _data_note(rctx, reply)
+        return
+    sent = False
+    async for chunk in stream_general_llm(text):
+        sent = True
+        yield chunk
+    if not sent:
+        yield _FALLBACK_REPLY
+    note = _data_note(rctx)
+    if note:
+        yield note
+
+
+async def _answer_course_fallback(message: str, rctx: RequestContext) -> Optional[str]:
+    """Câu không bắt được intent nhưng trùng tên một môn trong chương trình → hỏi về môn đó.
+    Chỉ khớp chính xác: câu hỏi chung hay gần giống tên môn nên không tra mờ ở đây."""
+    ctx = await rctx.get()
+    if not ctx or not find_course_in_text(message, ctx):
+        return None
+    _get_session_state(rctx.user_id)["last_intent"] = "course"
+    return await _answer_course(message, rctx, fuzzy=False)
 
-    intent = predict_intent(norm_text)
 
-    # Nếu intent model không chắc nhưng user dùng các cụm "còn gì nữa", "nữa không"...
-    # thì fallback về intent trước đó trong cùng session.
-    if intent is None and last_intent:
-        follow_kw = ["con gi nua", "con gi", "them gi", "nua khong", "nua ko", "tiep tuc", "tieptuc", "nua k"]
-        if any(k in norm_text for k in follow_kw):
-            intent = last_intent
-    
-    # Nếu Intent Classification không chắc, dùng rule-based thô (Fallbacks)
-    # Ưu tiên câu hỏi về cảnh báo học tập / tốt nghiệp trước để tránh bị bắt nhầm sang deadline
-
-    # Câu hỏi về chương trình đào tạo / ngành (tổng quan, chuẩn đầu ra, cấu trúc, nghề nghiệp, học phí, tuyển sinh...)
-    program_kw = [
-        "chuong trinh dao tao",
-        "chuong trinh dao tao cua nganh",
-        "chuong trinh dao tao nganh",
-        "quy trinh dao tao",
-        "quy trinh dao tao nganh",
-        "cong nghe da phuong tien",
-        "nganh cong nghe da phuong tien",
-        "tong quan nganh",
-        "chuan dau ra",
-        "cau truc chuong trinh",
-        "nghe nghiep",
-        "hoc phi",
-        "dieu kien tuyen sinh",
-        "quy trinh nhap hoc",
-        "tai lieu dao tao",
-    ]
-    if any(k in norm_text for k in program_kw) or (
-        "dao tao" in norm_text and ("chuong trinh" in norm_text or "quy trinh" in norm_text)
-    ):
-        # Các câu hỏi này tốt nhất nên xem trực tiếp trên trang PTIT
-        return _answer_program_info(text)
-
-    # Lịch thi (ngày/giờ thi): ưu tiên bắt trước khi xử lý hình thức thi
-    if "thi" in norm_text and (
-        "lich thi" in norm_text
-        or "lich" in norm_text
-        or "ngay thi" in norm_text
-        or "ngay nao" in norm_text
-        or "bao gio" in norm_text
-        or "gio thi" in norm_text
-        or "giờ thi" in text_l
-    ):
-        if not user_id:
-            return "Mình cần user_id để xem lịch thi của bạn."
-        state["last_intent"] = "exam_schedule"
-        return _answer_exam_schedule(text, user_id)
-
-    # Hình thức thi (tự luận, trắc nghiệm, vấn đáp, bài tập lớn, thực hành...)
-    exam_kw = [
-        "hinh thuc thi",
-        "thi cuoi ky",
-        "thi cuoi ki",
-        "thi cuoi",
-        "thi the nao",
-        "thi nhu the nao",
-        "thi kieu gi",
-        "thi mon nay ra sao",
-        "thi mon",
-        "bai tap lon hay thi",
-    ]
-    if any(k in norm_text for k in exam_kw):
-        return _answer_exam_format(text, user_id)
-
-    # Cảnh báo học tập
-    warning_kw = ["canh bao hoc tap", "cảnh báo học tập", "muc canh bao", "mức cảnh báo"]
-    if any(k in norm_text for k in warning_kw):
-        if not user_id:
-            return "Mình cần user_id để đánh giá nguy cơ cảnh báo học tập của bạn."
-        state["last_intent"] = "warning"
-        return _answer_academic_warning(user_id)
-
-    # Tốt nghiệp đúng hạn
-    graduation_kw = ["ra truong", "tot nghiep", "tot nghiep dung han", "ra truong dung han"]
-    if intent == "graduation" or any(k in norm_text for k in graduation_kw):
-        if not user_id:
-            return "Mình cần user_id để ước lượng khả năng ra trường đúng hạn của bạn."
-        state["last_intent"] = "graduation"
-        return _answer_graduation(user_id)
-
-    # Deadline: chỉ match khi có từ khóa rõ ràng về hạn nộp/deadline, tránh bắt nhầm "đúng hạn"
-    deadline_kw = ["deadline", "han nop", "han nop bai", "han nop bai tap", "nop bai"]
-    if intent == "deadline" or any(k in norm_text for k in deadline_kw):
-        if not user_id:
-            return "Mình cần user_id để tra cứu deadline của bạn."
-        state["last_intent"] = "deadline"
-        return _answer_deadline(text, user_id)
-
-    # Hỏi về môn nợ cụ thể (ưu tiên trả lời ngắn gọn)
-    debt_kw = [
-        "no mon nao",           # nợ môn nào
-        "no mon gi",            # nợ môn gì
-        "dang no mon",          # đang nợ môn
-        "mon nao no",           # môn nào nợ
-        "mon gi no",            # môn gì nợ
-        "danh sach mon no",     # danh sách môn nợ
-        "mon hoc lai",          # môn học lại
-    ]
-    if any(k in norm_text for k in debt_kw):
-        if not user_id:
-            return "Mình cần user_id để kiểm tra môn nợ của bạn."
-        state["last_intent"] = "debt"
-        return _answer_debt_courses(user_id)
-    
-    # Hỏi về tín chỉ / môn nợ (câu hỏi chung)
-    credits_kw_norm = [
-        "no mon",               # nợ môn
-        "thieu tin chi",        # thiếu tín chỉ
-        "tin chi",              # tín chỉ
-        "bao nhieu tin",        # bao nhiêu tín
-        "tich luy duoc bao tin",  # tích lũy được bao tín
-        "tich luy duoc bao nhieu tin",
-        "tich luy bao nhieu tin",
-    ]
-    if intent == "credits" or any(k in norm_text for k in credits_kw_norm):
-        if not user_id:
-            return "Mình cần user_id để kiểm tra môn nợ và tín chỉ của bạn."
-        state["last_intent"] = "credits"
-        return _answer_credits(user_id)
-
-    # Phân tích điểm mạnh / điểm yếu các môn học
-    strengths_kw = [
-        "diem manh",
-        "diem yeu",
-        "manh yeu",
-        "mon nao manh",
-        "mon nao yeu",
-        "mon nao tot",
-        "mon nao kem",
-        "hoc luc manh",
-        "hoc luc yeu",
-        "phan tich hoc luc",
-        "phan tich diem manh",
-        "phan tich diem yeu",
-    ]
-    if any(k in norm_text for k in strengths_kw):
-        if not user_id:
-            return (
-                "Mình cần user_id để phân tích điểm mạnh điểm yếu môn học của bạn từ dữ liệu hệ thống."
-            )
-        state["last_intent"] = "strengths_weaknesses"
-        return _answer_strengths_weaknesses(user_id)
-
-    # Hỏi về các môn không tính vào GPA
-    if "gpa" in norm_text and (
-        "khong tinh" in norm_text
-        or "ko tinh" in norm_text
-        or "khong duoc tinh" in norm_text
-        or "khong tinh vao" in norm_text
-    ):
-        if not user_id:
-            return "Mình cần user_id để xem danh sách môn không tính vào GPA của bạn."
-        state["last_intent"] = "non_gpa_courses"
-        return _answer_non_gpa_courses(user_id)
-
-    # Hỏi về GPA học kỳ cụ thể (HK1, học kỳ 2, ...) hoặc học kỳ có GPA cao nhất
-    import re as _re  # local import để tránh phụ thuộc vòng
-    sem_pattern = _re.search(r"(hk|hoc ky|hoc ki)\s*\d+", norm_text)
-
-    # "Học kỳ nào điểm cao nhất / GPA cao nhất"
-    best_sem_kw = ["cao nhat", "tot nhat", "diem cao nhat", "gpa cao nhat"]
-    sem_kw = ["hoc ky", "hoc ki", "hk"]
-    if any(k in norm_text for k in best_sem_kw) and any(k in norm_text for k in sem_kw):
-        if not user_id:
-            return "Mình cần user_id để so sánh GPA các học kỳ của bạn."
-        state["last_intent"] = "best_semester"
-        return _answer_best_semester(user_id)
-
-    # "GPA học kỳ 1", "điểm trung bình HK2", ...
-    if ("gpa" in norm_text or "diem" in norm_text or "diem trung binh" in norm_text) and sem_pattern:
-        if not user_id:
-            return "Mình cần user_id để tra GPA học kỳ của bạn từ hệ thống."
-        state["last_intent"] = "semester_gpa"
-        return _answer_semester_gpa(text, user_id)
-
-    # Hỏi về GPA / điểm nói chung (tích lũy hoặc điểm môn)
-    if intent == "gpa" or "gpa" in norm_text or "điểm" in text_l or "diem" in norm_text:
-        # Nếu câu đã nhắc rõ "điểm mạnh / điểm yếu" thì ưu tiên phân tích mạnh/yếu,
-        # không trả lời GPA chung nữa.
-        strengths_kw_inline = [
-            "diem manh",
-            "diem yeu",
-            "manh yeu",
-            "phan tich hoc luc",
-            "phan tich diem manh",
-            "phan tich diem yeu",
-        ]
-        if any(k in norm_text for k in strengths_kw_inline):
-            if not user_id:
-                return (
-                    "Mình cần user_id để phân tích điểm mạnh điểm yếu môn học của bạn từ dữ liệu hệ thống."
-                )
-            state["last_intent"] = "strengths_weaknesses"
-            return _answer_strengths_weaknesses(user_id)
-
-        if not user_id:
-            return "Mình cần user_id để tra GPA/điểm của bạn từ hệ thống."
-        state["last_intent"] = "gpa"
-        return _answer_gpa(text, user_id)
-
-    if intent == "course" or "môn" in text or "mon" in text or "học gì" in text or "hoc gi" in text:
-        if not user_id:
-            return "Mình cần user_id để tra cứu thông tin môn học của bạn."
-        state["last_intent"] = "course"
-        return _answer_course(text, user_id)
-
-    # Fallback: nếu chưa bắt được intent rõ ràng nhưng câu trùng tên một môn trong chương trình,
-    # thì xem như đang hỏi về môn đó (điểm/trạng thái môn).
-    if user_id:
-        try:
-            ctx_fallback = fetch_full_context(user_id)
-        except Exception:
-            ctx_fallback = None
-        if ctx_fallback:
-            course_fb = find_course_in_text(text, ctx_fallback)
-            if course_fb:
-                state["last_intent"] = "course"
-                return _answer_course(text, user_id)
-        
-    # --- Trả lời chung ---
-    
-    # Xử lý các câu hỏi chung, chào hỏi
-    greetings = ["chào", "chao", "hello", "hi", "xin chào"]
-    if any(g in norm_text for g in greetings):
-        # Thử lấy tên người dùng để chào cho thân thiện
-        name = _get_user_name(user_id) if user_id else None
-        if name:
-            return (
-                f"Chào {name}! Mình là Trợ lý Sinh viên. "
-                "Bạn muốn hỏi về GPA, deadline, tín chỉ hay khả năng tốt nghiệp của mình không?"
-            )
+async def _answer_greeting(_message: str, rctx: RequestContext) -> str:
+    # Thử lấy tên người dùng để chào cho thân thiện
+    name = await _get_user_name(rctx)
+    if name:
         return (
-            "Chào bạn! Mình là Trợ lý Sinh viên. "
+            f"Chào {name}! Mình là Trợ lý Sinh viên. "
             "Bạn muốn hỏi về GPA, deadline, tín chỉ hay khả năng tốt nghiệp của mình không?"
         )
-        
-    # Các câu trả lời rất ngắn kiểu "có", "ok", "được", ... sau lời gợi ý của bot
-    short_yes = ["co", "ok", "oke", "dc", "duoc", "vang", "uh", "uhm", "uk"]
-    if norm_text.strip() in short_yes:
-        return (
-            "Bạn có thể nói rõ hơn giúp mình nhé: "
-            "bạn muốn hỏi **GPA, tín chỉ, deadline, thông tin môn học hay khả năng tốt nghiệp**?\n"
-            "Ví dụ: \"GPA hiện tại của t là bao nhiêu?\", \"t còn nợ môn nào?\" hoặc "
-            "\"hình thức thi môn Toán cao cấp 1 là gì?\""
-        )
-        
-    general_questions = ["bạn là ai", "ban la ai", "giúp tôi", "giup toi"]
-    if any(q in norm_text for q in general_questions):
-        return (
-            "Mình là Trợ lý Sinh viên, được thiết kế để giúp bạn quản lý tiến độ học tập. "
-            "Mình có thể trả lời các câu hỏi về GPA, tín chỉ, deadline, thông tin môn học "
-            "và ước lượng khả năng tốt nghiệp của bạn. Với các câu hỏi kiến thức chung "
-            "(lập trình, kỹ năng, định hướng nghề nghiệp, v.v.) mình sẽ nhờ thêm một mô hình AI khác hỗ trợ."
-        )
+    return (
+        "Chào bạn! Mình là Trợ lý Sinh viên. "
+        "Bạn muốn hỏi về GPA, deadline, tín chỉ hay khả năng tốt nghiệp của mình không?"
+    )
+
+
+async def _answer_short_yes(_message: str, _rctx: RequestContext) -> str:
+    return (
+        "Bạn có thể nói rõ hơn giúp mình nhé: "
+        "bạn muốn hỏi **GPA, tín chỉ, deadline, thông tin môn học hay khả năng tốt nghiệp**?\n"
+        "Ví dụ: \"GPA hiện tại của t là bao nhiêu?\", \"t còn nợ môn nào?\" hoặc "
+        "\"hình thức thi môn Toán cao cấp 1 là gì?\""
+    )
+
+
+async def _answer_about(_message: str, _rctx: RequestContext) -> str:
+    return (
+        "Mình là Trợ lý Sinh viên, được thiết kế để giúp bạn quản lý tiến độ học tập. "
+        "Mình có thể trả lời các câu hỏi về GPA, tín chỉ, deadline, thông tin môn học "
+        "và ước lượng khả năng tốt nghiệp của bạn. Với các câu hỏi kiến thức chung "
+        "(lập trình, kỹ năng, định hướng nghề nghiệp, v.v.) mình sẽ nhờ thêm một mô hình AI khác hỗ trợ."
+    )
+
+
+async def _answer_program_info_async(message: str, _rctx: RequestContext) -> str:
+    return _answer_program_info(message)
+
+
+# Handler đích của các rule trong ml/services/router.py (CHAT_RULES), tra theo Rule.handler.
+# Handler trả None nghĩa là không trả lời được, xét tiếp rule sau.
+_HANDLERS: Dict[str, Callable[[str, RequestContext], Awaitable[Optional[str]]]] = {
+    "strengths_weaknesses": lambda text, rctx: _answer_strengths_weaknesses(rctx),
+    "program_info": _answer_program_info_async,
+    "exam_schedule": _answer_exam_schedule,
+    "exam_format": _answer_exam_format,
+    "academic_warning": lambda text, rctx: _answer_academic_warning(rctx),
+    "graduation": lambda text, rctx: _answer_graduation(rctx),
+    "deadline": _answer_deadline,
+    "debt_courses": lambda text, rctx: _answer_debt_courses(rctx),
+    "credits": lambda text, rctx: _answer_credits(rctx),
+    "non_gpa_courses": lambda text, rctx: _answer_non_gpa_courses(rctx),
+    "best_semester": lambda text, rctx: _answer_best_semester(rctx),
+    "semester_gpa": _answer_semester_gpa,
+    "gpa": _answer_gpa,
+    "course": _answer_course,
+    "course_fallback": _answer_course_fallback,
+    "greeting": _answer_greeting,
+    "short_yes": _answer_short_yes,
+    "about": _answer_about,
+}
+
+
+_FALLBACK_REPLY = (
+    "Mình xin lỗi, mình chưa hiểu rõ câu hỏi của bạn. Mình chủ yếu hỗ trợ các câu hỏi liên quan đến: "
+    "GPA, tín chỉ, deadline, thông tin môn học và ước lượng khả năng tốt nghiệp. "
+    "Nếu bạn muốn hỏi kiến thức chung, bạn có thể bật cấu hình LLM_PROVIDER (OpenAI/Gemini) cho hệ thống."
+)
+
+
+async def _handle_chat(text: str, rctx: RequestContext) -> str:
+    reply = await _route_chat(text, rctx)
+    if reply is not None:
+        return reply
 
     # Cuối cùng: thử nhờ LLM tổng quát nếu đã cấu hình (ChatGPT / Gemini)
-    llm_reply = ask_general_llm(text)
+    llm_reply = await ask_general_llm(text)
     if llm_reply:
         return llm_reply
 
-    return (
-        "Mình xin lỗi, mình chưa hiểu rõ câu hỏi của bạn. Mình chủ yếu hỗ trợ các câu hỏi liên quan đến: "
-        "GPA, tín chỉ, deadline, thông tin môn học và ước lượng khả năng tốt nghiệp. "
-        "Nếu bạn muốn hỏi kiến thức chung, bạn có thể bật cấu hình LLM_PROVIDER (OpenAI/Gemini) cho hệ thống."
-    )
\ No newline at end of file
+    return _FALLBACK_REPLY
+
+
+async def _route_chat(text: str, rctx: RequestContext) -> Optional[str]:
+    """Câu trả lời từ rule / dữ liệu (theo CHAT_RULES), hoặc None nếu phải nhờ tới LLM tổng quát."""
+    user_id = rctx.user_id
+    norm_text = normalize(text)
+    state = _get_session_state(user_id)
+    last_intent = state.get("last_intent")
+
+    # Một lượt quét cho mọi nhóm từ khóa; rule được chọn theo thứ tự ưu tiên trong CHAT_RULES
+    hits = CHAT_ROUTER.scan(text, norm_text)
+
+    # Chỉ gọi model khi sẽ gặp rule cần intent; tính trước ở đây để có thể gom batch với request khác
+    predicted: Dict[str, Optional[str]] = {}
+    if CHAT_ROUTER.needs_intent(hits, has_user=bool(user_id)):
+        predicted["intent"] = await predict_intent_async(norm_text)
+
+    def _intent() -> Optional[str]:
+        # Nếu model không chắc nhưng user dùng các cụm "còn gì nữa", "nữa không"...
+        # thì fallback về intent trước đó trong cùng session.
+        intent = predicted["intent"] if "intent" in predicted else predict_intent(norm_text)
+        if intent is None and last_intent and "follow_up" in hits:
+            intent = last_intent
+        return intent
+
+    for rule in CHAT_ROUTER.candidates(hits, _intent, has_user=bool(user_id)):
+        if rule.requires_user and not user_id:
+            return rule.user_reply  # type: ignore[return-value]
+        if rule.last_intent:
+            state["last_intent"] = rule.last_intent
+        if rule.needs_curriculum and user_id:
+            # Chờ context đầy đủ (có curriculum); nếu backend chỉ trả kịp một phần thì báo tạm thiếu dữ liệu
+            # thay vì để handler trả lời "không tìm thấy" / tính thiếu chương trình học
+            rctx.need_curriculum = True
+            if await rctx.get() is not None and rctx.partial:
+                return CURRICULUM_UNAVAILABLE_REPLY
+        reply = await _HANDLERS[rule.handler](text, rctx)
+        if reply is not None:
+            return reply
+    return None
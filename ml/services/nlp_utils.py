@@ -1,6 +1,14 @@
 import unicodedata
 import re
-from typing import Optional, Dict, Any
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Optional, Dict, Any, List, Tuple
+
+from ml.config import COURSE_FUZZY_THRESHOLD
+from ml.services.aggregates import curriculum_fingerprint
+from ml.services.aho_corasick import AhoCorasick
 
 # Alias thô cho một số môn học thường gặp
 ALIAS_MAP = {
@@ -15,14 +23,19 @@ ALIAS_MAP = {
 }
 
 
-def normalize(text: str) -> str:
-    """Lowercase + bỏ dấu tiếng Việt + gọn khoảng trắng để so khớp chuỗi đơn giản."""
+def _strip_marks(text: str) -> str:
+    # Bỏ dấu tiếng Việt: tách ký tự (NFD) rồi bỏ các dấu kết hợp (Mn)
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def _normalize_reference(text: str) -> str:
+    """Cài đặt gốc của normalize (giữ lại để đối chiếu / benchmark, xem scripts/bench_normalize.py)."""
     text = text.lower()
     # Chuẩn hoá riêng chữ đ -> d để dễ so khớp từ khoá (điểm -> diem, đếm -> dem, ...)
     text = text.replace("đ", "d")
     # Bỏ dấu tiếng Việt
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = _strip_marks(text)
     # Thay thế các alias thô
     for k, v in ALIAS_MAP.items():
         text = text.replace(k, v)
@@ -30,61 +43,280 @@ def normalize(text: str) -> str:
     return " ".join(text.split())
 
 
-def find_course_in_text(message: str, ctx: Dict[str, Any]) -> Optional[Dict[str, str]]:
-    """Tìm môn học được nhắc tới trong câu hỏi dựa trên curriculum và kết quả đã học.
-    Trả về {'code': str, 'name': str}
+class _StripTable(dict):
+    """Bảng cho str.translate: ký tự → dạng đã bỏ dấu, tính lần đầu gặp rồi nhớ lại."""
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        out = "d" if ch == "đ" else _strip_marks(ch)
+        self[code] = out
+        return out
+
+
+_STRIP_TABLE = _StripTable()
+
+
+def _partial_overlap(a: str, b: str) -> bool:
+    """Một hậu tố thực sự của a trùng một tiền tố thực sự của b."""
+    return any(a.endswith(b[:n]) for n in range(1, min(len(a), len(b))))
+
+
+def _compile_aliases(alias_map: Dict[str, str]) -> Optional["re.Pattern[str]"]:
     """
-    curriculum = ctx.get("curriculum") or {}
-    semesters = curriculum.get("semesters") or []
-    norm_text = normalize(message)
-    
-    # Rút ra số ở cuối câu hỏi (nếu có)
-    text_numbers = re.findall(r"\d+", norm_text)
-    text_num: Optional[int] = int(text_numbers[-1]) if text_numbers else None
-
-    best: Optional[Dict[str, str]] = None
-
-    for sem in semesters:
-        for course in sem.get("courses", []):
-            code = str(course.get("code") or "")
-            name = str(course.get("name") or "")
-            if not code and not name:
-                continue
+    Gộp ALIAS_MAP thành một regex thay thế một lượt. Thay lần lượt từng key (cách gốc) còn quét lại
+    cả phần đã thay của các key trước, nên chỉ gộp khi chứng minh được là tương đương:
+    - bỏ các key không bao giờ khớp được (chứa key đứng trước nó, hoặc còn dấu / chữ đ mà
+      bước bỏ dấu đã loại, và cũng không được sinh ra bởi giá trị của key trước);
+    - key sau không nằm trong / không nối được vào giá trị của key trước;
+    - đuôi của key sau không chồng lên đầu của key trước (regex lấy match bắt đầu sớm nhất,
+      còn cách gốc thay key trước trước); key chứa key khác phải đứng trước.
+    Không thoả → trả None để dùng cách thay tuần tự.
+    """
+    live: List[Tuple[str, str]] = []
+    items = list(alias_map.items())
+    for j, (key, value) in enumerate(items):
+        earlier = items[:j]
+        produced = any(key in v for _, v in earlier)
+        if not produced and (
+            any(k in key for k, _ in earlier) or _strip_marks(key.replace("đ", "d")) != key
+        ):
+            continue
+        live.append((key, value))
+
+    for i, (ki, vi) in enumerate(live):
+        for kj, _vj in live[i + 1:]:
+            if kj in vi or _partial_overlap(vi, kj) or _partial_overlap(kj, vi):
+                return None
+            if ki in kj or _partial_overlap(kj, ki):
+                return None
+    if not live:
+        return None
+    return re.compile("|".join(re.escape(k) for k, _ in live))
+
+
+_ALIAS_RE = _compile_aliases(ALIAS_MAP)
+_ALIAS_VALUES = dict(ALIAS_MAP)
+_NORMALIZE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def normalize(text: str) -> str:
+    """Lowercase + bỏ dấu tiếng Việt + gọn khoảng trắng để so khớp chuỗi đơn giản."""
+    text = text.lower()
+    if not text.isascii():
+        # Bảng dịch từng ký tự (đ -> d, bỏ dấu). Chỉ tin kết quả khi ra ASCII: NFD trên cả chuỗi có thể
+        # sắp lại thứ tự các dấu kết hợp còn sót, trường hợp đó đi đường chậm cho chắc.
+        stripped = text.translate(_STRIP_TABLE)
+        text = stripped if stripped.isascii() else _strip_marks(text.replace("đ", "d"))
+    # Thay thế các alias thô
+    if _ALIAS_RE is not None:
+        text = _ALIAS_RE.sub(lambda m: _ALIAS_VALUES[m.group(0)], text)
+    else:
+        for k, v in ALIAS_MAP.items():
+            text = text.replace(k, v)
+    # Gọn khoảng trắng
+    return " ".join(text.split())
+
+
+_TRAILING_NUM_RE = re.compile(r"(\d+)$")
+_NUM_RE = re.compile(r"\d+")
+
+# Loại khớp của một pattern trong CourseMatcher
+_MATCH_CODE, _MATCH_NAME, _MATCH_BASE = 0, 1, 2
+
 
-            code_norm = code.lower()
-            name_norm = normalize(name) if name else ""
-            
-            # Tách số thứ tự ở cuối tên môn
-            course_num: Optional[int] = None
-            base_name_norm: Optional[str] = None
-            # Regex để tìm số (ví dụ: "Toan cao cap 1" -> 1)
-            m = re.search(r"(\d+)$", name_norm)
-            if m:
-                course_num = int(m.group(1))
-                base_name_norm = name_norm[: m.start()].rstrip()
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _word_trigrams(word: str) -> frozenset:
+    """Trigram ký tự của một từ, đệm 2 khoảng trắng đầu / 1 cuối như pg_trgm ("toan" -> "  t", " to", ...)."""
+    padded = "  " + word + " "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
 
+
+def _trigrams_union(sets: List[frozenset]) -> frozenset:
+    return frozenset().union(*sets)
+
+
+def _trigrams(words: List[str]) -> frozenset:
+    return _trigrams_union([_word_trigrams(w) for w in words])
+
+
+class CourseMatcher:
+    """
+    Bộ so khớp môn học của một curriculum, dựng một lần: automaton Aho-Corasick trên mã môn (lowercase),
+    tên đã normalize và tên bỏ số thứ tự cuối ("toan cao cap 1" -> "toan cao cap").
+    Một lượt duyệt câu hỏi tìm ra mọi môn được nhắc tới, sau đó áp đúng thứ tự ưu tiên của
+    cách duyệt tuần tự cũ (xem find_course_in_text).
+
+    Khi không khớp chính xác (gõ sai / thiếu chữ: "cau truc du lieu va giai thuan"), tra thêm một
+    inverted index trigram ký tự của tên môn: đếm trigram chung để lọc ứng viên, rồi chấm hệ số Dice
+    giữa tên môn và từng cửa sổ cùng số từ trong câu hỏi; nhận môn có điểm >= fuzzy_threshold.
+    Chỉ tra mờ khi gọi find(..., fuzzy=True), tức là câu đã được định tuyến là hỏi về môn học: câu hỏi chung
+    dễ gần giống tên môn ("ngon ngu lap trinh nao de hoc" ~ "ngon ngu lap trinh c++").
+    Mã môn không tra mờ. fuzzy_threshold <= 0 thì tắt.
+    """
+
+    def __init__(self, semesters: List[Dict[str, Any]], fuzzy_threshold: float = COURSE_FUZZY_THRESHOLD):
+        # (code, name, số thứ tự cuối tên) theo đúng thứ tự trong curriculum
+        self.courses: List[Tuple[str, str, Optional[int]]] = []
+        patterns: List[Tuple[str, Tuple[int, int]]] = []
+        for sem in semesters:
+            for course in sem.get("courses", []):
+                code = str(course.get("code") or "")
+                name = str(course.get("name") or "")
+                if not code and not name:
+                    continue
+                idx = len(self.courses)
+                name_norm = normalize(name) if name else ""
+                course_num: Optional[int] = None
+                m = _TRAILING_NUM_RE.search(name_norm)
+                if m:
+                    course_num = int(m.group(1))
+                    base_name_norm = name_norm[: m.start()].rstrip()
+                    if base_name_norm:
+                        patterns.append((base_name_norm, (idx, _MATCH_BASE)))
+                if code:
+                    patterns.append((code.lower(), (idx, _MATCH_CODE)))
+                if name_norm:
+                    patterns.append((name_norm, (idx, _MATCH_NAME)))
+                self.courses.append((code, name, course_num))
+        self._automaton: AhoCorasick[Tuple[int, int]] = AhoCorasick(patterns)
+
+        # Index mờ: mỗi tên (đầy đủ / bỏ số cuối) khác nhau là một entry (trigram, số từ, [(môn, loại khớp)]);
+        # các môn cùng tên gốc ("toan cao cap" của Toán cao cấp 1, 2, ...) dùng chung một entry
+        self.fuzzy_threshold = fuzzy_threshold
+        self._fuzzy_entries: List[Tuple[frozenset, int, List[Tuple[int, int]]]] = []
+        self._fuzzy_min_shared: List[float] = []
+        self._fuzzy_index: Dict[str, List[int]] = {}
+        if fuzzy_threshold > 0:
+            entry_ids: Dict[str, int] = {}
+            for pattern, (idx, kind) in patterns:
+                if kind == _MATCH_CODE:
+                    continue
+                entry_id = entry_ids.get(pattern)
+                if entry_id is not None:
+                    self._fuzzy_entries[entry_id][2].append((idx, kind))
+                    continue
+                words = pattern.split()
+                grams = _trigrams(words)
+                entry_id = entry_ids[pattern] = len(self._fuzzy_entries)
+                self._fuzzy_entries.append((grams, len(words), [(idx, kind)]))
+                # Dice(N, W) <= 2c / (|N| + c) với c = số trigram chung, nên c phải >= t|N| / (2 - t)
+                self._fuzzy_min_shared.append(fuzzy_threshold * len(grams) / (2 - fuzzy_threshold))
+                for g in grams:
+                    self._fuzzy_index.setdefault(g, []).append(entry_id)
+
+    def find(self, norm_text: str, fuzzy: bool = False) -> Optional[Dict[str, str]]:
+        """Môn học được nhắc tới trong câu hỏi (đã normalize), hoặc None. fuzzy: tra mờ khi không khớp chính xác."""
+        hits: Dict[int, set] = {}
+        for idx, kind in self._automaton.find_all(norm_text):
+            hits.setdefault(idx, set()).add(kind)
+
+        # Rút ra số ở cuối câu hỏi (nếu có)
+        text_numbers = _NUM_RE.findall(norm_text)
+        text_num: Optional[int] = int(text_numbers[-1]) if text_numbers else None
+
+        if not hits:
+            return self._find_fuzzy(norm_text, text_num) if fuzzy and self._fuzzy_entries else None
+
+        best: Optional[Dict[str, str]] = None
+        # Duyệt các môn có khớp theo thứ tự curriculum, cùng thứ tự ưu tiên như vòng lặp cũ
+        for idx in sorted(hits):
+            kinds = hits[idx]
+            code, name, course_num = self.courses[idx]
             # 1. Khớp theo mã môn học
-            if code and code_norm in norm_text:
+            if _MATCH_CODE in kinds:
                 return {"code": code, "name": name or code}
-            
-            # 2. Khớp theo tên đầy đủ (ưu tiên cao nhất)
-            if name and name_norm and name_norm in norm_text:
-                # Chỉ chấp nhận nếu:
-                # - Câu hỏi không có số (text_num is None)
-                # - HOẶC số của câu hỏi và số của môn học trùng nhau
+            # 2. Khớp theo tên đầy đủ: chỉ nhận khi câu hỏi không có số hoặc số trùng với số của môn
+            if _MATCH_NAME in kinds:
                 if text_num is None or course_num is None or text_num == course_num:
                     return {"code": code, "name": name}
-                continue # Nếu số không trùng, bỏ qua
+                continue
+            # 3. Khớp theo tên không có số cuối (User hay bỏ số 1,2,3) → ứng viên, môn sau ghi đè môn trước
+            if _MATCH_BASE in kinds and (text_num is None or text_num == course_num):
+                best = {"code": code, "name": name}
+        return best
 
-            # 3. Khớp theo tên không có số cuối (User hay bỏ số 1,2,3)
-            elif base_name_norm and base_name_norm in norm_text:
-                # Nếu câu hỏi không có số HOẶC môn học không có số -> match
-                if text_num is None or course_num is None:
-                    best = {"code": code, "name": name}
-                    continue
-                # Nếu cả hai đều có số và trùng nhau
-                if text_num == course_num:
-                    best = {"code": code, "name": name}
-                    
-    # Nếu không có khớp chính xác, trả về khớp gần nhất (nếu có)
-    return best
\ No newline at end of file
+    def _find_fuzzy(self, norm_text: str, text_num: Optional[int]) -> Optional[Dict[str, str]]:
+        words = norm_text.split()
+        if not words:
+            return None
+        word_grams = [_word_trigrams(w) for w in words]
+
+        # Đếm trigram chung của câu hỏi với từng entry, bỏ entry không thể đạt ngưỡng
+        index = self._fuzzy_index
+        shared = Counter(chain.from_iterable(index.get(g, ()) for g in _trigrams_union(word_grams)))
+
+        best_key: Optional[Tuple[float, int, int]] = None
+        window_grams: Dict[int, List[frozenset]] = {}
+        for entry_id, count in shared.items():
+            if count < self._fuzzy_min_shared[entry_id]:
+                continue
+            grams, k, members = self._fuzzy_entries[entry_id]
+            # Cùng điều kiện về số thứ tự như khớp chính xác
+            members = [
+                (kind, idx) for idx, kind in members
+                if (text_num is None or self.courses[idx][2] is None or text_num == self.courses[idx][2])
+                and (kind == _MATCH_NAME or text_num is None or text_num == self.courses[idx][2])
+            ]
+            if not members:
+                continue
+            # Các cửa sổ k từ liên tiếp của câu hỏi (câu ngắn hơn tên môn thì lấy cả câu)
+            windows = window_grams.get(k)
+            if windows is None:
+                size = min(k, len(words))
+                windows = [_trigrams_union(word_grams[i:i + size]) for i in range(len(words) - size + 1)]
+                window_grams[k] = windows
+            size_n = len(grams)
+            score = max(2 * len(grams & w) / (size_n + len(w)) for w in windows)
+            if score < self.fuzzy_threshold:
+                continue
+            # Điểm cao hơn thắng; bằng điểm thì tên đầy đủ trước tên bỏ số, rồi theo thứ tự curriculum
+            kind, idx = min(members)
+            key = (-score, kind, idx)
+            if best_key is None or key < best_key:
+                best_key = key
+        if best_key is None:
+            return None
+        code, name, _ = self.courses[best_key[2]]
+        return {"code": code, "name": name}
+
+
+# Matcher theo fingerprint curriculum (xem aggregates.curriculum_fingerprint); thêm một map nhỏ theo
+# id(curriculum) để các lần gọi liên tiếp trong cùng lượt chat khỏi phải tính lại fingerprint.
+_MATCHER_CACHE_SIZE = 32
+_matchers: "OrderedDict[str, CourseMatcher]" = OrderedDict()
+_matchers_by_id: "OrderedDict[int, Tuple[Dict[str, Any], CourseMatcher]]" = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def course_matcher(curriculum: Dict[str, Any]) -> CourseMatcher:
+    key = id(curriculum)
+    with _matchers_lock:
+        hit = _matchers_by_id.get(key)
+        if hit is not None and hit[0] is curriculum:
+            return hit[1]
+    fp = curriculum_fingerprint(curriculum)
+    with _matchers_lock:
+        matcher = _matchers.get(fp)
+    if matcher is None:
+        matcher = CourseMatcher(curriculum.get("semesters") or [])
+    with _matchers_lock:
+        _matchers[fp] = matcher
+        _matchers.move_to_end(fp)
+        while len(_matchers) > _MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+        _matchers_by_id[key] = (curriculum, matcher)
+        while len(_matchers_by_id) > _MATCHER_CACHE_SIZE:
+            _matchers_by_id.popitem(last=False)
+    return matcher
+
+
+def find_course_in_text(message: str, ctx: Dict[str, Any], fuzzy: bool = False) -> Optional[Dict[str, str]]:
+    """Tìm môn học được nhắc tới trong câu hỏi dựa trên curriculum và kết quả đã học.
+    fuzzy=True chỉ dùng cho các câu đã biết là hỏi về môn học (chịu được gõ sai tên môn).
+    Trả về {'code': str, 'name': str}
+    """
+    curriculum = ctx.get("curriculum") or {}
+    if not curriculum.get("semesters"):
+        return None
+    return course_matcher(curriculum).find(normalize(message), fuzzy=fuzzy)
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Số lần chờ gần nhất dùng để tính thời gian chờ trong hàng đợi (p50 / p95)
+_WINDOW = 500
+
+
+class TokenBucket:
+    """
+    Giới hạn tốc độ kiểu token bucket: mỗi lời gọi lấy một token; token được nạp lại đều `rate` token/giây,
+    tối đa `burst` token (cho phép dồn một đợt ngắn). rate <= 0 → không giới hạn.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate if rate > 0 else None
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> bool:
+        """Còn token không (không lấy token)."""
+        if self.rate is None:
+            return True
+        with self._lock:
+            self._refill_locked()
+            return self._tokens >= 1
+
+    def try_acquire(self) -> bool:
+        if self.rate is None:
+            return True
+        with self._lock:
+            self._refill_locked()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        if self.rate is None:
+            return {"rate": None}
+        with self._lock:
+            self._refill_locked()
+            return {"rate": self.rate, "burst": self.burst, "tokens": round(self._tokens, 2)}
+
+
+class ConcurrencyLimiter:
+    """
+    Giới hạn số lời gọi chạy đồng thời (max_concurrency; <= 0 = không giới hạn), kèm hàng đợi có giới hạn:
+    - còn chỗ → chạy ngay;
+    - hết chỗ → chờ theo thứ tự tới (FIFO), tối đa `queue_timeout` giây (<= 0 = chờ tới khi có chỗ);
+    - hàng đợi đã đủ `max_queue` → từ chối ngay (fail fast), không để request dồn lại chờ provider chậm.
+
+    Dùng trong event loop (không thread-safe): acquire() trả False nếu bị từ chối; acquire() thành công thì
+    phải release().
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float = 0):
+        self.max_concurrency = int(max_concurrency) if max_concurrency > 0 else None
+        self.max_queue = max(int(max_queue), 0)
+        self.queue_timeout = queue_timeout if queue_timeout > 0 else None
+        self._active = 0
+        self._waiters: "deque[asyncio.Future[None]]" = deque()
+        self._waits: "deque[float]" = deque(maxlen=_WINDOW)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_waiting = 0
+
+    async def acquire(self) -> bool:
+        if self.max_concurrency is None or (self._active < self.max_concurrency and not self._waiters):
+            self._active += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # Đã được nhường chỗ đúng lúc hết giờ / bị huỷ → trả chỗ cho request kế tiếp
+                self.release()
+            else:
+                self._discard(fut)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            return False
+        # Chỗ được release() chuyển thẳng cho request này (_active giữ nguyên)
+        self.admitted += 1
+        self._waits.append(time.monotonic() - t0)
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    def _discard(self, fut: "asyncio.Future[None]") -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def _ms(q: float) -> Optional[float]:
+            return round(waits[min(int(len(waits) * q), len(waits) - 1)] * 1000, 1) if waits else None
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_ms_p50": _ms(0.5),
+            "queue_ms_p95": _ms(0.95),
+            "queue_ms_max": round(waits[-1] * 1000, 1) if waits else None,
+        }
@@ -0,0 +1,483 @@
+"""
+Bộ định tuyến câu hỏi /chat dạng khai báo.
+
+Mỗi rule là dữ liệu: điều kiện từ khóa (OR của các tổ hợp AND nhóm từ khóa), intent của model kích
+hoạt rule, có cần user_id hay không và handler đích. Toàn bộ từ khóa trên câu đã normalize được biên
+dịch thành một regex dạng trie, nên mỗi câu chỉ được quét một lượt cho mọi rule; chọn rule chỉ còn là
+duyệt bảng theo thứ tự ưu tiên. Nhóm regex và nhóm từ khóa trên trường lower / raw (ít, chỉ vài rule
+dùng) được chạy lười, chỉ khi việc duyệt bảng tới rule cần chúng.
+
+    hits = CHAT_ROUTER.scan(text, norm_text)
+    for rule in CHAT_ROUTER.candidates(hits, intent_fn, has_user=bool(user_id)):
+        ...  # tra handler theo rule.handler
+
+Intent của model chỉ được tính (tối đa một lần) khi gặp rule có `intents` mà từ khóa không khớp.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+
+# Trường văn bản để so khớp từ khóa
+FIELD_NORM = "norm"  # normalize(text): bỏ dấu, mở rộng viết tắt
+FIELD_LOWER = "lower"  # text.lower()
+FIELD_RAW = "raw"  # text gốc, phân biệt hoa thường
+
+# Kiểu so khớp của một nhóm từ khóa
+MATCH_SUBSTRING = "substring"  # từ khóa là chuỗi con của trường
+MATCH_EXACT = "exact"  # trường (đã strip) bằng đúng một từ khóa
+MATCH_REGEX = "regex"  # keywords[0] là regex, re.search trên trường
+
+# Điều kiện luôn đúng: một tổ hợp AND rỗng
+ALWAYS: Tuple[Tuple[str, ...], ...] = ((),)
+
+
+@dataclass(frozen=True)
+class KeywordGroup:
+    name: str
+    keywords: Tuple[str, ...]
+    field: str = FIELD_NORM
+    match: str = MATCH_SUBSTRING
+
+
+@dataclass(frozen=True)
+class Rule:
+    # Tên handler (logic.py tra bảng theo tên này)
+    handler: str
+    # Điều kiện từ khóa: khớp nếu có ít nhất một tổ hợp mà mọi nhóm trong đó đều có mặt
+    when: Tuple[Tuple[str, ...], ...] = ()
+    # Intent của model cũng kích hoạt rule (xét sau từ khóa)
+    intents: FrozenSet[str] = frozenset()
+    requires_user: bool = False
+    # Câu trả lời khi thiếu user_id; None thì bỏ qua rule và xét tiếp
+    user_reply: Optional[str] = None
+    # Ghi vào session state["last_intent"] khi rule được chọn
+    last_intent: Optional[str] = None
+    # Handler cần chương trình học (curriculum): chờ context đầy đủ, không trả lời từ phần context hẹp
+    needs_curriculum: bool = False
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex dạng trie cho một tập chuỗi; nhánh dài hơn được thử trước nên luôn khớp chuỗi dài nhất."""
+    trie: Dict[str, Any] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class _FieldMatcher:
+    """
+    Tìm mọi nhóm có từ khóa xuất hiện trong một trường văn bản bằng một lượt quét.
+
+    Regex trie trong lookahead cho ra, tại mỗi vị trí, từ khóa dài nhất bắt đầu ở đó. Mọi từ khóa
+    khác bắt đầu cùng vị trí đều là tiền tố của nó, nên chỉ cần tra trước tập nhóm của mọi từ khóa
+    là chuỗi con của từng từ khóa là đủ.
+    """
+
+    def __init__(self, keywords: Dict[str, Set[str]]):
+        self._pattern = re.compile("(?=(" + _trie_regex(keywords) + "))")
+        self._groups: Dict[str, FrozenSet[str]] = {
+            k: frozenset().union(*(groups for j, groups in keywords.items() if j in k)) for k in keywords
+        }
+
+    def find(self, text: str, found: Set[str]) -> None:
+        groups = self._groups
+        for kw in self._pattern.findall(text):
+            found |= groups[kw]
+
+
+class Hits:
+    """Tập nhóm từ khóa có mặt trong một câu; nhóm chạy lười chỉ được tìm khi có rule hỏi tới."""
+
+    __slots__ = ("found", "_texts", "_lazy")
+
+    def __init__(self, found: Set[str], texts: Tuple[str, str, str], lazy: Dict[str, Tuple[int, Pattern[str]]]):
+        self.found = found
+        self._texts = texts
+        self._lazy = lazy
+
+    def __contains__(self, group: str) -> bool:
+        if group in self.found:
+            return True
+        spec = self._lazy.get(group)
+        if spec is None:
+            return False
+        field, pattern = spec
+        if pattern.search(self._texts[field]):
+            self.found.add(group)
+            return True
+        return False
+
+
+# Vị trí của từng trường trong tuple văn bản truyền cho Hits
+_FIELD_INDEX = {FIELD_NORM: 0, FIELD_LOWER: 1, FIELD_RAW: 2}
+
+
+class Router:
+    def __init__(self, groups: Tuple[KeywordGroup, ...], rules: Tuple[Rule, ...]):
+        names = {g.name for g in groups}
+        for rule in rules:
+            for alt in rule.when:
+                unknown = set(alt) - names
+                if unknown:
+                    raise ValueError(f"Rule {rule.handler!r} dùng nhóm chưa khai báo: {sorted(unknown)}")
+
+        self.rules = rules
+        substrings: Dict[str, Dict[str, Set[str]]] = {}
+        self._exact: Dict[str, Dict[str, List[str]]] = {}
+        # Nhóm chạy lười: regex và từ khóa trên trường lower / raw (mỗi nhóm một regex, tìm khi được hỏi tới)
+        self._lazy: Dict[str, Tuple[int, Pattern[str]]] = {}
+        for g in groups:
+            if g.field not in _FIELD_INDEX:
+                raise ValueError(f"Trường không hợp lệ: {g.field!r}")
+            if g.match == MATCH_SUBSTRING and g.field != FIELD_NORM:
+                self._lazy[g.name] = (_FIELD_INDEX[g.field], re.compile(_trie_regex(g.keywords)))
+            elif g.match == MATCH_SUBSTRING:
+                by_kw = substrings.setdefault(g.field, {})
+                for k in g.keywords:
+                    by_kw.setdefault(k, set()).add(g.name)
+            elif g.match == MATCH_EXACT:
+                exact = self._exact.setdefault(g.field, {})
+                for k in g.keywords:
+                    exact.setdefault(k, []).append(g.name)
+            elif g.match == MATCH_REGEX:
+                self._lazy[g.name] = (_FIELD_INDEX[g.field], re.compile(g.keywords[0]))
+            else:
+                raise ValueError(f"Kiểu so khớp không hợp lệ: {g.match!r}")
+        self._matchers = [(_FIELD_INDEX[f], _FieldMatcher(kw)) for f, kw in substrings.items()]
+        self._exact_by_index = [(_FIELD_INDEX[f], kw) for f, kw in self._exact.items()]
+
+        # Mỗi tổ hợp AND tách thành phần tra tập (frozenset, so bằng <=) và phần chạy lười
+        self._compiled: List[Tuple[Rule, List[Tuple[FrozenSet[str], Tuple[str, ...]]]]] = []
+        for rule in rules:
+            alts = []
+            for alt in rule.when:
+                dynamic = tuple(g for g in alt if g in self._lazy)
+                alts.append((frozenset(g for g in alt if g not in self._lazy), dynamic))
+            self._compiled.append((rule, alts))
+
+        # Chỉ mục nhóm → các rule có thể khớp từ khóa khi nhóm đó có mặt (bitmask theo vị trí rule, bit thấp =
+        # ưu tiên cao). Rule có tổ hợp không cần nhóm nào trong found thì luôn có thể khớp từ khóa;
+        # rule có intent thì luôn phải xét (khớp theo intent khi từ khóa không khớp).
+        self._rules_by_group: Dict[str, int] = {}
+        self._keyword_always = 0
+        self._intent_rules = 0
+        for i, (rule, alts) in enumerate(self._compiled):
+            if rule.intents:
+                self._intent_rules |= 1 << i
+            for static, dynamic in alts:
+                if not static:
+                    self._keyword_always |= 1 << i
+                for g in static:
+                    self._rules_by_group[g] = self._rules_by_group.get(g, 0) | 1 << i
+
+    def scan(self, text: str, norm_text: str) -> Hits:
+        """Quét câu một lượt cho mỗi trường, trả về các nhóm từ khóa có mặt."""
+        texts = (norm_text, text.lower(), text)
+        found: Set[str] = set()
+        for index, matcher in self._matchers:
+            matcher.find(texts[index], found)
+        for index, exact in self._exact_by_index:
+            found.update(exact.get(texts[index].strip(), ()))
+        return Hits(found, texts, self._lazy)
+
+    def _keyword_candidates(self, hits: Hits) -> int:
+        """Bitmask các rule mà điều kiện từ khóa có thể đúng (mọi rule khác chắc chắn không khớp từ khóa)."""
+        mask = self._keyword_always
+        rules_by_group = self._rules_by_group
+        for g in hits.found:
+            mask |= rules_by_group.get(g, 0)
+        return mask
+
+    def _keyword_match(self, alts: List[Tuple[FrozenSet[str], Tuple[str, ...]]], hits: Hits) -> bool:
+        found = hits.found
+        for static, dynamic in alts:
+            if static <= found and (not dynamic or all(g in hits for g in dynamic)):
+                return True
+        return False
+
+    def needs_intent(self, hits: Hits, has_user: bool) -> bool:
+        """
+        True nếu candidates() sẽ phải hỏi intent trước khi tới rule đầu tiên được chọn, để phía async
+        tính intent trước (ví dụ qua micro-batch) thay vì gọi model đồng bộ.
+        """
+        possible = self._keyword_candidates(hits)
+        for i, (rule, alts) in enumerate(self._compiled):
+            if possible >> i & 1 and self._keyword_match(alts, hits):
+                if rule.requires_user and not has_user and rule.user_reply is None:
+                    continue
+                return False
+            if rule.intents:
+                return True
+        return False
+
+    def candidates(
+        self,
+        hits: Hits,
+        intent: Callable[[], Optional[str]],
+        has_user: bool,
+    ) -> Iterator[Rule]:
+        """
+        Các rule khớp theo thứ tự ưu tiên. Rule cần user_id mà không có user và không có
+        `user_reply` thì bị bỏ qua. Người gọi dừng ở rule đầu tiên cho ra câu trả lời.
+        """
+        possible = self._keyword_candidates(hits)
+        considered = possible | self._intent_rules
+
+        intent_value: Optional[str] = None
+        intent_done = False
+        compiled = self._compiled
+        while considered:
+            # Duyệt bit từ thấp tới cao = theo thứ tự ưu tiên
+            low = considered & -considered
+            considered ^= low
+            rule, alts = compiled[low.bit_length() - 1]
+            matched = bool(low & possible) and self._keyword_match(alts, hits)
+            if not matched and rule.intents:
+                if not intent_done:
+                    intent_value = intent()
+                    intent_done = True
+                matched = intent_value in rule.intents
+            if not matched:
+                continue
+            if rule.requires_user and not has_user and rule.user_reply is None:
+                continue
+            yield rule
+
+
+# --- Bảng rule của /chat (thứ tự khai báo = thứ tự ưu tiên) ---
+
+_STRENGTHS_REPLY = "Mình cần user_id để phân tích điểm mạnh điểm yếu môn học của bạn từ dữ liệu hệ thống."
+
+CHAT_GROUPS: Tuple[KeywordGroup, ...] = (
+    KeywordGroup(
+        "strengths",
+        (
+            "diem manh",
+            "diem yeu",
+            "manh yeu",
+            "mon nao manh",
+            "mon nao yeu",
+            "mon nao tot",
+            "mon nao kem",
+            "hoc luc manh",
+            "hoc luc yeu",
+            "phan tich hoc luc",
+            "phan tich diem manh",
+            "phan tich diem yeu",
+        ),
+    ),
+    # "còn gì nữa", "nữa không"... → dùng lại intent trước đó khi model không chắc
+    KeywordGroup(
+        "follow_up",
+        ("con gi nua", "con gi", "them gi", "nua khong", "nua ko", "tiep tuc", "tieptuc", "nua k"),
+    ),
+    KeywordGroup(
+        "program",
+        (
+            "chuong trinh dao tao",
+            "chuong trinh dao tao cua nganh",
+            "chuong trinh dao tao nganh",
+            "quy trinh dao tao",
+            "quy trinh dao tao nganh",
+            "cong nghe da phuong tien",
+            "nganh cong nghe da phuong tien",
+            "tong quan nganh",
+            "chuan dau ra",
+            "cau truc chuong trinh",
+            "nghe nghiep",
+            "hoc phi",
+            "dieu kien tuyen sinh",
+            "quy trinh nhap hoc",
+            "tai lieu dao tao",
+        ),
+    ),
+    KeywordGroup("dao_tao", ("dao tao",)),
+    KeywordGroup("program_kind", ("chuong trinh", "quy trinh")),
+    KeywordGroup("thi", ("thi",)),
+    KeywordGroup("exam_when", ("lich thi", "lich", "ngay thi", "ngay nao", "bao gio", "gio thi")),
+    KeywordGroup("exam_time_lower", ("giờ thi",), field=FIELD_LOWER),
+    KeywordGroup(
+        "exam_format",
+        (
+            "hinh thuc thi",
+            "thi cuoi ky",
+            "thi cuoi ki",
+            "thi cuoi",
+            "thi the nao",
+            "thi nhu the nao",
+            "thi kieu gi",
+            "thi mon nay ra sao",
+            "thi mon",
+            "bai tap lon hay thi",
+        ),
+    ),
+    KeywordGroup("warning", ("canh bao hoc tap", "cảnh báo học tập", "muc canh bao", "mức cảnh báo")),
+    KeywordGroup("graduation", ("ra truong", "tot nghiep", "tot nghiep dung han", "ra truong dung han")),
+    # Chỉ từ khóa rõ ràng về hạn nộp, tránh bắt nhầm "đúng hạn"
+    KeywordGroup("deadline", ("deadline", "han nop", "han nop bai", "han nop bai tap", "nop bai")),
+    KeywordGroup(
+        "debt",
+        (
+            "no mon nao",  # nợ môn nào
+            "no mon gi",  # nợ môn gì
+            "dang no mon",  # đang nợ môn
+            "mon nao no",  # môn nào nợ
+            "mon gi no",  # môn gì nợ
+            "danh sach mon no",  # danh sách môn nợ
+            "mon hoc lai",  # môn học lại
+        ),
+    ),
+    KeywordGroup(
+        "credits",
+        (
+            "no mon",  # nợ môn
+            "thieu tin chi",  # thiếu tín chỉ
+            "tin chi",  # tín chỉ
+            "bao nhieu tin",  # bao nhiêu tín
+            "tich luy duoc bao tin",  # tích lũy được bao tín
+            "tich luy duoc bao nhieu tin",
+            "tich luy bao nhieu tin",
+        ),
+    ),
+    KeywordGroup("gpa", ("gpa",)),
+    KeywordGroup("not_counted", ("khong tinh", "ko tinh", "khong duoc tinh", "khong tinh vao")),
+    KeywordGroup("best", ("cao nhat", "tot nhat", "diem cao nhat", "gpa cao nhat")),
+    KeywordGroup("semester_word", ("hoc ky", "hoc ki", "hk")),
+    KeywordGroup("semester_number", (r"(hk|hoc ky|hoc ki)\s*\d+",), match=MATCH_REGEX),
+    KeywordGroup("score", ("gpa", "diem", "diem trung binh")),
+    KeywordGroup("score_lower", ("điểm",), field=FIELD_LOWER),
+    KeywordGroup("course_raw", ("môn", "mon", "học gì", "hoc gi"), field=FIELD_RAW),
+    KeywordGroup("greeting", ("chào", "chao", "hello", "hi", "xin chào")),
+    # Câu trả lời rất ngắn kiểu "có", "ok", "được"... sau lời gợi ý của bot
+    KeywordGroup("short_yes", ("co", "ok", "oke", "dc", "duoc", "vang", "uh", "uhm", "uk"), match=MATCH_EXACT),
+    KeywordGroup("about", ("bạn là ai", "ban la ai", "giúp tôi", "giup toi")),
+)
+
+CHAT_RULES: Tuple[Rule, ...] = (
+    # Ưu tiên đặc biệt: phân tích điểm mạnh / điểm yếu môn học
+    Rule(
+        "strengths_weaknesses",
+        when=(("strengths",),),
+        requires_user=True,
+        user_reply=_STRENGTHS_REPLY,
+        last_intent="strengths_weaknesses",
+        needs_curriculum=True,
+    ),
+    # Chương trình đào tạo / ngành: tốt nhất xem trực tiếp trên trang PTIT
+    Rule("program_info", when=(("program",), ("dao_tao", "program_kind"))),
+    # Lịch thi (ngày/giờ thi): bắt trước hình thức thi
+    Rule(
+        "exam_schedule",
+        when=(("thi", "exam_when"), ("thi", "exam_time_lower")),
+        requires_user=True,
+        user_reply="Mình cần user_id để xem lịch thi của bạn.",
+        last_intent="exam_schedule",
+    ),
+    Rule("exam_format", when=(("exam_format",),), needs_curriculum=True),
+    # Cảnh báo học tập / tốt nghiệp xét trước deadline để tránh bắt nhầm
+    Rule(
+        "academic_warning",
+        when=(("warning",),),
+        requires_user=True,
+        user_reply="Mình cần user_id để đánh giá nguy cơ cảnh báo học tập của bạn.",
+        last_intent="warning",
+    ),
+    Rule(
+        "graduation",
+        when=(("graduation",),),
+        intents=frozenset({"graduation"}),
+        requires_user=True,
+        user_reply="Mình cần user_id để ước lượng khả năng ra trường đúng hạn của bạn.",
+        last_intent="graduation",
+        needs_curriculum=True,
+    ),
+    Rule(
+        "deadline",
+        when=(("deadline",),),
+        intents=frozenset({"deadline"}),
+        requires_user=True,
+        user_reply="Mình cần user_id để tra cứu deadline của bạn.",
+        last_intent="deadline",
+    ),
+    Rule(
+        "debt_courses",
+        when=(("debt",),),
+        requires_user=True,
+        user_reply="Mình cần user_id để kiểm tra môn nợ của bạn.",
+        last_intent="debt",
+        needs_curriculum=True,
+    ),
+    Rule(
+        "credits",
+        when=(("credits",),),
+        intents=frozenset({"credits"}),
+        requires_user=True,
+        user_reply="Mình cần user_id để kiểm tra môn nợ và tín chỉ của bạn.",
+        last_intent="credits",
+        needs_curriculum=True,
+    ),
+    Rule(
+        "non_gpa_courses",
+        when=(("gpa", "not_counted"),),
+        requires_user=True,
+        user_reply="Mình cần user_id để xem danh sách môn không tính vào GPA của bạn.",
+        last_intent="non_gpa_courses",
+        needs_curriculum=True,
+    ),
+    # "Học kỳ nào điểm cao nhất / GPA cao nhất"
+    Rule(
+        "best_semester",
+        when=(("best", "semester_word"),),
+        requires_user=True,
+        user_reply="Mình cần user_id để so sánh GPA các học kỳ của bạn.",
+        last_intent="best_semester",
+    ),
+    # "GPA học kỳ 1", "điểm trung bình HK2", ...
+    Rule(
+        "semester_gpa",
+        when=(("score", "semester_number"),),
+        requires_user=True,
+        user_reply="Mình cần user_id để tra GPA học kỳ của bạn từ hệ thống.",
+        last_intent="semester_gpa",
+    ),
+    # GPA / điểm nói chung (tích lũy hoặc điểm môn)
+    Rule(
+        "gpa",
+        when=(("score",), ("score_lower",)),
+        intents=frozenset({"gpa"}),
+        requires_user=True,
+        user_reply="Mình cần user_id để tra GPA/điểm của bạn từ hệ thống.",
+        last_intent="gpa",
+        needs_curriculum=True,
+    ),
+    Rule(
+        "course",
+        when=(("course_raw",),),
+        intents=frozenset({"course"}),
+        requires_user=True,
+        user_reply="Mình cần user_id để tra cứu thông tin môn học của bạn.",
+        last_intent="course",
+        needs_curriculum=True,
+    ),
+    # Câu trùng tên một môn trong chương trình → xem như hỏi về môn đó; handler trả None nếu không thấy
+    Rule("course_fallback", when=ALWAYS, requires_user=True, needs_curriculum=True),
+    # --- Trả lời chung ---
+    Rule("greeting", when=(("greeting",),)),
+    Rule("short_yes", when=(("short_yes",),)),
+    Rule("about", when=(("about",),)),
+)
+
+CHAT_ROUTER = Router(CHAT_GROUPS, CHAT_RULES)